@@ -1,7 +1,4 @@
 import streamlit as st
-import pandas as pd
-import numpy as np
-import plotly.graph_objects as go
 from modules.diet_recommendation import DietRecommender
 from modules.exercise_recommendation import ExerciseRecommender
 from modules.progress_tracker import ProgressTracker
@@ -9,6 +6,13 @@ from modules.health_analytics import HealthAnalytics
 from modules.goal_tracker import GoalTracker
 from datetime import datetime, timedelta
 
+from data.catalog_store import CatalogWatcher, FOOD_CATALOG, EXERCISE_CATALOG
+from utils import metrics
+from utils.lazy import lazy_import
+
+# Plotly is only imported once the BMI gauge is first drawn
+go = lazy_import('plotly.graph_objects')
+
 # Page configuration
 st.set_page_config(
     page_title="Health Recommendation System",
@@ -18,13 +22,35 @@ st.set_page_config(
 
 
 @st.cache_resource
-def load_recommenders():
+def load_catalogs():
+    # Recommenders over memory-mapped catalogs shared by every replica on
+    # the host, rebuilt in the background when a catalog CSV changes
     return {
-        'diet': DietRecommender(),
-        'exercise': ExerciseRecommender()
+        'diet': CatalogWatcher(FOOD_CATALOG, DietRecommender.from_catalog),
+        'exercise': CatalogWatcher(EXERCISE_CATALOG, ExerciseRecommender.from_catalog)
     }
 
 
+def load_recommenders():
+    return {name: watcher.get() for name, watcher in load_catalogs().items()}
+
+
+def catalog_version(name):
+    """Version of a catalog, so cached plans are recomputed after a reload"""
+    return load_catalogs()[name].version
+
+
+# Upper bound on entries kept by each memoized derived-value function.
+# st.cache_data is shared by every session and survives full reruns, which
+# start app.py afresh, and it hands each caller its own copy of the value.
+DERIVED_CACHE_SIZE = 256
+derived_cache = st.cache_data(max_entries=DERIVED_CACHE_SIZE, show_spinner=False)
+
+# Streamlit fragments rerun only their own tab on widget interaction;
+# older Streamlit versions without them fall back to full reruns
+fragment = getattr(st, 'fragment', None) or getattr(st, 'experimental_fragment', None) or (lambda f: f)
+
+
 def create_bmi_gauge(bmi_value):
     ranges = [(0, 18.5, "Underweight", "#87CEEB"),
               (18.5, 24.9, "Normal", "#90EE90"),
@@ -56,11 +82,78 @@ def create_bmi_gauge(bmi_value):
     return fig
 
 
+@derived_cache
+def bmi_assessment(bmi):
+    """BMI category and recommendation for a BMI value"""
+    if bmi < 18.5:
+        return ("Underweight",
+                "Consider increasing your caloric intake and strength training.")
+    elif 18.5 <= bmi < 25:
+        return ("Normal weight",
+                "Maintain your healthy lifestyle with balanced diet and regular exercise.")
+    elif 25 <= bmi < 30:
+        return ("Overweight",
+                "Focus on portion control and increasing physical activity.")
+    return ("Obese",
+            "Consult a healthcare provider for a personalized weight management plan.")
+
+
+@derived_cache
+def cached_bmi_gauge(bmi):
+    return create_bmi_gauge(bmi)
+
+
+@derived_cache
+def cached_calories_needed(weight, height, age, gender, activity_level):
+    return load_recommenders()['diet'].calculate_calories_needed(
+        weight=weight,
+        height=height,
+        age=age,
+        gender=gender,
+        activity_level=activity_level
+    )
+
+
+@derived_cache
+def cached_meal_plan(daily_calories, diet_preference, optimize, catalog_version):
+    return load_recommenders()['diet'].get_meal_plan(
+        daily_calories,
+        health_preference=diet_preference,
+        optimize=optimize
+    )
+
+
+@derived_cache
+def cached_weekly_meal_plan(daily_calories, diet_preference, seed, catalog_version):
+    return load_recommenders()['diet'].get_weekly_meal_plan(
+        daily_calories,
+        health_preference=diet_preference,
+        seed=seed
+    )
+
+
+@derived_cache
+def cached_workout_plan(bmi, activity_level, fitness_goal, health_conditions, duration, seed,
+                        catalog_version):
+    exercise = load_recommenders()['exercise']
+    recommended_exercises = exercise.recommend_exercises(
+        bmi=bmi,
+        activity_level=activity_level,
+        goal=fitness_goal,
+        health_conditions=list(health_conditions),
+        seed=seed
+    )
+    return exercise.create_workout_plan(
+        recommended_exercises,
+        duration_minutes=duration
+    ).to_records()
+
+
 def main():
-    st.title("🏥 Personal Health Recommendation System")
+    # Opt-in timing of the modules and tabs, see utils/metrics.py
+    metrics.configure_from_env()
 
-    # Initialize recommenders
-    recommenders = load_recommenders()
+    st.title("🏥 Personal Health Recommendation System")
 
     # Initialize session state objects
     if 'progress_tracker' not in st.session_state:
@@ -97,187 +190,237 @@ def main():
         "Goals"
     ])
 
-    # BMI Calculator Tab
     with tabs[0]:
-        col1, col2 = st.columns(2)
+        render_bmi_tab(bmi, activity_level)
+    with tabs[1]:
+        render_diet_tab(weight, height, age, gender, activity_level)
+    with tabs[2]:
+        render_exercise_tab(bmi, activity_level)
+    with tabs[3]:
+        render_progress_tab(weight, height)
+    with tabs[4]:
+        render_analytics_tab(weight, bmi)
+    with tabs[5]:
+        render_goals_tab()
+
+    metrics.export()
+
+
+@fragment
+@metrics.timed('app.tab.bmi')
+def render_bmi_tab(bmi, activity_level):
+    col1, col2 = st.columns(2)
+    with col1:
+        st.subheader("Your Health Metrics")
+        st.write(f"BMI: {bmi:.2f}")
+        st.write(f"Activity Level: {activity_level}")
+
+        bmi_category, recommendation = bmi_assessment(bmi)
+
+        st.write(f"BMI Category: {bmi_category}")
+        st.write(f"Recommendation: {recommendation}")
+
+    with col2:
+        fig = cached_bmi_gauge(round(bmi, 2))
+        st.plotly_chart(fig, use_container_width=True)
+
+
+@fragment
+@metrics.timed('app.tab.diet')
+def render_diet_tab(weight, height, age, gender, activity_level):
+    st.header("🍽️ Diet Recommendations")
+    daily_calories = cached_calories_needed(weight, height, age, gender, activity_level)
+
+    st.write(f"Your estimated daily calorie needs: {daily_calories:.0f} calories")
+    diet_preference = st.selectbox(
+        "Dietary Preference",
+        ["None", "Vegetarian", "Vegan", "Low-Carb", "Keto", "Mediterranean"]
+    )
+
+    optimize_plan = st.checkbox(
+        "Optimize portions for my calorie target and macros",
+        help="Combine foods and portion sizes to match your calorie needs and preference's macro balance"
+    )
+
+    weekly_plan = st.checkbox("Plan the whole week", help="Seven days of varied meals with weekly macro totals")
+
+    if st.button("Generate Meal Plan"):
+        st.session_state.show_meal_plan = True
+        # Each click draws a different week
+        st.session_state.meal_plan_seed = st.session_state.get('meal_plan_seed', -1) + 1
+
+    # Once generated, the plan stays on screen and is only recomputed
+    # when its inputs change
+    if st.session_state.get('show_meal_plan') and weekly_plan:
+        week = cached_weekly_meal_plan(daily_calories, diet_preference, st.session_state.meal_plan_seed,
+                                       catalog_version('diet'))
+        totals = week['weekly_totals']
+        st.write(
+            f"Week total: {totals['Calories']:,.0f} calories | Protein: {totals['Protein']:,.0f}g | "
+            f"Carbs: {totals['Carbohydrates']:,.0f}g | Fat: {totals['Fat']:,.0f}g")
+        for day, (day_plan, day_totals) in enumerate(zip(week['days'], week['daily_totals']), start=1):
+            with st.expander(f"Day {day} ({day_totals['Calories']:.0f} calories)"):
+                for meal, foods in day_plan.items():
+                    st.write(f"**{meal.title()}**: " + ", ".join(
+                        f"{food['Food']} ({food['Calories']:.0f} cal)" for food in foods))
+    elif st.session_state.get('show_meal_plan'):
+        meal_plan = cached_meal_plan(daily_calories, diet_preference, optimize_plan, catalog_version('diet'))
+        for meal, foods in meal_plan.items():
+            st.subheader(f"{meal.title()} Options")
+            for food in foods:
+                servings = f", {food['Servings']:g} serving(s)" if 'Servings' in food else ""
+                st.write(f"- {food['Food']} ({food['Calories']:.0f} calories{servings})")
+                st.write(
+                    f"  Protein: {food.get('Protein', 0)}g | Carbs: {food.get('Carbohydrates', 0)}g | Fat: {food.get('Fat', 0)}g")
+
+    st.subheader("Food Lookup")
+    food_query = st.text_input("Search foods by name", placeholder="e.g. chiken brest")
+    if food_query:
+        matches = load_recommenders()['diet'].search_foods(food_query, limit=5)
+        if not matches:
+            st.write("No matching foods found.")
+        for food in matches:
+            st.write(
+                f"- {food['Food']}: {food['Calories']:.0f} calories | Protein: {food['Protein']}g | "
+                f"Carbs: {food['Carbohydrates']}g | Fat: {food['Fat']}g")
+
+
+@fragment
+@metrics.timed('app.tab.exercise')
+def render_exercise_tab(bmi, activity_level):
+    st.header("🏋️‍♂️ Exercise Recommendations")
+    fitness_goal = st.selectbox(
+        "What is your fitness goal?",
+        ["Weight Loss", "Muscle Gain", "General Fitness", "Flexibility"]
+    )
+    health_conditions = st.multiselect(
+        "Do you have any health conditions?",
+        ["None", "Joint Pain", "Back Pain", "Heart Condition", "Asthma"]
+    )
+    duration = st.slider("Preferred workout duration (minutes)", 15, 60, 30, 15)
+
+    # Each click draws a fresh sample; reruns reuse the plan for that seed
+    if st.button("Generate Workout Plan"):
+        st.session_state.workout_seed = st.session_state.get('workout_seed', 0) + 1
+
+    if 'workout_seed' in st.session_state:
+        workout_plan = cached_workout_plan(
+            round(bmi, 2), activity_level, fitness_goal, tuple(health_conditions),
+            duration, st.session_state.workout_seed, catalog_version('exercise')
+        )
+
+        col1, col2, col3 = st.columns(3)
         with col1:
-            st.subheader("Your Health Metrics")
-            st.write(f"BMI: {bmi:.2f}")
-            st.write(f"Activity Level: {activity_level}")
-
-            if bmi < 18.5:
-                bmi_category = "Underweight"
-                recommendation = "Consider increasing your caloric intake and strength training."
-            elif 18.5 <= bmi < 25:
-                bmi_category = "Normal weight"
-                recommendation = "Maintain your healthy lifestyle with balanced diet and regular exercise."
-            elif 25 <= bmi < 30:
-                bmi_category = "Overweight"
-                recommendation = "Focus on portion control and increasing physical activity."
-            else:
-                bmi_category = "Obese"
-                recommendation = "Consult a healthcare provider for a personalized weight management plan."
-
-            st.write(f"BMI Category: {bmi_category}")
-            st.write(f"Recommendation: {recommendation}")
+            st.markdown("### Warm-up (5-10 mins)")
+            st.write("- Light stretching")
+            st.write("- Light walking/jogging")
 
         with col2:
-            fig = create_bmi_gauge(bmi)
-            st.plotly_chart(fig, use_container_width=True)
+            st.markdown("### Main Workout")
+            for workout in workout_plan:
+                st.write(f"**{workout['exercise']}**")
+                st.write(f"- Duration: {workout['duration']} minutes")
+                st.write(f"- Calories: {workout['calories']} kcal")
+                st.write(f"- Target: {workout['target_muscles']}")
+
+        with col3:
+            st.markdown("### Cool-down (5-10 mins)")
+            st.write("- Light stretching")
+            st.write("- Deep breathing")
+
+
+@fragment
+@metrics.timed('app.tab.progress')
+def render_progress_tab(weight, height):
+    st.header("📈 Progress Tracking")
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.subheader("Log Today's Progress")
+        workouts_completed = st.number_input("Number of workouts completed today", 0, 10, 0)
+        calories_burned = st.number_input("Calories burned today", 0, 2000, 0)
+
+        if st.button("Log Progress"):
+            st.session_state.progress_tracker.add_entry(
+                weight=weight,
+                height=height,
+                workouts_completed=workouts_completed,
+                calories_burned=calories_burned
+            )
+            st.success("Progress logged successfully!")
 
-    # Diet Planner Tab
-    with tabs[1]:
-        st.header("🍽️ Diet Recommendations")
-        daily_calories = recommenders['diet'].calculate_calories_needed(
-            weight=weight,
-            height=height,
-            age=age,
-            gender=gender,
-            activity_level=activity_level
-        )
+    with col2:
+        st.subheader("Progress Overview")
+        total_workouts, total_calories = st.session_state.progress_tracker.get_workout_summary()
 
-        st.write(f"Your estimated daily calorie needs: {daily_calories:.0f} calories")
-        diet_preference = st.selectbox(
-            "Dietary Preference",
-            ["None", "Vegetarian", "Vegan", "Low-Carb", "Keto", "Mediterranean"]
-        )
+        metric_col1, metric_col2 = st.columns(2)
+        metric_col1.metric("Total Workouts", total_workouts)
+        metric_col2.metric("Total Calories Burned", f"{total_calories:,} kcal")
 
-        if st.button("Generate Meal Plan"):
-            meal_plan = recommenders['diet'].get_meal_plan(daily_calories)
-            for meal, foods in meal_plan.items():
-                st.subheader(f"{meal.title()} Options")
-                for food in foods:
-                    st.write(f"- {food['Food']} ({food['Calories']:.0f} calories)")
-                    st.write(
-                        f"  Protein: {food.get('Protein', 0)}g | Carbs: {food.get('Carbohydrates', 0)}g | Fat: {food.get('Fat', 0)}g")
+        weight_trend = st.session_state.progress_tracker.get_weight_trend()
+        if weight_trend:
+            st.plotly_chart(weight_trend, use_container_width=True)
 
-    # Exercise Planner Tab
-    with tabs[2]:
-        st.header("🏋️‍♂️ Exercise Recommendations")
-        fitness_goal = st.selectbox(
-            "What is your fitness goal?",
-            ["Weight Loss", "Muscle Gain", "General Fitness", "Flexibility"]
-        )
-        health_conditions = st.multiselect(
-            "Do you have any health conditions?",
-            ["None", "Joint Pain", "Back Pain", "Heart Condition", "Asthma"]
-        )
-        duration = st.slider("Preferred workout duration (minutes)", 15, 60, 30, 15)
+        activity_calendar = st.session_state.progress_tracker.get_activity_calendar()
+        if activity_calendar:
+            st.plotly_chart(activity_calendar, use_container_width=True)
 
-        if st.button("Generate Workout Plan"):
-            recommended_exercises = recommenders['exercise'].recommend_exercises(
-                bmi=bmi,
-                activity_level=activity_level,
-                goal=fitness_goal,
-                health_conditions=health_conditions
-            )
-            workout_plan = recommenders['exercise'].create_workout_plan(
-                recommended_exercises,
-                duration_minutes=duration
-            )
 
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                st.markdown("### Warm-up (5-10 mins)")
-                st.write("- Light stretching")
-                st.write("- Light walking/jogging")
-
-            with col2:
-                st.markdown("### Main Workout")
-                for workout in workout_plan:
-                    st.write(f"**{workout['exercise']}**")
-                    st.write(f"- Duration: {workout['duration']} minutes")
-                    st.write(f"- Calories: {workout['calories']} kcal")
-                    st.write(f"- Target: {workout['target_muscles']}")
-
-            with col3:
-                st.markdown("### Cool-down (5-10 mins)")
-                st.write("- Light stretching")
-                st.write("- Deep breathing")
-
-    # Progress Tracker Tab
-    with tabs[3]:
-        st.header("📈 Progress Tracking")
+@fragment
+@metrics.timed('app.tab.analytics')
+def render_analytics_tab(weight, bmi):
+    st.header("📊 Health Analytics")
+    with st.expander("Log Daily Health Data"):
         col1, col2 = st.columns(2)
-
         with col1:
-            st.subheader("Log Today's Progress")
-            workouts_completed = st.number_input("Number of workouts completed today", 0, 10, 0)
-            calories_burned = st.number_input("Calories burned today", 0, 2000, 0)
-
-            if st.button("Log Progress"):
-                st.session_state.progress_tracker.add_entry(
-                    weight=weight,
-                    height=height,
-                    workouts_completed=workouts_completed,
-                    calories_burned=calories_burned
-                )
-                st.success("Progress logged successfully!")
-
+            calories_consumed = st.number_input("Calories Consumed", 0, 5000, 2000)
+            water_intake = st.number_input("Water Intake (glasses)", 0, 20, 8)
         with col2:
-            st.subheader("Progress Overview")
-            total_workouts, total_calories = st.session_state.progress_tracker.get_workout_summary()
+            calories_burned = st.number_input("Calories Burned", 0, 3000, 0)
+            workouts_done = st.number_input("Workouts Completed", 0, 5, 0)
 
-            metric_col1, metric_col2 = st.columns(2)
-            metric_col1.metric("Total Workouts", total_workouts)
-            metric_col2.metric("Total Calories Burned", f"{total_calories:,} kcal")
+        if st.button("Log Daily Data"):
+            st.session_state.health_analytics.add_daily_data(
+                weight=weight,
+                bmi=bmi,
+                calories_consumed=calories_consumed,
+                calories_burned=calories_burned,
+                workouts=workouts_done,
+                water_intake=water_intake
+            )
+            st.success("Data logged successfully!")
 
-            weight_trend = st.session_state.progress_tracker.get_weight_trend()
-            if weight_trend:
-                st.plotly_chart(weight_trend, use_container_width=True)
 
-    # Analytics Tab
-    with tabs[4]:
-        st.header("📊 Health Analytics")
-        with st.expander("Log Daily Health Data"):
-            col1, col2 = st.columns(2)
-            with col1:
-                calories_consumed = st.number_input("Calories Consumed", 0, 5000, 2000)
-                water_intake = st.number_input("Water Intake (glasses)", 0, 20, 8)
-            with col2:
-                calories_burned = st.number_input("Calories Burned", 0, 3000, 0)
-                workouts_done = st.number_input("Workouts Completed", 0, 5, 0)
-
-            if st.button("Log Daily Data"):
-                st.session_state.health_analytics.add_daily_data(
-                    weight=weight,
-                    bmi=bmi,
-                    calories_consumed=calories_consumed,
-                    calories_burned=calories_burned,
-                    workouts=workouts_done,
-                    water_intake=water_intake
-                )
-                st.success("Data logged successfully!")
-
-    # Goals Tab
-    with tabs[5]:
-        st.header("🎯 Goals & Achievements")
-        with st.expander("Set New Goal"):
-            col1, col2 = st.columns(2)
-            with col1:
-                goal_type = st.selectbox(
-                    "Goal Type",
-                    ["Weight Loss", "Exercise Frequency", "Daily Steps", "Water Intake", "Calorie Control"]
-                )
-                target_value = st.number_input(
-                    "Target Value",
-                    min_value=0.0,
-                    help="Enter your target value (e.g., target weight or number of workouts)"
-                )
-            with col2:
-                target_date = st.date_input(
-                    "Target Date",
-                    min_value=datetime.now().date(),
-                    value=datetime.now().date() + timedelta(days=30)
-                )
-
-            if st.button("Set Goal"):
-                st.session_state.goal_tracker.add_goal(
-                    goal_type=goal_type,
-                    target_value=target_value,
-                    target_date=target_date.strftime('%Y-%m-%d')
-                )
-                st.success(f"New {goal_type} goal set successfully!")
+@fragment
+@metrics.timed('app.tab.goals')
+def render_goals_tab():
+    st.header("🎯 Goals & Achievements")
+    with st.expander("Set New Goal"):
+        col1, col2 = st.columns(2)
+        with col1:
+            goal_type = st.selectbox(
+                "Goal Type",
+                ["Weight Loss", "Exercise Frequency", "Daily Steps", "Water Intake", "Calorie Control"]
+            )
+            target_value = st.number_input(
+                "Target Value",
+                min_value=0.0,
+                help="Enter your target value (e.g., target weight or number of workouts)"
+            )
+        with col2:
+            target_date = st.date_input(
+                "Target Date",
+                min_value=datetime.now().date(),
+                value=datetime.now().date() + timedelta(days=30)
+            )
+
+        if st.button("Set Goal"):
+            st.session_state.goal_tracker.add_goal(
+                goal_type=goal_type,
+                target_value=target_value,
+                target_date=target_date.strftime('%Y-%m-%d')
+            )
+            st.success(f"New {goal_type} goal set successfully!")
 
 
 if __name__ == "__main__":
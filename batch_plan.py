@@ -0,0 +1,219 @@
+"""Headless batch planner: diet and workout plans for a file of user profiles
+
+Run from the repository root:
+
+    python batch_plan.py profiles.csv [-o plans.jsonl] [--workers 4]
+        [--chunk-size 1000] [--duration 30] [--seed 0]
+
+The input is a CSV or JSONL file with one profile per row: weight (kg),
+height (cm), age, gender, activity_level, goal, health_conditions and
+diet_preference, plus an optional user_id. In CSV files several health
+conditions are separated by ';'. Each profile gets one JSON line with its
+BMI, daily calories, meal plan and workout plan, in input order; profiles
+that cannot be planned get an 'error' field instead.
+
+The input is read in chunks that are planned in a pool of worker
+processes, each mapping the compiled food and exercise catalogs (see
+data/catalog_store.py) once. Only a few chunks per worker are in flight
+at a time, so memory stays bounded no matter how large the input is.
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from data.catalog_store import EXERCISE_CATALOG, FOOD_CATALOG, open_catalog
+from modules.diet_recommendation import DietRecommender
+from modules.exercise_recommendation import ExerciseRecommender
+
+PROFILE_FIELDS = ['weight', 'height', 'age', 'gender', 'activity_level', 'goal']
+CONDITION_SEPARATOR = ';'
+CHUNKS_PER_WORKER = 2
+
+# Catalogs loaded once per worker process by _init_worker
+_recommenders = {}
+
+
+def read_profiles(path, chunk_size=1000):
+    """Yield DataFrame chunks of profiles from a CSV or JSONL file"""
+    if path.endswith(('.jsonl', '.ndjson', '.json')):
+        reader = pd.read_json(path, lines=True, chunksize=chunk_size, dtype=False)
+    else:
+        reader = pd.read_csv(path, chunksize=chunk_size)
+    with reader:
+        for chunk in reader:
+            yield chunk.rename(columns={'conditions': 'health_conditions'})
+
+
+def _conditions(value):
+    """Health conditions as a list from a JSON list or a ';'-separated string"""
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [str(condition) for condition in value]
+    if value is None or (isinstance(value, float) and math.isnan(value)) or value == '':
+        return []
+    return [condition.strip() for condition in str(value).split(CONDITION_SEPARATOR) if condition.strip()]
+
+
+def _preference(value):
+    if value is None or (isinstance(value, float) and math.isnan(value)) or value == 'None':
+        return None
+    return str(value)
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _init_worker():
+    # Workers map the compiled catalogs and their saved indexes, sharing
+    # their pages, instead of each parsing the CSVs
+    _recommenders['diet'] = DietRecommender.from_catalog(open_catalog(FOOD_CATALOG))
+    _recommenders['exercise'] = ExerciseRecommender.from_catalog(open_catalog(EXERCISE_CATALOG))
+
+
+@lru_cache(maxsize=4096)
+def _meal_plan(daily_calories, diet_preference):
+    # Many profiles share a calorie target and preference
+    return _recommenders['diet'].get_meal_plan(daily_calories, health_preference=diet_preference)
+
+
+def _invalid_rows(profiles):
+    """Error message per row, or None for profiles that can be planned"""
+    errors = np.full(len(profiles), None, dtype=object)
+    for field in PROFILE_FIELDS:
+        if field not in profiles:
+            errors[:] = f"missing column: {field}"
+            return errors
+    for field in ('weight', 'height', 'age'):
+        values = pd.to_numeric(profiles[field], errors='coerce').to_numpy(dtype=float)
+        bad = ~(values > 0)
+        errors[bad & pd.isna(errors)] = f"invalid {field}"
+    # The calorie formulas need a gender label, e.g. not a blank CSV cell
+    bad = ~np.array([isinstance(value, str) and bool(value.strip()) for value in profiles['gender']], dtype=bool)
+    errors[bad & pd.isna(errors)] = "invalid gender"
+    return errors
+
+
+def plan_chunk(profiles, first_row=0, duration_minutes=30, seed=0):
+    """Plan one chunk of profiles; returns one JSON line per profile"""
+    if not _recommenders:
+        _init_worker()
+    diet = _recommenders['diet']
+    exercise = _recommenders['exercise']
+
+    profiles = profiles.reset_index(drop=True)
+    rows = np.arange(first_row, first_row + len(profiles))
+    user_ids = profiles['user_id'].tolist() if 'user_id' in profiles else rows.tolist()
+    errors = _invalid_rows(profiles)
+
+    valid = np.flatnonzero(pd.isna(errors))
+    usable = profiles.iloc[valid].copy()
+    results = {}
+    if len(usable):
+        usable['weight'] = usable['weight'].astype(float)
+        usable['height'] = usable['height'].astype(float)
+        usable['bmi'] = usable['weight'] / (usable['height'] / 100) ** 2
+        usable['user_id'] = [user_ids[i] for i in valid]
+        conditions = usable['health_conditions'] if 'health_conditions' in usable else [None] * len(usable)
+        usable['health_conditions'] = [_conditions(value) for value in conditions]
+
+        daily_calories = diet.calculate_calories_needed_batch(usable, errors='coerce')
+        known = ~np.isnan(np.asarray(daily_calories, dtype=float))
+        errors[valid[~known]] = "unknown activity level"
+
+        # Exercise picks depend on the seed and user id, not on the chunking
+        planned = usable[known]
+        positions = exercise.recommend_positions_batch(planned, seed)
+        workouts = exercise.create_workout_plans_batch(positions, duration_minutes)
+        totals = workouts.total_calories()
+        preferences = planned['diet_preference'] if 'diet_preference' in planned else [None] * len(planned)
+
+        for i, (row, bmi, calories, preference) in enumerate(zip(
+                valid[known], planned['bmi'], np.asarray(daily_calories)[known], preferences)):
+            results[row] = {
+                'bmi': round(float(bmi), 2),
+                'daily_calories': int(calories),
+                'meal_plan': _meal_plan(int(calories), _preference(preference)),
+                'workout_plan': workouts[i].to_records(),
+                'workout_calories': int(totals[i]),
+            }
+
+    lines = []
+    for position, (row, user_id) in enumerate(zip(rows, user_ids)):
+        record = {'row': int(row), 'user_id': user_id}
+        if position in results:
+            record.update(results[position])
+        else:
+            record['error'] = errors[position]
+        lines.append(json.dumps(record, default=_json_default))
+    return lines
+
+
+def run(path, output, workers=None, chunk_size=1000, duration_minutes=30, seed=0):
+    """Plan every profile in path and write JSON lines to output; returns the count"""
+    chunks = read_profiles(path, chunk_size)
+    written = 0
+
+    def write(lines):
+        nonlocal written
+        output.write('\n'.join(lines) + '\n' if lines else '')
+        written += len(lines)
+
+    if workers == 0:
+        first_row = 0
+        for chunk in chunks:
+            write(plan_chunk(chunk, first_row, duration_minutes, seed))
+            first_row += len(chunk)
+        return written
+
+    workers = workers or os.cpu_count() or 1
+    # Compile stale catalogs and save the food name index once here rather
+    # than in every worker
+    DietRecommender.from_catalog(open_catalog(FOOD_CATALOG))
+    open_catalog(EXERCISE_CATALOG)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        # A bounded window of chunks in flight, written back in input order
+        pending = deque()
+        first_row = 0
+        for chunk in chunks:
+            if len(pending) >= workers * CHUNKS_PER_WORKER:
+                write(pending.popleft().result())
+            pending.append(executor.submit(plan_chunk, chunk, first_row, duration_minutes, seed))
+            first_row += len(chunk)
+        while pending:
+            write(pending.popleft().result())
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('profiles', help="CSV or JSONL file of user profiles")
+    parser.add_argument('-o', '--output', help="JSONL file to write (default: stdout)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="worker processes (default: CPU count, 0 plans in this process)")
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--duration', type=int, default=30, help="workout duration in minutes")
+    parser.add_argument('--seed', type=int, default=0, help="seed for the exercise selection")
+    args = parser.parse_args()
+
+    output = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        count = run(args.profiles, output, args.workers, args.chunk_size, args.duration, args.seed)
+    finally:
+        if args.output:
+            output.close()
+    print(f"Planned {count} profiles", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
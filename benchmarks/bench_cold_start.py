@@ -0,0 +1,82 @@
+"""Cold-start import time and memory for the app and each module
+
+Run from the repository root:
+
+    python -m benchmarks.bench_cold_start [--repeat 3] [--output cold_start.json]
+
+Each target is imported in a fresh interpreter, so nothing is shared
+between measurements. Reports the best wall-clock import time, the peak
+RSS of that interpreter and which heavy libraries the import pulled in.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+TARGETS = [
+    'app',
+    'modules',
+    'modules.diet_recommendation',
+    'modules.exercise_recommendation',
+    'modules.goal_tracker',
+    'modules.health_analytics',
+    'modules.progress_tracker',
+    'data.data_manager',
+]
+
+HEAVY_LIBRARIES = ['pandas', 'numpy', 'plotly', 'sklearn', 'matplotlib', 'seaborn', 'streamlit']
+
+PROBE = '''
+import json, resource, sys, time
+baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+import {target}
+elapsed = time.perf_counter() - start
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+scale = 1 if sys.platform == 'darwin' else 1024
+print(json.dumps({{
+    'seconds': elapsed,
+    'peak_rss_mb': peak * scale / 2 ** 20,
+    'import_rss_mb': (peak - baseline) * scale / 2 ** 20,
+    'loaded': [name for name in {heavy!r} if name in sys.modules],
+}}))
+'''
+
+
+def measure(target, repeat):
+    runs = []
+    env = dict(os.environ, PYTHONWARNINGS='ignore', STREAMLIT_LOG_LEVEL='error')
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, '-c', PROBE.format(target=target, heavy=HEAVY_LIBRARIES)],
+            capture_output=True, text=True, env=env, check=True
+        )
+        runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+    best = min(runs, key=lambda run: run['seconds'])
+    return {'target': target, 'runs': repeat, **best}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help="write results as JSON to this file")
+    parser.add_argument('targets', nargs='*', default=TARGETS)
+    args = parser.parse_args()
+
+    results = [measure(target, args.repeat) for target in args.targets]
+
+    print(f"{'target':<34} {'import ms':>10} {'peak MB':>9} {'import MB':>10}  loaded")
+    for result in results:
+        print(f"{result['target']:<34} {result['seconds'] * 1000:>10.1f} "
+              f"{result['peak_rss_mb']:>9.1f} {result['import_rss_mb']:>10.1f}  "
+              f"{', '.join(result['loaded'])}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'python': sys.version, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
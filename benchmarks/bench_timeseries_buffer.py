@@ -0,0 +1,67 @@
+"""Per-append cost of the tracker time-series buffer as history grows
+
+Run from the repository root:
+
+    python -m benchmarks.bench_timeseries_buffer [--entries 1000000]
+
+Prints the mean cost of one append in each window of the run, which should
+stay flat up to the full entry count, alongside the old one-row pd.concat
+approach for the first few thousand entries.
+"""
+
+import argparse
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from modules.health_analytics import HealthAnalytics
+
+ROW = dict(weight=70.0, bmi=24.2, calories_consumed=2000, calories_burned=300,
+           workouts=1, water_intake=8)
+
+
+def bench_buffer(entries, windows):
+    analytics = HealthAnalytics()
+    step = entries // windows
+    results = []
+    for window in range(windows):
+        start = time.perf_counter()
+        for _ in range(step):
+            analytics.add_daily_data(**ROW)
+        elapsed = time.perf_counter() - start
+        results.append(((window + 1) * step, elapsed / step * 1e6))
+    return results
+
+
+def bench_concat(entries, windows):
+    frame = pd.DataFrame(columns=['date'] + list(ROW))
+    step = entries // windows
+    results = []
+    for window in range(windows):
+        start = time.perf_counter()
+        for _ in range(step):
+            row = pd.DataFrame({'date': [datetime.now().strftime('%Y-%m-%d')],
+                                **{key: [value] for key, value in ROW.items()}})
+            frame = pd.concat([frame, row], ignore_index=True)
+        elapsed = time.perf_counter() - start
+        results.append(((window + 1) * step, elapsed / step * 1e6))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--entries', type=int, default=1_000_000)
+    parser.add_argument('--windows', type=int, default=10)
+    parser.add_argument('--concat-entries', type=int, default=5_000)
+    args = parser.parse_args()
+
+    print(f"{'method':<8} {'entries':>10} {'us/append':>10}")
+    for entries, cost in bench_concat(args.concat_entries, args.windows):
+        print(f"{'concat':<8} {entries:>10,} {cost:>10.2f}")
+    for entries, cost in bench_buffer(args.entries, args.windows):
+        print(f"{'buffer':<8} {entries:>10,} {cost:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,265 @@
+"""Concurrent-session load test of app.py
+
+Run from the repository root:
+
+    python -m benchmarks.load_test [--sessions 1 4 16] [--rounds 3]
+        [--think-time 0] [--seed 0] [--output load.json]
+        [--compare baseline.json] [--tolerance 0.25]
+
+Each simulated user is a Streamlit AppTest session, so the app runs
+headless with no server or network. AppTest keeps one runtime per
+process, so every session runs in its own process and the sessions really
+do run in parallel, competing for the CPUs and the shared compiled
+catalogs in the page cache. Unlike sessions of one server, they do not
+share Streamlit's in-memory caches. Each session loads the app, then
+clicks through Generate Meal Plan, Generate Workout Plan, Log Progress,
+Log Daily Data and Set Goal for --rounds rounds, with sidebar inputs drawn
+from --seed. Each click is one full rerun.
+
+Every process runs the app once untimed first, so imports and its caches
+are warm, and the sessions then start together. For every session count
+this reports p50/p95/p99 rerun latency overall and per action, reruns per
+second across all sessions, and the mean resident memory a session adds
+to its process. --compare exits with status 1 if a p50/p95 or the throughput is more than
+--tolerance worse than an earlier --output file, so CI can catch
+regressions.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import resource
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.run_suite import environment
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app.py')
+
+# Buttons clicked in order in every round
+ACTIONS = ['Generate Meal Plan', 'Generate Workout Plan', 'Log Progress', 'Log Daily Data', 'Set Goal']
+PERCENTILES = (50, 95, 99)
+DEFAULT_SESSIONS = [1, 4, 16]
+RUN_TIMEOUT = 120
+# Seconds a session process may take to warm up and finish on top of its reruns
+SESSION_TIMEOUT = 600
+
+
+def rss_mb():
+    """Current resident set size in MB (peak RSS where /proc is unavailable)"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError, IndexError):
+        scale = 1 if sys.platform == 'darwin' else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2 ** 20
+
+
+def _app_test():
+    # Imported here so --help works without Streamlit's start-up cost
+    from streamlit.testing.v1 import AppTest
+    return AppTest.from_file(APP_PATH, default_timeout=RUN_TIMEOUT)
+
+
+def _click(app, label):
+    buttons = [button for button in app.button if button.label == label]
+    if not buttons:
+        raise RuntimeError(f"No '{label}' button on the page")
+    buttons[0].click()
+
+
+def _check(app, step):
+    if app.exception:
+        raise RuntimeError(f"{step} raised: {app.exception[0].message}")
+
+
+class Session:
+    """One simulated user clicking through the app"""
+
+    def __init__(self, session_id, rounds, think_time, seed):
+        self.session_id = session_id
+        self.rounds = rounds
+        self.think_time = think_time
+        self.rng = np.random.default_rng([seed, session_id])
+        self.app = None
+        self.timings = []
+        self.error = None
+        self.added_mb = None
+        # Wall-clock span of the timed reruns, comparable across processes
+        self.span = None
+
+    def _rerun(self, action):
+        start = time.perf_counter()
+        self.app.run()
+        self.timings.append((action, time.perf_counter() - start))
+        _check(self.app, action)
+
+    def run(self, start_barrier):
+        try:
+            _check(_app_test().run(), 'warm-up')
+            before = rss_mb()
+            self.app = _app_test()
+            start_barrier.wait(SESSION_TIMEOUT)
+            started = time.time()
+            self._rerun('load')
+            # Different users, so calorie targets and plans differ too
+            weight = [w for w in self.app.number_input if w.label == 'Weight (kg)'][0]
+            weight.set_value(round(float(self.rng.uniform(50, 110)), 1))
+            self._rerun('set_weight')
+            for _ in range(self.rounds):
+                for action in ACTIONS:
+                    if self.think_time:
+                        time.sleep(self.rng.exponential(self.think_time))
+                    _click(self.app, action)
+                    self._rerun(action)
+            self.span = (started, time.time())
+            self.added_mb = rss_mb() - before
+        except Exception as error:  # reported with the results, not raised in the worker
+            # Don't leave the other sessions waiting for this one
+            start_barrier.abort()
+            self.error = f"session {self.session_id}: {error}"
+
+
+def _session_process(session_id, rounds, think_time, seed, start_barrier, results):
+    user = Session(session_id, rounds, think_time, seed)
+    user.run(start_barrier)
+    results.put((session_id, user.timings, user.span, user.added_mb, user.error))
+
+
+def _percentiles(seconds):
+    if not seconds:
+        return {f"p{p}_ms": None for p in PERCENTILES}
+    values = np.percentile(np.asarray(seconds) * 1000, PERCENTILES)
+    return {f"p{p}_ms": round(float(value), 2) for p, value in zip(PERCENTILES, values)}
+
+
+def run_load(sessions, rounds=3, think_time=0.0, seed=0):
+    """Run sessions concurrent users and return latency, throughput and memory stats"""
+    context = multiprocessing.get_context('spawn')
+    barrier = context.Barrier(sessions)
+    results = context.Queue()
+    processes = [context.Process(target=_session_process, args=(i, rounds, think_time, seed, barrier, results),
+                                 name=f"session-{i}")
+                 for i in range(sessions)]
+    for process in processes:
+        process.start()
+
+    finished = {}
+    while len(finished) < sessions:
+        try:
+            session_id, *result = results.get(timeout=1)
+            finished[session_id] = result
+        except queue.Empty:
+            if not any(process.is_alive() for process in processes):
+                break
+    for process in processes:
+        process.join(SESSION_TIMEOUT)
+
+    timings = [timing for user_timings, _, _, _ in finished.values() for timing in user_timings]
+    # From the first session starting to the last one finishing
+    spans = [span for _, span, _, _ in finished.values() if span is not None]
+    elapsed = max(end for _, end in spans) - min(start for start, _ in spans) if spans else 0.0
+    errors = [error for _, _, _, error in finished.values() if error]
+    errors += [f"session {i}: process exited with code {processes[i].exitcode}"
+               for i in range(sessions) if i not in finished]
+    added = [added_mb for _, _, added_mb, _ in finished.values() if added_mb is not None]
+    by_action = {}
+    for action, seconds in timings:
+        by_action.setdefault(action, []).append(seconds)
+    return {
+        'sessions': sessions,
+        'rounds': rounds,
+        'reruns': len(timings),
+        'seconds': round(elapsed, 3),
+        'reruns_per_second': round(len(timings) / elapsed, 2) if elapsed else None,
+        **_percentiles([seconds for _, seconds in timings]),
+        'actions': {action: {'count': len(values), **_percentiles(values)}
+                    for action, values in by_action.items()},
+        'per_session_mb': round(float(np.mean(added)), 2) if added else None,
+        'errors': errors,
+    }
+
+
+def compare(results, baseline_path, tolerance):
+    """Print changes against a baseline file; returns the regressions found"""
+    with open(baseline_path, 'r') as f:
+        baseline = {result['sessions']: result for result in json.load(f)['results']}
+    regressions = []
+    print(f"\n{'sessions':>8} {'metric':<18} {'baseline':>10} {'now':>10} {'ratio':>7}")
+    for result in results:
+        before = baseline.get(result['sessions'])
+        if before is None:
+            continue
+        for metric, higher_is_worse in (('p50_ms', True), ('p95_ms', True), ('p99_ms', True),
+                                        ('reruns_per_second', False)):
+            old, new = before.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            ratio = new / old
+            worse = ratio > 1 + tolerance if higher_is_worse else ratio < 1 - tolerance
+            # p99 of a short run is too noisy to fail a build on
+            if worse and metric != 'p99_ms':
+                regressions.append(f"{result['sessions']} sessions {metric}: {old} -> {new}")
+            print(f"{result['sessions']:>8} {metric:<18} {old:>10} {new:>10} {ratio:>7.2f}"
+                  f"{'  worse' if worse else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, nargs='+', default=DEFAULT_SESSIONS,
+                        help="concurrent session counts to run, one after the other")
+    parser.add_argument('--rounds', type=int, default=3, help="click-through rounds per session")
+    parser.add_argument('--think-time', type=float, default=0.0,
+                        help="mean seconds a user waits between clicks (exponentially distributed)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="write results as JSON to this file")
+    parser.add_argument('--compare', help="compare against an earlier --output file")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="allowed relative slowdown before --compare fails")
+    args = parser.parse_args()
+
+    # Keep the run offline and quiet: no metrics server, no usage stats
+    os.environ.pop('HEALTHFIT_METRICS', None)
+    os.environ.setdefault('STREAMLIT_BROWSER_GATHER_USAGE_STATS', 'false')
+
+    # Compiles stale catalogs once, before sessions would race to do it
+    warmup = run_load(1, rounds=1, seed=args.seed)
+    if warmup['errors']:
+        print(f"warm-up failed: {warmup['errors'][0]}")
+        sys.exit(1)
+
+    results = []
+    print(f"{'sessions':>8} {'reruns':>7} {'rerun/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'MB/session':>11}")
+    for sessions in args.sessions:
+        result = run_load(sessions, args.rounds, args.think_time, args.seed)
+        results.append(result)
+        print(f"{sessions:>8} {result['reruns']:>7} {result['reruns_per_second']:>8} "
+              f"{result['p50_ms']:>8} {result['p95_ms']:>8} {result['p99_ms']:>8} "
+              f"{result['per_session_mb']:>11}")
+        for error in result['errors']:
+            print(f"  error: {error}")
+        sys.stdout.flush()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'meta': {**environment(), 'rounds': args.rounds, 'think_time': args.think_time,
+                                'seed': args.seed},
+                       'results': results}, f, indent=2)
+
+    failed = any(result['errors'] for result in results)
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        for regression in regressions:
+            print(f"regression: {regression}")
+        failed = failed or bool(regressions)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,296 @@
+"""Benchmark suite over synthetic catalogs, cohorts and histories
+
+Run from the repository root:
+
+    python -m benchmarks.run_suite [--sizes 1000 10000 100000 1000000]
+        [--repeat 3] [--only diet exercise] [--output results.json]
+        [--compare baseline.json]
+
+Every case is timed at each size with fresh synthetic data (see
+benchmarks/synthetic.py), keeping the best of --repeat runs so setup and
+noise stay out of the numbers. Results are written as JSON together with
+the interpreter, library versions and machine they were measured on;
+--compare prints the ratio against an earlier results file, so a change
+can be checked for regressions at every scale.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from benchmarks import synthetic
+from data.cohort_analytics import CohortAnalytics
+from data.data_manager import DataManager
+from modules.diet_recommendation import DietRecommender
+from modules.exercise_recommendation import ExerciseRecommender
+from modules.goal_tracker import GoalTracker
+from modules.health_analytics import HealthAnalytics
+from modules.progress_tracker import ProgressTracker
+from utils import visualization
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+CATALOG_SIZE = 1_000
+PLAN_TARGETS = 50
+
+
+def _calorie_targets(count, seed):
+    return np.random.default_rng(seed).integers(1400, 3200, count).tolist()
+
+
+# Each case takes (size, seed) and returns the call to time; the data it
+# needs is built outside the timed region, and a cleanup attribute on the
+# call, if any, runs after it untimed. Sizes above a case's limit are
+# skipped where a run would take minutes without saying anything new.
+
+def diet_build_index(size, seed):
+    foods = synthetic.food_catalog(size, seed)
+    return lambda: DietRecommender(foods)
+
+
+def diet_meal_plan(size, seed):
+    recommender = DietRecommender(synthetic.food_catalog(size, seed))
+    return lambda: recommender.get_meal_plan(2200, 'Vegetarian')
+
+
+def diet_weekly_plan(size, seed):
+    recommender = DietRecommender(synthetic.food_catalog(size, seed))
+
+    def run():
+        # Skip the plan cache, which would otherwise answer every repeat
+        recommender._weekly_plans.clear()
+        return recommender.get_weekly_meal_plan(2200, 'Vegetarian', seed=seed)
+    return run
+
+
+def diet_optimized_plans(size, seed):
+    recommender = DietRecommender(synthetic.food_catalog(size, seed))
+    targets = _calorie_targets(PLAN_TARGETS, seed)
+    return lambda: recommender.get_optimized_meal_plans(targets, 'Low-Carb')
+
+
+def diet_calories_batch(size, seed):
+    recommender = DietRecommender(synthetic.food_catalog(CATALOG_SIZE, seed))
+    profiles = synthetic.user_profiles(size, seed)
+    return lambda: recommender.calculate_calories_needed_batch(profiles)
+
+
+def exercise_recommend(size, seed):
+    recommender = ExerciseRecommender(synthetic.exercise_catalog(size, seed))
+    return lambda: recommender.create_workout_plan(
+        recommender.recommend_exercises(27.5, 'Moderately Active', 'Weight Loss', ['Joint Pain'], seed=seed))
+
+
+def exercise_plans_batch(size, seed):
+    recommender = ExerciseRecommender(synthetic.exercise_catalog(CATALOG_SIZE, seed))
+    profiles = synthetic.user_profiles(size, seed)
+
+    def run():
+        positions = recommender.recommend_positions_batch(profiles, seed)
+        return recommender.create_workout_plans_batch(positions).total_calories()
+    return run
+
+
+def analytics_append(size, seed):
+    logs = synthetic.daily_logs(size, seed).drop(columns='date')
+    rows = list(logs.itertuples(index=False))
+
+    def run():
+        analytics = HealthAnalytics()
+        for row in rows:
+            analytics.add_daily_data(*row)
+        return analytics.get_health_summary()
+    return run
+
+
+def analytics_summary(size, seed):
+    analytics = HealthAnalytics()
+    analytics.analytics_data = synthetic.daily_logs(size, seed)
+    return analytics.get_health_summary
+
+
+def progress_append(size, seed):
+    logs = synthetic.daily_logs(size, seed)
+    rows = list(zip(logs['weight'], np.full(size, 175.0), logs['workouts'], logs['calories_burned']))
+
+    def run():
+        tracker = ProgressTracker()
+        for row in rows:
+            tracker.add_entry(*row)
+        return tracker.get_workout_summary()
+    return run
+
+
+def progress_calendar(size, seed):
+    logs = synthetic.daily_logs(size, seed)
+
+    def run():
+        # Bin from scratch every time, as on the first render
+        visualization._matrix_cache.clear()
+        return visualization.create_weekly_calendar(logs)
+    return run
+
+
+def goals_evaluate(size, seed):
+    history = synthetic.daily_logs(size, seed)
+    start = history['date'].iloc[0]
+    end = history['date'].iloc[-1]
+
+    # evaluate_goals updates the tracker, so every run gets a fresh one
+    tracker = GoalTracker()
+    tracker.add_goal('Weight Loss', 75.0, end)
+    tracker.add_goal('Exercise Frequency', size // 2, end)
+    tracker.add_goal('Water Intake', 8, end)
+    tracker.add_goal('Calorie Control', 2000, end)
+    tracker.update_goal_progress('Weight Loss', 79.0)
+    tracker.goals = tracker.goals.assign(start_date=start)
+    return lambda: tracker.evaluate_goals(history, today=end)
+
+
+def _storage_case(backend, operation):
+    def case(size, seed):
+        history = synthetic.daily_logs(size, seed)
+        last_month = history['date'].iloc[-30]
+        data_dir = tempfile.mkdtemp(prefix='healthfit-bench-')
+        manager = DataManager(backend, data_dir=data_dir)
+        if operation != 'save':
+            manager.save_user_data('bench', 'analytics', history)
+
+        def run():
+            if operation == 'save':
+                manager.save_user_data('bench', 'analytics', history)
+            elif operation == 'load':
+                manager.load_user_data('bench', 'analytics')
+            else:
+                manager.load_user_data_range('bench', 'analytics', start=last_month)
+
+        def cleanup():
+            manager.close()
+            shutil.rmtree(data_dir, ignore_errors=True)
+        run.cleanup = cleanup
+        return run
+    return case
+
+
+def cohort_refresh(size, seed):
+    """Full cohort refresh over size users with a month of history each"""
+    data_dir = tempfile.mkdtemp(prefix='healthfit-bench-')
+    manager = DataManager('json', data_dir=data_dir)
+    for user in range(size):
+        history = synthetic.daily_logs(30, seed + user)
+        manager.save_user_data(f'user{user}', 'analytics', history)
+        manager.save_user_data(f'user{user}', 'progress', history[['date', 'weight', 'bmi']])
+        manager.save_user_data(f'user{user}', 'goals', [{'goal_type': 'Weight Loss', 'status': 'Achieved'}])
+
+    def run():
+        return CohortAnalytics(data_dir).refresh()
+    run.cleanup = lambda: shutil.rmtree(data_dir, ignore_errors=True)
+    return run
+
+
+# (module, name, setup, largest size worth running)
+CASES = [
+    ('diet', 'build_index', diet_build_index, None),
+    ('diet', 'get_meal_plan', diet_meal_plan, None),
+    ('diet', 'weekly_plan', diet_weekly_plan, None),
+    ('diet', 'optimized_plans_x50', diet_optimized_plans, None),
+    ('diet', 'calories_batch', diet_calories_batch, None),
+    ('exercise', 'recommend_and_plan', exercise_recommend, None),
+    ('exercise', 'plans_batch', exercise_plans_batch, None),
+    ('analytics', 'append_and_summarize', analytics_append, None),
+    ('analytics', 'summary_cold', analytics_summary, None),
+    ('progress', 'append', progress_append, None),
+    ('progress', 'weekly_calendar', progress_calendar, None),
+    ('goals', 'evaluate', goals_evaluate, None),
+    ('cohort', 'refresh', cohort_refresh, 10_000),
+    ('storage', 'json_save', _storage_case('json', 'save'), 100_000),
+    ('storage', 'json_load', _storage_case('json', 'load'), 100_000),
+    ('storage', 'sqlite_save', _storage_case('sqlite', 'save'), 100_000),
+    ('storage', 'sqlite_load_range', _storage_case('sqlite', 'load_range'), 100_000),
+    ('storage', 'columnar_save', _storage_case('columnar', 'save'), None),
+    ('storage', 'columnar_load_range', _storage_case('columnar', 'load_range'), None),
+]
+
+
+def measure(setup, size, repeat, seed):
+    """Best wall-clock seconds of repeat runs, each with freshly built inputs"""
+    best = float('inf')
+    for attempt in range(repeat):
+        run = setup(size, seed + attempt)
+        try:
+            start = time.perf_counter()
+            run()
+            best = min(best, time.perf_counter() - start)
+        finally:
+            getattr(run, 'cleanup', lambda: None)()
+    return best
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpus': os.cpu_count(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+    }
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, 'r') as f:
+        baseline = {(r['case'], r['size']): r['seconds'] for r in json.load(f)['results']}
+    print(f"\n{'case':<36} {'size':>9} {'baseline ms':>12} {'now ms':>10} {'ratio':>7}")
+    for result in results:
+        before = baseline.get((result['case'], result['size']))
+        if before is None:
+            continue
+        ratio = result['seconds'] / before if before else float('nan')
+        flag = '  slower' if ratio > 1.1 else ''
+        print(f"{result['case']:<36} {result['size']:>9} {before * 1000:>12.2f} "
+              f"{result['seconds'] * 1000:>10.2f} {ratio:>7.2f}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--only', nargs='+', help="run only cases of these modules or case names")
+    parser.add_argument('--output', help="write results as JSON to this file")
+    parser.add_argument('--compare', help="print ratios against an earlier --output file")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'case':<36} {'size':>9} {'ms':>10} {'us/item':>9}")
+    for module, name, setup, max_size in CASES:
+        case = f"{module}.{name}"
+        if args.only and module not in args.only and case not in args.only:
+            continue
+        for size in args.sizes:
+            if max_size is not None and size > max_size:
+                continue
+            seconds = measure(setup, size, args.repeat, args.seed)
+            results.append({'case': case, 'size': size, 'seconds': seconds})
+            print(f"{case:<36} {size:>9} {seconds * 1000:>10.2f} {seconds / size * 1e6:>9.3f}")
+            sys.stdout.flush()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'meta': {**environment(), 'repeat': args.repeat, 'seed': args.seed},
+                       'results': results}, f, indent=2)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
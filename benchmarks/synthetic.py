@@ -0,0 +1,103 @@
+"""Synthetic data generators for benchmarks
+
+All generators are seeded and vectorized, so catalogs and histories of a
+million rows can be built in well under a second.
+"""
+
+import numpy as np
+import pandas as pd
+
+MEAL_CATEGORIES = ['breakfast', 'lunch', 'dinner', 'snack']
+HEALTH_LABELS = ['vegetarian', 'vegan', 'low-carb', 'keto']
+FOOD_WORDS = ['Oat', 'Rice', 'Chicken', 'Fish', 'Bean', 'Egg', 'Yogurt', 'Tofu', 'Pasta',
+              'Salad', 'Soup', 'Beef', 'Lentil', 'Cheese', 'Apple', 'Nut', 'Bread', 'Quinoa']
+
+EXERCISE_CATEGORIES = ['Cardio', 'HIIT', 'Strength', 'Flexibility', 'Core']
+DIFFICULTIES = ['Beginner', 'Intermediate', 'Advanced']
+TARGET_MUSCLES = ['Full Body', 'Upper Body', 'Lower Body', 'Core']
+
+ACTIVITY_LEVELS = ['Sedentary', 'Lightly Active', 'Moderately Active', 'Very Active', 'Extra Active']
+FITNESS_GOALS = ['Weight Loss', 'Muscle Gain', 'General Fitness', 'Flexibility']
+HEALTH_CONDITIONS = ['None', 'Joint Pain', 'Back Pain', 'Heart Condition', 'Asthma']
+DIET_PREFERENCES = ['None', 'Vegetarian', 'Vegan', 'Low-Carb', 'Keto', 'Mediterranean']
+
+
+def _label_sets(rng, labels, n, probability):
+    """Comma-separated random subsets of labels, one string per row"""
+    picks = rng.random((n, len(labels))) < probability
+    codes = picks @ (1 << np.arange(len(labels)))
+    table = np.array([','.join(label for bit, label in enumerate(labels) if code >> bit & 1)
+                      for code in range(1 << len(labels))], dtype=object)
+    return table[codes]
+
+
+def food_catalog(n, seed=0):
+    """Food catalog with the columns of data/food_database.csv"""
+    rng = np.random.default_rng(seed)
+    protein = rng.gamma(2.0, 6.0, n).round(1)
+    carbs = rng.gamma(1.5, 12.0, n).round(1)
+    fat = rng.gamma(1.2, 5.0, n).round(1)
+    calories = (4 * protein + 4 * carbs + 9 * fat).round()
+
+    words = np.array(FOOD_WORDS, dtype=object)
+    names = (words[rng.integers(0, len(words), n)] + ' ' + words[rng.integers(0, len(words), n)]
+             + ' ' + np.arange(n).astype(str).astype(object))
+
+    categories = _label_sets(rng, MEAL_CATEGORIES, n, 0.4)
+    categories[categories == ''] = 'snack'
+    return pd.DataFrame({
+        'Food': names,
+        'Calories': calories,
+        'Protein': protein,
+        'Carbohydrates': carbs,
+        'Fat': fat,
+        'Category': categories,
+        'HealthLabels': _label_sets(rng, HEALTH_LABELS, n, 0.3),
+    })
+
+
+def exercise_catalog(n, seed=0):
+    """Exercise catalog with the columns of data/exercise_data.csv"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'Exercise': np.char.add('Exercise ', np.arange(n).astype(str)).astype(object),
+        'Category': np.array(EXERCISE_CATEGORIES, dtype=object)[rng.integers(0, 5, n)],
+        'Difficulty': np.array(DIFFICULTIES, dtype=object)[rng.integers(0, 3, n)],
+        'CaloriesPerHour': rng.integers(120, 700, n),
+        'TargetMuscles': np.array(TARGET_MUSCLES, dtype=object)[rng.integers(0, 4, n)],
+    })
+
+
+def user_profiles(n, seed=0):
+    """User profiles with every input the app's sidebar and planners collect"""
+    rng = np.random.default_rng(seed)
+    weight = rng.normal(75, 15, n).clip(40, 180).round(1)
+    height = rng.normal(170, 10, n).clip(140, 210).round(1)
+    conditions = np.array(HEALTH_CONDITIONS, dtype=object)[rng.integers(0, 5, n)]
+    return pd.DataFrame({
+        'user_id': np.char.add('user', np.arange(n).astype(str)).astype(object),
+        'weight': weight,
+        'height': height,
+        'bmi': weight / (height / 100) ** 2,
+        'age': rng.integers(16, 85, n),
+        'gender': np.array(['Male', 'Female', 'Other'], dtype=object)[rng.integers(0, 3, n)],
+        'activity_level': np.array(ACTIVITY_LEVELS, dtype=object)[rng.integers(0, 5, n)],
+        'goal': np.array(FITNESS_GOALS, dtype=object)[rng.integers(0, 4, n)],
+        'health_conditions': [[condition] for condition in conditions],
+        'diet_preference': np.array(DIET_PREFERENCES, dtype=object)[rng.integers(0, 6, n)],
+    })
+
+
+def daily_logs(n, seed=0, start='2015-01-01'):
+    """Daily HealthAnalytics-style history of n consecutive days"""
+    rng = np.random.default_rng(seed)
+    weight = (80 + np.cumsum(rng.normal(-0.01, 0.2, n))).round(1)
+    return pd.DataFrame({
+        'date': pd.date_range(start, periods=n, freq='D'),
+        'weight': weight,
+        'bmi': (weight / 1.75 ** 2).round(2),
+        'calories_consumed': rng.normal(2200, 300, n).round(),
+        'calories_burned': rng.gamma(2.0, 150, n).round(),
+        'workouts': rng.integers(0, 3, n),
+        'water_intake': rng.integers(3, 12, n).astype(float),
+    })
@@ -0,0 +1,338 @@
+"""Binary columnar catalogs, memory-mapped read-only and shared between processes
+
+A catalog CSV is compiled once into a single file: a JSON header followed
+by one 64-byte aligned buffer per column. Numeric columns are raw arrays;
+text columns use the Arrow large_string layout (validity bitmap, int64
+offsets, UTF-8 data), so with pyarrow installed they are wrapped without
+copying too. Every process that opens the file maps the same pages from
+the OS page cache instead of parsing the CSV into its own DataFrame.
+
+Run from the repository root to compile the bundled catalogs ahead of time:
+
+    python -m data.catalog_store [data/food_database.csv ...]
+"""
+
+import hashlib
+import json
+import logging
+import mmap
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:  # pragma: no cover - text columns are decoded instead
+    pa = None
+
+CATALOG_MAGIC = b'HFCATLG\x00'
+CATALOG_FORMAT = 1
+ALIGNMENT = 64
+CATALOG_DIR = 'data/cache'
+
+FOOD_CATALOG = 'data/food_database.csv'
+EXERCISE_CATALOG = 'data/exercise_data.csv'
+
+# Seconds between checks of the source files by CatalogWatcher.get()
+DEFAULT_CHECK_INTERVAL = 2.0
+
+logger = logging.getLogger(__name__)
+
+
+def catalog_path(source):
+    """Default compiled catalog path for a source CSV"""
+    return os.path.join(CATALOG_DIR, os.path.splitext(os.path.basename(source))[0] + '.catalog')
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _file_signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+def _column_buffers(column):
+    """(kind, dtype, [buffer arrays]) for one DataFrame column"""
+    if pd.api.types.is_bool_dtype(column) or pd.api.types.is_numeric_dtype(column):
+        values = column.to_numpy()
+        return 'numeric', values.dtype.str, [values]
+
+    values = column.astype(object)
+    valid = values.notna().to_numpy()
+    encoded = [str(value).encode('utf-8') if ok else b'' for value, ok in zip(values, valid)]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    data = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    return 'string', None, [np.packbits(valid, bitorder='little'), offsets, data]
+
+
+def compile_catalog(source, target=None):
+    """Compile a catalog CSV into a binary columnar file; returns its path
+
+    The file is written next to the target and renamed over it, so
+    processes still mapping the previous version keep reading it intact.
+    """
+    target = target or catalog_path(source)
+    source_hash = file_hash(source)
+    signature = _file_signature(source)
+    frame = pd.read_csv(source)
+
+    columns, buffers = [], []
+    for name in frame.columns:
+        kind, dtype, arrays = _column_buffers(frame[name])
+        columns.append({'name': name, 'kind': kind, 'dtype': dtype,
+                        'buffers': [[0, array.nbytes] for array in arrays]})
+        buffers.append(arrays)
+
+    header = {
+        'format': CATALOG_FORMAT,
+        'source': os.path.basename(source),
+        'source_hash': source_hash,
+        'source_signature': signature[:2],
+        'rows': len(frame),
+        'columns': columns,
+    }
+    _write_file(target, header, columns, buffers)
+    return target
+
+
+def _write_file(target, header, entries, buffers):
+    """Write header and the aligned buffers of each entry, then rename over target
+
+    Each entry's 'buffers' list of [offset, size] pairs is filled in here.
+    """
+    # Buffer offsets depend on the header length, which depends on the
+    # offsets; leave room for the digits before laying them out
+    header_size = len(json.dumps(header)) + 32 * sum(len(arrays) for arrays in buffers) + 256
+    offset = -(-(len(CATALOG_MAGIC) + 8 + header_size) // ALIGNMENT) * ALIGNMENT
+    for entry, arrays in zip(entries, buffers):
+        for pair, array in zip(entry['buffers'], arrays):
+            pair[0] = offset
+            offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+    encoded = json.dumps(header).encode('utf-8').ljust(header_size)
+
+    os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+    tmp_path = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(CATALOG_MAGIC)
+        f.write(np.uint64(header_size).tobytes())
+        f.write(encoded)
+        for entry, arrays in zip(entries, buffers):
+            for (start, _), array in zip(entry['buffers'], arrays):
+                f.write(b'\x00' * (start - f.tell()))
+                f.write(np.ascontiguousarray(array).tobytes())
+    os.replace(tmp_path, target)
+
+
+def save_arrays(path, arrays, **meta):
+    """Save a dict of numpy arrays in the catalog layout, for map_arrays()
+
+    Indexes derived from a catalog are saved this way so that processes
+    map them like the catalog itself. meta is kept in the header.
+    """
+    entries = [{'name': name, 'dtype': array.dtype.str, 'shape': list(array.shape), 'buffers': [[0, array.nbytes]]}
+               for name, array in arrays.items()]
+    _write_file(path, {'format': CATALOG_FORMAT, 'arrays': entries, **meta}, entries,
+                [[array] for array in arrays.values()])
+
+
+def map_arrays(path):
+    """(header, {name: read-only array}) of a file written by save_arrays, or None"""
+    header = read_header(path)
+    if header is None or 'arrays' not in header:
+        return None
+    with open(path, 'rb') as f:
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    # The arrays keep the mapping alive
+    arrays = {}
+    for entry in header['arrays']:
+        (start, size), = entry['buffers']
+        dtype = np.dtype(entry['dtype'])
+        if size == 0:
+            arrays[entry['name']] = np.empty(entry['shape'], dtype=dtype)
+        else:
+            arrays[entry['name']] = np.frombuffer(mapping, dtype=dtype, count=size // dtype.itemsize,
+                                                  offset=start).reshape(entry['shape'])
+    return header, arrays
+
+
+def read_header(path):
+    """Header dict of a compiled catalog, or None if missing or unreadable"""
+    try:
+        with open(path, 'rb') as f:
+            if f.read(len(CATALOG_MAGIC)) != CATALOG_MAGIC:
+                return None
+            size = int(np.frombuffer(f.read(8), dtype=np.uint64)[0])
+            header = json.loads(f.read(size))
+    except (OSError, ValueError, IndexError):
+        return None
+    return header if header.get('format') == CATALOG_FORMAT else None
+
+
+def _string_column(rows, validity, offsets, data):
+    if pa is not None:
+        array = pa.Array.from_buffers(pa.large_string(), rows,
+                                      [pa.py_buffer(validity), pa.py_buffer(offsets), pa.py_buffer(data)])
+        return pd.array(array, dtype='str')
+    valid = np.unpackbits(validity, count=rows, bitorder='little').astype(bool)
+    raw = data.tobytes()
+    values = [raw[offsets[i]:offsets[i + 1]].decode('utf-8') if valid[i] else None for i in range(rows)]
+    return pd.array(values, dtype='str')
+
+
+class Catalog:
+    """A compiled catalog mapped read-only, with its columns as a DataFrame
+
+    Numeric columns (and text columns when pyarrow is available) are views
+    of the mapping, so they must be treated as read-only. The mapping stays
+    valid after the file is replaced by a newer version.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.header = read_header(path)
+        if self.header is None:
+            raise ValueError(f"{path} is not a compiled catalog")
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.signature = _file_signature(path)
+
+        rows = self.header['rows']
+        columns = {}
+        for column in self.header['columns']:
+            buffers = [np.frombuffer(self._map, dtype=np.uint8, count=size, offset=start)
+                       for start, size in column['buffers']]
+            if column['kind'] == 'numeric':
+                columns[column['name']] = buffers[0].view(np.dtype(column['dtype']))
+            else:
+                columns[column['name']] = _string_column(rows, buffers[0], buffers[1].view(np.int64), buffers[2])
+        self.frame = pd.DataFrame(columns, copy=False)
+
+    @property
+    def version(self):
+        return self.header['source_hash'][:12]
+
+
+def is_current(source, target):
+    """Whether the catalog at target was compiled from the current source file"""
+    header = read_header(target)
+    if header is None:
+        return False
+    signature = _file_signature(source)
+    if signature is not None and list(signature[:2]) == header['source_signature']:
+        return True
+    # Touched but maybe unchanged: only the content decides
+    return signature is not None and file_hash(source) == header['source_hash']
+
+
+def open_catalog(source, target=None):
+    """Map the compiled catalog of source, compiling it first if missing or stale"""
+    target = target or catalog_path(source)
+    if not is_current(source, target):
+        compile_catalog(source, target)
+    return Catalog(target)
+
+
+class CatalogWatcher:
+    """An object built from a catalog, swapped for a new one when the catalog changes
+
+    build is called with the Catalog, e.g. DietRecommender.from_catalog.
+    get() returns the current object at once; at most every interval
+    seconds it also checks the source CSV and the compiled file, and if
+    either changed, compiles and builds the new version on a background
+    thread. Requests already holding the previous object finish with it,
+    and other processes watching the same files pick up the new compiled
+    file without compiling it again.
+    """
+
+    def __init__(self, source, build, target=None, interval=DEFAULT_CHECK_INTERVAL):
+        self.source = source
+        self.build = build
+        self.target = target or catalog_path(source)
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._reloading = None
+        self.reloads = 0
+        self.last_error = None
+        self._current = self._load()
+        self._checked = time.monotonic()
+
+    def _load(self):
+        catalog = open_catalog(self.source, self.target)
+        signatures = (_file_signature(self.source), catalog.signature)
+        return catalog, self.build(catalog), signatures
+
+    @property
+    def version(self):
+        return self._current[0].version
+
+    @property
+    def catalog(self):
+        return self._current[0]
+
+    def get(self):
+        """The object built from the latest catalog version"""
+        if time.monotonic() - self._checked >= self.interval:
+            self.check()
+        return self._current[1]
+
+    def _changed(self):
+        _, _, (source, target) = self._current
+        return _file_signature(self.source) != source or _file_signature(self.target) != target
+
+    def check(self, wait=False):
+        """Start a reload if the files changed; with wait, block until it is done"""
+        self._checked = time.monotonic()
+        with self._lock:
+            reloading = self._reloading
+            if reloading is None and self._changed():
+                reloading = self._reloading = threading.Thread(target=self._reload, daemon=True,
+                                                               name='catalog-reload')
+                reloading.start()
+        if wait and reloading is not None:
+            reloading.join()
+
+    def _reload(self):
+        try:
+            catalog, built, _ = self._current
+            if is_current(self.source, self.target) and _file_signature(self.target) == catalog.signature:
+                # Touched but not changed: keep the object already built
+                current = (catalog, built, (_file_signature(self.source), catalog.signature))
+            else:
+                current = self._load()
+                self.reloads += 1
+            # A single reference swap: readers see the old or the new version
+            self._current = current
+            self.last_error = None
+        except Exception as error:
+            # Any failure, including one in build, keeps the last good
+            # version serving; the next check retries
+            logger.exception("Reloading catalog %s failed", self.source)
+            self.last_error = error
+        finally:
+            with self._lock:
+                self._reloading = None
+
+
+def main():
+    sources = sys.argv[1:] or [FOOD_CATALOG, EXERCISE_CATALOG]
+    for source in sources:
+        target = compile_catalog(source)
+        print(f"{source} -> {target} ({read_header(target)['rows']} rows)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,357 @@
+import json
+import os
+import pickle
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from data.storage import JsonStorage
+
+# Data types read for the cohort, and the columns needed from each history
+COHORT_COLUMNS = {
+    'progress': ['date', 'bmi'],
+    'analytics': ['date', 'bmi', 'calories_consumed', 'calories_burned'],
+    'goals': None,
+}
+
+# Latest-BMI histogram bins; the first and last are open-ended
+BMI_EDGES = np.concatenate([[-np.inf], np.arange(15.0, 45.5, 0.5), [np.inf]])
+BMI_CATEGORIES = {
+    'Underweight': (-np.inf, 18.5),
+    'Normal': (18.5, 25.0),
+    'Overweight': (25.0, 30.0),
+    'Obese': (30.0, np.inf),
+}
+
+USERS_PER_TASK = 256
+TASKS_PER_WORKER = 2
+STATE_FORMAT = 2
+
+
+def discover_users(storage):
+    """Map every user id in a storage backend to its {data_type: version}
+
+    Users are enumerated through StorageBackend.versions(), so every
+    backend is covered; only the data types in COHORT_COLUMNS are kept.
+    """
+    users = {}
+    for user_id, data_type, version in storage.versions():
+        if data_type in COHORT_COLUMNS:
+            users.setdefault(user_id, {})[data_type] = version
+    return users
+
+
+def user_signature(versions):
+    """Versions of a user's stored data types, to detect changes"""
+    return tuple(sorted(versions.items()))
+
+
+def _read_history(storage, user_id, data_type, columns):
+    """Named columns of a stored history as a dict of arrays (missing ones left out)"""
+    if type(storage) is not JsonStorage:
+        frame = storage.load_range(user_id, data_type, columns=columns)
+        if frame is None:
+            return {}
+        return {column: frame[column].to_numpy(dtype=object if column == 'date' else float,
+                                               na_value=None if column == 'date' else np.nan)
+                for column in frame.columns}
+
+    # JSON histories are read straight into arrays, without a DataFrame
+    try:
+        with open(storage.path(user_id, data_type), 'r') as f:
+            records = json.load(f)['data']
+    except FileNotFoundError:
+        return {}
+    # Records need not share their keys, so every one of them is checked
+    present = set().union(*records) if records else set()
+    return {column: np.array([record.get(column) for record in records],
+                             dtype=object if column == 'date' else float)
+            for column in columns if column in present}
+
+
+def _storage_source(storage):
+    """Backend type and location, to tell which storage a saved state is for"""
+    location = getattr(storage, 'db_path', None) or getattr(storage, 'data_dir', None)
+    return type(storage).__name__, os.path.abspath(location) if location else None
+
+
+def _to_days(dates):
+    try:
+        # Stored dates are datetime64 or 'YYYY-MM-DD', which NumPy parses directly
+        return dates.astype('datetime64[D]')
+    except (ValueError, TypeError):
+        return pd.to_datetime(pd.Series(dates), errors='coerce', format='mixed').to_numpy().astype('datetime64[D]')
+
+
+def summarize_user(storage, user_id, data_types):
+    """Compact per-user contribution to the cohort aggregates
+
+    Holds the user's latest BMI, their total calorie balance and the days
+    it covers, goal counts per type and the Mondays of the weeks they
+    logged anything, so it costs a few hundred bytes whatever the length
+    of the history.
+    """
+    latest_date, bmi = None, np.nan
+    balance, balance_days = 0.0, 0
+    active_days = []
+    for data_type in ('progress', 'analytics'):
+        if data_type not in data_types:
+            continue
+        history = _read_history(storage, user_id, data_type, COHORT_COLUMNS[data_type])
+        if 'date' not in history:
+            continue
+        days = _to_days(history['date'])
+        active_days.append(days[~np.isnat(days)])
+
+        if 'bmi' in history:
+            valid = ~np.isnat(days) & ~np.isnan(history['bmi'])
+            if valid.any():
+                last = np.flatnonzero(valid)[days[valid].argmax()]
+                if latest_date is None or days[last] >= latest_date:
+                    latest_date, bmi = days[last], float(history['bmi'][last])
+
+        if 'calories_consumed' in history and 'calories_burned' in history:
+            daily = history['calories_consumed'] - history['calories_burned']
+            daily = daily[~np.isnan(daily)]
+            balance += float(daily.sum())
+            balance_days += len(daily)
+
+    weeks = np.empty(0, dtype=np.int64)
+    if active_days:
+        days = np.concatenate(active_days).astype(np.int64)
+        # Monday of each ISO week (1970-01-01 was a Thursday)
+        weeks = np.unique(days - (days + 3) % 7)
+
+    goals = Counter()
+    if 'goals' in data_types:
+        for goal in storage.load(user_id, 'goals') or []:
+            goals[(goal.get('goal_type'), goal.get('status'))] += 1
+
+    return {'bmi': bmi, 'balance': balance, 'balance_days': balance_days,
+            'goals': goals, 'weeks': weeks}
+
+
+def summarize_users(storage, batch):
+    """[(user_id, summary)] for a batch of (user_id, data_types) pairs"""
+    return [(user_id, summarize_user(storage, user_id, data_types)) for user_id, data_types in batch]
+
+
+class CohortAggregates:
+    """Population aggregates that add and subtract per-user summaries
+
+    Every statistic is a sum or a count, so two aggregates merge by adding
+    them, and a user whose data changed is refreshed by removing their old
+    summary and adding the new one. The size is fixed by the number of BMI
+    bins, goal types and calendar weeks, not by the number of users.
+    """
+
+    def __init__(self):
+        self.users = 0
+        self.bmi_counts = np.zeros(len(BMI_EDGES) - 1, dtype=np.int64)
+        self.bmi_sum = 0.0
+        self.bmi_sum_sq = 0.0
+        self.balance = 0.0
+        self.balance_days = 0
+        self.balance_users = 0
+        self.goals = Counter()
+        self.weekly_active = Counter()
+
+    def _apply(self, summary, sign):
+        self.users += sign
+        bmi = summary['bmi']
+        if not np.isnan(bmi):
+            self.bmi_counts[np.searchsorted(BMI_EDGES, bmi, side='right') - 1] += sign
+            self.bmi_sum += sign * bmi
+            self.bmi_sum_sq += sign * bmi * bmi
+        if summary['balance_days']:
+            self.balance += sign * summary['balance']
+            self.balance_days += sign * summary['balance_days']
+            self.balance_users += sign
+        for key, count in summary['goals'].items():
+            self.goals[key] += sign * count
+        for week in summary['weeks'].tolist():
+            self.weekly_active[week] += sign
+
+    def add(self, summary):
+        self._apply(summary, 1)
+
+    def remove(self, summary):
+        self._apply(summary, -1)
+
+    def merge(self, other):
+        """Add the totals of another CohortAggregates into this one"""
+        self.users += other.users
+        self.bmi_counts += other.bmi_counts
+        self.bmi_sum += other.bmi_sum
+        self.bmi_sum_sq += other.bmi_sum_sq
+        self.balance += other.balance
+        self.balance_days += other.balance_days
+        self.balance_users += other.balance_users
+        self.goals.update(other.goals)
+        self.weekly_active.update(other.weekly_active)
+        return self
+
+    def report(self):
+        """Population statistics as plain Python values"""
+        bmi_users = int(self.bmi_counts.sum())
+        mean = self.bmi_sum / bmi_users if bmi_users else None
+        std = None
+        if bmi_users:
+            std = float(np.sqrt(max(self.bmi_sum_sq / bmi_users - mean * mean, 0.0)))
+
+        categories = {}
+        for name, (low, high) in BMI_CATEGORIES.items():
+            bins = (BMI_EDGES[:-1] >= low) & (BMI_EDGES[1:] <= high)
+            categories[name] = int(self.bmi_counts[bins].sum())
+
+        goal_types = {}
+        for (goal_type, status), count in self.goals.items():
+            if count:
+                counts = goal_types.setdefault(goal_type, Counter())
+                counts[status] += count
+        achievement = {
+            goal_type: {'goals': sum(counts.values()),
+                        'achieved': counts['Achieved'],
+                        'rate': counts['Achieved'] / sum(counts.values())}
+            for goal_type, counts in sorted(goal_types.items(), key=lambda item: str(item[0]))
+        }
+        total_goals = sum(item['goals'] for item in achievement.values())
+        achieved = sum(item['achieved'] for item in achievement.values())
+
+        weeks = sorted(week for week, count in self.weekly_active.items() if count)
+        weekly_active = pd.Series([self.weekly_active[week] for week in weeks],
+                                  index=pd.DatetimeIndex(np.array(weeks, dtype='datetime64[D]'), name='week'),
+                                  dtype='int64', name='active_users')
+        return {
+            'users': self.users,
+            'bmi': {
+                'users': bmi_users,
+                'mean': mean,
+                'std': std,
+                'categories': categories,
+                'histogram': (BMI_EDGES, self.bmi_counts.copy()),
+            },
+            'calorie_balance': {
+                'users': self.balance_users,
+                'days': self.balance_days,
+                'avg_daily': self.balance / self.balance_days if self.balance_days else None,
+            },
+            'goals': {
+                'goals': total_goals,
+                'achieved': achieved,
+                'rate': achieved / total_goals if total_goals else None,
+                'by_type': achievement,
+            },
+            'weekly_active_users': weekly_active,
+        }
+
+
+class CohortAnalytics:
+    """Population analytics over every user in a storage backend
+
+    storage is any StorageBackend, or a directory of JsonStorage files.
+    refresh() lists the stored users, re-reads only the users whose data
+    was added, changed or removed since the last refresh and updates the
+    aggregates in place. Users are read in batches by a pool of worker
+    processes, with a bounded number of batches in flight, so only the
+    compact per-user summaries are kept, never the histories themselves.
+    With state_path the summaries are saved between runs, making the next
+    run incremental as well.
+    """
+
+    def __init__(self, storage='data/user_data', state_path=None, workers=None,
+                 users_per_task=USERS_PER_TASK):
+        if isinstance(storage, str):
+            storage = JsonStorage(storage)
+        self.storage = storage
+        self.state_path = state_path
+        self.workers = workers
+        self.users_per_task = users_per_task
+        self.aggregates = CohortAggregates()
+        # user_id -> (signature, summary)
+        self._users = {}
+        if state_path is not None:
+            self._load_state()
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, 'rb') as f:
+                state = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return
+        if state.get('format') != STATE_FORMAT or \
+                tuple(state.get('source', ())) != _storage_source(self.storage):
+            return
+        self._users = state['users']
+        for _, summary in self._users.values():
+            self.aggregates.add(summary)
+
+    def _save_state(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.state_path)), exist_ok=True)
+        tmp_path = f"{self.state_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({'format': STATE_FORMAT, 'source': _storage_source(self.storage),
+                         'users': self._users}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.state_path)
+
+    def _batches(self, users):
+        batch = []
+        for user_id, data_types in users:
+            batch.append((user_id, data_types))
+            if len(batch) >= self.users_per_task:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _summarize(self, users):
+        """Yield (user_id, summary) for the given users, in parallel unless workers == 0"""
+        if self.workers == 0 or len(users) <= self.users_per_task:
+            for batch in self._batches(users):
+                yield from summarize_users(self.storage, batch)
+            return
+
+        workers = self.workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            for batch in self._batches(users):
+                if len(pending) >= workers * TASKS_PER_WORKER:
+                    yield from pending.popleft().result()
+                pending.append(executor.submit(summarize_users, self.storage, batch))
+            while pending:
+                yield from pending.popleft().result()
+
+    def refresh(self):
+        """Bring the aggregates up to date with the stored data; returns refresh statistics"""
+        started = time.perf_counter()
+        found = discover_users(self.storage)
+
+        removed = [user_id for user_id in self._users if user_id not in found]
+        for user_id in removed:
+            self.aggregates.remove(self._users.pop(user_id)[1])
+
+        changed, signatures = [], {}
+        for user_id, versions in found.items():
+            signature = user_signature(versions)
+            cached = self._users.get(user_id)
+            if cached is None or cached[0] != signature:
+                changed.append((user_id, tuple(versions)))
+                signatures[user_id] = signature
+
+        for user_id, summary in self._summarize(changed):
+            cached = self._users.get(user_id)
+            if cached is not None:
+                self.aggregates.remove(cached[1])
+            self.aggregates.add(summary)
+            self._users[user_id] = (signatures[user_id], summary)
+
+        if self.state_path is not None and (changed or removed):
+            self._save_state()
+        return {'users': len(found), 'refreshed': len(changed), 'removed': len(removed),
+                'seconds': time.perf_counter() - started}
+
+    def report(self):
+        return self.aggregates.report()
@@ -0,0 +1,257 @@
+import glob
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from data.storage import StorageBackend, JsonStorage, TABULAR_TYPES, split_key
+
+DATE_DTYPE = np.dtype('datetime64[s]')
+
+# Times a load is retried while a rewrite swaps the history directory
+READ_RETRIES = 50
+READ_RETRY_DELAY = 0.01
+
+
+def _unique_suffix():
+    return f"{os.getpid()}.{threading.get_ident()}"
+
+
+def _write_json_atomic(path, document):
+    tmp_path = f"{path}.{_unique_suffix()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(document, f)
+    os.replace(tmp_path, path)
+
+
+def _to_columns(data):
+    """Split a DataFrame or list of records into typed arrays and object columns"""
+    frame = pd.DataFrame(data)
+    arrays, objects = {}, {}
+    for name in frame.columns:
+        column = frame[name]
+        if name == 'date':
+            arrays[name] = pd.to_datetime(column).to_numpy().astype(DATE_DTYPE)
+        elif pd.api.types.is_bool_dtype(column) or pd.api.types.is_numeric_dtype(column):
+            arrays[name] = column.to_numpy()
+        else:
+            objects[name] = column.astype(object).where(column.notna(), None).tolist()
+    return arrays, objects
+
+
+class ColumnarStorage(StorageBackend):
+    """Memory-mapped column files for progress/analytics histories
+
+    Each history is a directory with one raw fixed-width file per numeric
+    column (dates as datetime64), a JSON file for text columns and a
+    meta.json with the dtypes and row count. Loads map the column files
+    read-only and copy out only the requested date range and columns, so
+    the cost of showing the last 30 days does not grow with the length of
+    the history. Appends write to the end of each column file. A full
+    rewrite builds a new directory and swaps it in, and loads caught in the
+    swap are retried. Other data types are stored as JSON documents.
+    """
+
+    def __init__(self, data_dir='data/user_data'):
+        self.data_dir = data_dir
+        self.documents = JsonStorage(data_dir)
+
+    def path(self, user_id, data_type):
+        return f"{self.data_dir}/{user_id}_{data_type}.columns"
+
+    def _read_meta(self, path):
+        try:
+            with open(os.path.join(path, 'meta.json'), 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            # Between moving the old directory aside and renaming the new
+            # one into place, the history is only missing for a moment
+            if glob.glob(f"{glob.escape(path)}.*.old"):
+                raise
+            return None
+
+    def _read_objects(self, path):
+        with open(os.path.join(path, 'objects.json'), 'r') as f:
+            return json.load(f)
+
+    def _map(self, path, meta, name):
+        length = meta['length']
+        if length == 0:
+            return np.empty(0, dtype=meta['dtypes'][name])
+        return np.memmap(os.path.join(path, f"{name}.bin"), dtype=meta['dtypes'][name],
+                         mode='r', shape=(length,))
+
+    def _write(self, path, arrays, objects, sorted_dates):
+        suffix = _unique_suffix()
+        tmp_path = f"{path}.{suffix}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        for name, array in arrays.items():
+            np.ascontiguousarray(array).tofile(os.path.join(tmp_path, f"{name}.bin"))
+        _write_json_atomic(os.path.join(tmp_path, 'objects.json'), objects)
+        length = len(next(iter(arrays.values()))) if arrays else len(next(iter(objects.values()), []))
+        _write_json_atomic(os.path.join(tmp_path, 'meta.json'), {
+            'length': length,
+            'dtypes': {name: array.dtype.str for name, array in arrays.items()},
+            'columns': list(arrays) + list(objects),
+            'sorted': sorted_dates,
+            # Tells loads that the directory was swapped while they read it
+            'version': f"{suffix}.{time.time_ns()}",
+        })
+
+        # A directory cannot be renamed over a non-empty one, so the old
+        # history is moved aside first and deleted once the new one is in
+        # place. Readers still mapping its files keep reading them.
+        old_path = f"{path}.{suffix}.old"
+        while True:
+            shutil.rmtree(old_path, ignore_errors=True)
+            try:
+                os.rename(path, old_path)
+            except FileNotFoundError:
+                pass
+            try:
+                os.replace(tmp_path, path)
+                break
+            except OSError:
+                # Another writer renamed its version into place meanwhile
+                if not os.path.isdir(path):
+                    raise
+        shutil.rmtree(old_path, ignore_errors=True)
+
+    @staticmethod
+    def _is_sorted(dates):
+        return bool(len(dates) < 2 or (dates[1:] >= dates[:-1]).all())
+
+    def save(self, user_id, data_type, data):
+        if data_type not in TABULAR_TYPES:
+            self.documents.save(user_id, data_type, data)
+            return
+        arrays, objects = _to_columns(data)
+        dates = arrays.get('date', np.empty(0, dtype=DATE_DTYPE))
+        self._write(self.path(user_id, data_type), arrays, objects, self._is_sorted(dates))
+
+    def append(self, user_id, data_type, rows):
+        if data_type not in TABULAR_TYPES:
+            return super().append(user_id, data_type, rows)
+
+        path = self.path(user_id, data_type)
+        meta = self._read_meta(path)
+        arrays, objects = _to_columns(rows)
+        if meta is None or set(meta['columns']) != set(arrays) | set(objects) or \
+                set(meta['dtypes']) != set(arrays) or \
+                any(arrays[name].dtype.str != dtype for name, dtype in meta['dtypes'].items()):
+            # New history or a schema change: fall back to a full rewrite
+            existing = self.load(user_id, data_type)
+            rows = pd.DataFrame(rows)
+            self.save(user_id, data_type, rows if existing is None else pd.concat([existing, rows]))
+            return
+
+        count = len(arrays['date']) if 'date' in arrays else len(next(iter(objects.values())))
+        if meta['length'] and 'date' in arrays and count:
+            last_date = self._map(path, meta, 'date')[-1]
+            meta['sorted'] = meta['sorted'] and bool(arrays['date'][0] >= last_date) and \
+                self._is_sorted(arrays['date'])
+
+        # Rows past the committed length are left over from an append that
+        # did not finish, so they are dropped before appending
+        for name, array in arrays.items():
+            with open(os.path.join(path, f"{name}.bin"), 'r+b') as f:
+                f.truncate(meta['length'] * array.dtype.itemsize)
+                f.seek(0, os.SEEK_END)
+                f.write(np.ascontiguousarray(array).tobytes())
+        if objects:
+            stored = self._read_objects(path)
+            for name, values in objects.items():
+                stored[name] = stored[name][:meta['length']] + values
+            _write_json_atomic(os.path.join(path, 'objects.json'), stored)
+
+        # The row count is committed last, so readers never map a partial append
+        meta['length'] += count
+        _write_json_atomic(os.path.join(path, 'meta.json'), meta)
+
+    def versions(self):
+        for user_id, data_type, version in self.documents.versions():
+            if data_type not in TABULAR_TYPES:
+                yield user_id, data_type, version
+        for path in sorted(glob.glob(os.path.join(glob.escape(self.data_dir), '*.columns'))):
+            key = split_key(os.path.basename(path)[:-len('.columns')])
+            if key is None:
+                continue
+            try:
+                # meta.json is rewritten by every save and append
+                stat = os.stat(os.path.join(path, 'meta.json'))
+            except FileNotFoundError:
+                continue
+            yield key + ((stat.st_mtime_ns, stat.st_size),)
+
+    def load(self, user_id, data_type):
+        if data_type not in TABULAR_TYPES:
+            return self.documents.load(user_id, data_type)
+        return self.load_range(user_id, data_type)
+
+    def load_range(self, user_id, data_type, start=None, end=None, columns=None):
+        if data_type not in TABULAR_TYPES:
+            return super().load_range(user_id, data_type, start, end, columns)
+
+        path = self.path(user_id, data_type)
+        for attempt in range(READ_RETRIES):
+            meta = None
+            try:
+                meta = self._read_meta(path)
+                if meta is None:
+                    return None
+                frame = self._read_rows(path, meta, start, end, columns)
+            except (OSError, ValueError, IndexError, KeyError):
+                # Files of a version swapped in mid-read can be missing or
+                # shorter than the meta read before them
+                if attempt == READ_RETRIES - 1 or not self._swapped(path, meta):
+                    raise
+                time.sleep(READ_RETRY_DELAY)
+                continue
+            if not self._swapped(path, meta):
+                break
+        return frame
+
+    def _swapped(self, path, meta):
+        """Whether the history at path is no longer the version meta was read from"""
+        try:
+            current = self._read_meta(path)
+        except FileNotFoundError:
+            return True
+        return meta is None or current is None or current.get('version') != meta.get('version')
+
+    def _read_rows(self, path, meta, start, end, columns):
+        columns = meta['columns'] if columns is None else [c for c in meta['columns'] if c in columns]
+
+        rows = slice(0, meta['length'])
+        if (start is not None or end is not None) and 'date' in meta['dtypes']:
+            dates = self._map(path, meta, 'date')
+            lower = np.datetime64(pd.Timestamp(start), 's') if start is not None else None
+            upper = np.datetime64(pd.Timestamp(end), 's') if end is not None else None
+            if meta['sorted']:
+                first = 0 if lower is None else int(np.searchsorted(dates, lower, side='left'))
+                last = len(dates) if upper is None else int(np.searchsorted(dates, upper, side='right'))
+                rows = slice(first, last)
+            else:
+                mask = np.ones(len(dates), dtype=bool)
+                if lower is not None:
+                    mask &= dates >= lower
+                if upper is not None:
+                    mask &= dates <= upper
+                rows = np.flatnonzero(mask)
+
+        objects = None
+        frame = {}
+        for name in columns:
+            if name in meta['dtypes']:
+                frame[name] = np.array(self._map(path, meta, name)[rows])
+            else:
+                if objects is None:
+                    objects = self._read_objects(path)
+                values = np.array(objects[name], dtype=object)
+                frame[name] = values[rows]
+        return pd.DataFrame(frame, columns=columns)
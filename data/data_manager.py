@@ -1,35 +1,102 @@
-import json
-import os
-from datetime import datetime
 import pandas as pd
 
+from data.cohort_analytics import CohortAnalytics
+from data.storage import JsonStorage, SQLiteStorage, TABULAR_TYPES
+from data.columnar_storage import ColumnarStorage
+from data.write_behind import WriteBehindQueue
+from utils.metrics import instrumented
 
+
+@instrumented('data')
 class DataManager:
-    def __init__(self):
-        self.data_dir = 'data/user_data'
-        os.makedirs(self.data_dir, exist_ok=True)
+    def __init__(self, backend='json', db_path=None, write_behind=False, data_dir='data/user_data',
+                 **queue_options):
+        self.data_dir = data_dir
+        if backend == 'json':
+            # Background flushes can afford to fsync every file
+            self.storage = JsonStorage(self.data_dir, fsync=write_behind)
+        elif backend == 'sqlite':
+            self.storage = SQLiteStorage(db_path or f"{self.data_dir}/healthfit.db")
+        elif backend == 'columnar':
+            self.storage = ColumnarStorage(self.data_dir)
+        else:
+            # Any object implementing the StorageBackend interface
+            self.storage = backend
 
-    def save_user_data(self, user_id, data_type, data):
-        """Save user data to JSON file"""
-        filename = f"{self.data_dir}/{user_id}_{data_type}.json"
+        # Optional write-behind mode: saves are queued and written by a
+        # background thread, see WriteBehindQueue for the options
+        self.write_queue = WriteBehindQueue(self.storage, **queue_options) if write_behind else None
 
-        # Convert data to serializable format
-        if isinstance(data, pd.DataFrame):
-            data = data.to_dict('records')
+    def _flush_key(self, user_id, data_type):
+        if self.write_queue is not None and self.write_queue.is_pending((user_id, data_type)):
+            self.write_queue.flush()
 
-        with open(filename, 'w') as f:
-            json.dump({
-                'timestamp': datetime.now().isoformat(),
-                'data': data
-            }, f)
+    def save_user_data(self, user_id, data_type, data):
+        """Save user data to the storage backend"""
+        if self.write_queue is not None:
+            self.write_queue.put((user_id, data_type), data)
+        else:
+            self.storage.save(user_id, data_type, data)
 
     def load_user_data(self, user_id, data_type):
-        """Load user data from JSON file"""
-        filename = f"{self.data_dir}/{user_id}_{data_type}.json"
-        if os.path.exists(filename):
-            with open(filename, 'r') as f:
-                data = json.load(f)
-                if data_type in ['progress', 'analytics']:
-                    return pd.DataFrame(data['data'])
-                return data['data']
-        return None
+        """Load user data from the storage backend"""
+        if self.write_queue is not None:
+            # Read-your-writes: serve saves that have not been flushed yet
+            found, data = self.write_queue.get((user_id, data_type))
+            if found:
+                if data_type in TABULAR_TYPES and not isinstance(data, pd.DataFrame):
+                    return pd.DataFrame(data)
+                return data
+        return self.storage.load(user_id, data_type)
+
+    def append_user_data(self, user_id, data_type, rows):
+        """Append rows to a progress/analytics history"""
+        self._flush_key(user_id, data_type)
+        self.storage.append(user_id, data_type, rows)
+
+    def load_user_data_range(self, user_id, data_type, start=None, end=None, columns=None):
+        """Load progress/analytics rows dated between start and end, inclusive
+
+        columns optionally limits the result to the named columns.
+        """
+        self._flush_key(user_id, data_type)
+        return self.storage.load_range(user_id, data_type, start, end, columns)
+
+    def migrate_to_sqlite(self, db_path=None):
+        """Copy every JSON user file into SQLite and switch to that backend
+
+        Returns the number of files migrated.
+        """
+        if self.write_queue is not None:
+            self.write_queue.flush()
+        storage = SQLiteStorage(db_path or f"{self.data_dir}/healthfit.db")
+        migrated = storage.migrate_from_json(self.data_dir)
+        self.storage = storage
+        if self.write_queue is not None:
+            self.write_queue.storage = storage
+        return migrated
+
+    def cohort_analytics(self, **options):
+        """CohortAnalytics over every user in the storage backend
+
+        Options are passed on to CohortAnalytics (state_path, workers,
+        users_per_task).
+        """
+        self.flush()
+        return CohortAnalytics(self.storage, **options)
+
+    def flush(self):
+        """Write out every queued save (no-op without write-behind)"""
+        if self.write_queue is not None:
+            self.write_queue.flush()
+
+    def close(self):
+        """Flush queued saves and stop the write-behind thread"""
+        if self.write_queue is not None:
+            self.write_queue.close()
+
+    def write_stats(self):
+        """Write-behind queue depth and flush latency counters"""
+        if self.write_queue is None:
+            return None
+        return self.write_queue.stats()
@@ -0,0 +1,446 @@
+import glob
+import hashlib
+import json
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+# Data types stored as one row per day rather than a single document
+TABULAR_TYPES = ('progress', 'analytics')
+
+# Data types the app stores. Files are named {user_id}_{data_type}, and
+# several data types contain an underscore themselves
+DATA_TYPES = TABULAR_TYPES + ('goals', 'meal_plan', 'workout_plan', 'user_profile')
+
+
+def split_key(name, data_types=DATA_TYPES):
+    """(user_id, data_type) of a {user_id}_{data_type} name, or None
+
+    A known data type is matched as the whole suffix; any other name is
+    split at its last underscore.
+    """
+    for data_type in sorted(data_types, key=len, reverse=True):
+        if name.endswith(f"_{data_type}") and len(name) > len(data_type) + 1:
+            return name[:-len(data_type) - 1], data_type
+    if '_' in name:
+        return tuple(name.rsplit('_', 1))
+    return None
+
+
+def _to_records(data):
+    """Convert a DataFrame (or list of dicts) into JSON-serializable records"""
+    if isinstance(data, pd.DataFrame):
+        dates = data.select_dtypes('datetime').columns
+        data = data.assign(**{column: data[column].dt.strftime('%Y-%m-%d') for column in dates})
+        data = data.to_dict('records')
+    return data
+
+
+def _select_columns(frame, columns=None):
+    if frame is None or columns is None:
+        return frame
+    return frame[[column for column in frame.columns if column in columns]]
+
+
+def _row_hashes(frame):
+    """Per-row hashes of a history frame, plus a digest of its column layout"""
+    layout = ','.join(f"{column}:{dtype}" for column, dtype in frame.dtypes.items())
+    # categorize=False hashes object columns by value, so dicts are fine too
+    hashes = pd.util.hash_pandas_object(frame, index=False, categorize=False).to_numpy()
+    return layout.encode(), hashes
+
+
+def _prefix_digest(layout, hashes, count):
+    digest = hashlib.blake2b(layout, digest_size=16)
+    digest.update(hashes[:count].tobytes())
+    return digest.hexdigest()
+
+
+def _filter_dates(frame, start=None, end=None):
+    if frame is None or frame.empty or 'date' not in frame:
+        return frame
+    dates = pd.to_datetime(frame['date'])
+    mask = pd.Series(True, index=frame.index)
+    if start is not None:
+        mask &= dates >= pd.Timestamp(start)
+    if end is not None:
+        mask &= dates <= pd.Timestamp(end)
+    return frame[mask].reset_index(drop=True)
+
+
+class StorageBackend:
+    """Interface for DataManager storage engines"""
+
+    def save(self, user_id, data_type, data):
+        raise NotImplementedError
+
+    def load(self, user_id, data_type):
+        raise NotImplementedError
+
+    def versions(self):
+        """Yield (user_id, data_type, version) for everything stored
+
+        The version changes whenever that data is saved or appended to.
+        """
+        raise NotImplementedError
+
+    def append(self, user_id, data_type, rows):
+        """Append rows to a tabular history"""
+        existing = self.load(user_id, data_type)
+        rows = pd.DataFrame(_to_records(rows))
+        self.save(user_id, data_type, rows if existing is None else pd.concat([existing, rows]))
+
+    def load_range(self, user_id, data_type, start=None, end=None, columns=None):
+        """Load the rows of a tabular history with start <= date <= end
+
+        columns optionally limits the result to the named columns.
+        """
+        frame = _filter_dates(self.load(user_id, data_type), start, end)
+        return _select_columns(frame, columns)
+
+
+class JsonStorage(StorageBackend):
+    """One {user_id}_{data_type}.json file per user and data type"""
+
+    def __init__(self, data_dir='data/user_data', fsync=False):
+        self.data_dir = data_dir
+        self.fsync = fsync
+        os.makedirs(self.data_dir, exist_ok=True)
+
+    def path(self, user_id, data_type):
+        return f"{self.data_dir}/{user_id}_{data_type}.json"
+
+    def save(self, user_id, data_type, data):
+        # Write to a temporary file and rename it over the old one, so
+        # readers never see a partially written file
+        filename = self.path(user_id, data_type)
+        tmp_filename = f"{filename}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_filename, 'w') as f:
+            json.dump({
+                'timestamp': datetime.now().isoformat(),
+                'data': _to_records(data)
+            }, f)
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_filename, filename)
+
+    def load(self, user_id, data_type):
+        filename = self.path(user_id, data_type)
+        if os.path.exists(filename):
+            with open(filename, 'r') as f:
+                data = json.load(f)
+                if data_type in TABULAR_TYPES:
+                    return pd.DataFrame(data['data'])
+                return data['data']
+        return None
+
+    def files(self):
+        """Yield (user_id, data_type, path) for every stored file"""
+        for path in sorted(glob.glob(os.path.join(self.data_dir, '*.json'))):
+            key = split_key(os.path.splitext(os.path.basename(path))[0])
+            if key is not None:
+                yield key + (path,)
+
+    def versions(self):
+        for user_id, data_type, path in self.files():
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            yield user_id, data_type, (stat.st_mtime_ns, stat.st_size)
+
+
+class ConnectionPool:
+    """Per-process pool of SQLite connections to one database file
+
+    Connections are opened lazily up to max_size and reused across threads.
+    After a fork the child discards the parent's connections and starts a
+    fresh pool.
+    """
+
+    def __init__(self, path, max_size=8, timeout=30.0):
+        self.path = path
+        self.max_size = max_size
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=self.timeout,
+                                     check_same_thread=False, isolation_level=None)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute('PRAGMA foreign_keys=ON')
+        return connection
+
+    @contextmanager
+    def connection(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                connection = None
+                if self._opened < self.max_size:
+                    connection = self._connect()
+                    self._opened += 1
+        if connection is None:
+            connection = self._idle.get(timeout=self.timeout)
+        try:
+            yield connection
+        finally:
+            self._idle.put(connection)
+
+    @contextmanager
+    def transaction(self):
+        """Run a block in one atomic write transaction"""
+        with self.connection() as connection:
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                yield connection
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+            connection.execute('COMMIT')
+
+    def close(self):
+        with self._lock:
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+            self._opened = 0
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(path):
+    """Shared connection pool for a database path within this process"""
+    path = os.path.abspath(path)
+    with _pools_lock:
+        if path not in _pools:
+            _pools[path] = ConnectionPool(path)
+        return _pools[path]
+
+
+class SQLiteStorage(StorageBackend):
+    """SQLite (WAL mode) storage with incremental history appends
+
+    Documents live in a user_data table. Tabular histories live in a
+    history table with one row per entry, indexed by date for range
+    queries. Saving a history only inserts the entries past those already
+    stored when every stored entry is unchanged, and replaces it otherwise.
+
+    To check that without reading the history back, each instance keeps a
+    watermark per key for the histories it saved: the user_data timestamp
+    it wrote, the number of rows and last seq, and a digest of the row
+    hashes. While the database still matches it, a save only hashes the
+    new frame and encodes the rows past the watermark.
+    """
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS user_data (
+            user_id TEXT NOT NULL,
+            data_type TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            data TEXT NOT NULL,
+            PRIMARY KEY (user_id, data_type)
+        );
+        CREATE TABLE IF NOT EXISTS history (
+            user_id TEXT NOT NULL,
+            data_type TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            date TEXT,
+            data TEXT NOT NULL,
+            PRIMARY KEY (user_id, data_type, seq)
+        );
+        CREATE INDEX IF NOT EXISTS history_date ON history (user_id, data_type, date);
+    '''
+
+    def __init__(self, db_path='data/user_data/healthfit.db'):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.db_path = db_path
+        self.pool = get_pool(db_path)
+        # (user_id, data_type) -> (timestamp, row count, last seq, digest)
+        self._watermarks = {}
+        with self.pool.connection() as connection:
+            connection.executescript(self.SCHEMA)
+
+    def __getstate__(self):
+        # Worker processes open their own pool on the same database
+        return {'db_path': self.db_path}
+
+    def __setstate__(self, state):
+        self.__init__(state['db_path'])
+
+    def _insert_rows(self, connection, user_id, data_type, records, first_seq, encoded=None):
+        if encoded is None:
+            encoded = [json.dumps(record) for record in records]
+        connection.executemany(
+            'INSERT INTO history (user_id, data_type, seq, date, data) VALUES (?, ?, ?, ?, ?)',
+            [(user_id, data_type, first_seq + i, record.get('date'), data)
+             for i, (record, data) in enumerate(zip(records, encoded))]
+        )
+
+    def _touch(self, connection, user_id, data_type):
+        timestamp = datetime.now().isoformat()
+        connection.execute(
+            'INSERT INTO user_data (user_id, data_type, timestamp, data) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT (user_id, data_type) DO UPDATE SET timestamp = excluded.timestamp',
+            (user_id, data_type, timestamp, 'null')
+        )
+        return timestamp
+
+    def _stored_state(self, connection, user_id, data_type):
+        """(timestamp, row count, last seq) of a stored history"""
+        return connection.execute(
+            'SELECT (SELECT timestamp FROM user_data WHERE user_id = ? AND data_type = ?), '
+            'COUNT(*), MAX(seq) FROM history WHERE user_id = ? AND data_type = ?',
+            (user_id, data_type, user_id, data_type)
+        ).fetchone()
+
+    def _save_suffix(self, connection, user_id, data_type, frame, layout, hashes):
+        """Insert only the rows past the watermark; False if it no longer holds"""
+        watermark = self._watermarks.pop((user_id, data_type), None)
+        if watermark is None or tuple(self._stored_state(connection, user_id, data_type)) != watermark[:3]:
+            return False
+        _, count, last_seq, digest = watermark
+        if len(frame) < count or _prefix_digest(layout, hashes, count) != digest:
+            return False
+        first_seq = 0 if last_seq is None else last_seq + 1
+        self._insert_rows(connection, user_id, data_type, _to_records(frame.iloc[count:]), first_seq)
+        return True
+
+    def save(self, user_id, data_type, data):
+        if data_type not in TABULAR_TYPES:
+            with self.pool.transaction() as connection:
+                connection.execute(
+                    'INSERT OR REPLACE INTO user_data (user_id, data_type, timestamp, data) '
+                    'VALUES (?, ?, ?, ?)',
+                    (user_id, data_type, datetime.now().isoformat(), json.dumps(_to_records(data)))
+                )
+            return
+
+        if not isinstance(data, pd.DataFrame):
+            with self.pool.transaction() as connection:
+                self._watermarks.pop((user_id, data_type), None)
+                self._save_full(connection, user_id, data_type, data)
+                self._touch(connection, user_id, data_type)
+            return
+
+        layout, hashes = _row_hashes(data)
+        with self.pool.transaction() as connection:
+            if not self._save_suffix(connection, user_id, data_type, data, layout, hashes):
+                self._save_full(connection, user_id, data_type, _to_records(data))
+            timestamp = self._touch(connection, user_id, data_type)
+            # Both paths leave the history stored as seq 0 .. len(data) - 1
+            self._watermarks[(user_id, data_type)] = (
+                timestamp, len(data), len(data) - 1 if len(data) else None,
+                _prefix_digest(layout, hashes, len(data)))
+
+    def _save_full(self, connection, user_id, data_type, records):
+        encoded = [json.dumps(record) for record in records]
+        stored = [row[0] for row in connection.execute(
+            'SELECT data FROM history WHERE user_id = ? AND data_type = ? ORDER BY seq',
+            (user_id, data_type)
+        )]
+        # Only skip rewriting the stored rows if every one of them is
+        # unchanged; an edit anywhere in the history replaces it all
+        if stored and encoded[:len(stored)] == stored:
+            first = len(stored)
+        else:
+            connection.execute('DELETE FROM history WHERE user_id = ? AND data_type = ?',
+                               (user_id, data_type))
+            first = 0
+        self._insert_rows(connection, user_id, data_type, records[first:], first, encoded[first:])
+
+    def append(self, user_id, data_type, rows):
+        records = _to_records(rows)
+        with self.pool.transaction() as connection:
+            next_seq = connection.execute(
+                'SELECT COALESCE(MAX(seq) + 1, 0) FROM history WHERE user_id = ? AND data_type = ?',
+                (user_id, data_type)
+            ).fetchone()[0]
+            self._insert_rows(connection, user_id, data_type, records, next_seq)
+            self._touch(connection, user_id, data_type)
+
+    def _load_history(self, user_id, data_type, where='', params=()):
+        with self.pool.connection() as connection:
+            exists = connection.execute(
+                'SELECT 1 FROM user_data WHERE user_id = ? AND data_type = ?', (user_id, data_type)
+            ).fetchone()
+            if not exists:
+                return None
+            rows = connection.execute(
+                f'SELECT data FROM history WHERE user_id = ? AND data_type = ? {where} ORDER BY seq',
+                (user_id, data_type) + params
+            ).fetchall()
+        return pd.DataFrame([json.loads(row[0]) for row in rows])
+
+    def load(self, user_id, data_type):
+        if data_type in TABULAR_TYPES:
+            return self._load_history(user_id, data_type)
+        with self.pool.connection() as connection:
+            row = connection.execute(
+                'SELECT data FROM user_data WHERE user_id = ? AND data_type = ?', (user_id, data_type)
+            ).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def load_range(self, user_id, data_type, start=None, end=None, columns=None):
+        if data_type not in TABULAR_TYPES:
+            return super().load_range(user_id, data_type, start, end, columns)
+        where, params = '', ()
+        if start is not None:
+            where += ' AND date >= ?'
+            params += (pd.Timestamp(start).strftime('%Y-%m-%d'),)
+        if end is not None:
+            where += ' AND date <= ?'
+            params += (pd.Timestamp(end).strftime('%Y-%m-%d'),)
+        return _select_columns(self._load_history(user_id, data_type, where, params), columns)
+
+    def versions(self):
+        # Every save and append updates the key's user_data timestamp
+        with self.pool.connection() as connection:
+            rows = connection.execute('SELECT user_id, data_type, timestamp FROM user_data').fetchall()
+        yield from rows
+
+    def migrate_from_json(self, json_dir='data/user_data'):
+        """Import every {user_id}_{data_type}.json file in one transaction
+
+        Returns the number of files imported. The JSON files are left in place.
+        """
+        source = JsonStorage(json_dir)
+        files = list(source.files())
+        with self.pool.transaction() as connection:
+            for user_id, data_type, path in files:
+                with open(path, 'r') as f:
+                    document = json.load(f)
+                timestamp = document.get('timestamp', datetime.now().isoformat())
+                if data_type in TABULAR_TYPES:
+                    connection.execute('DELETE FROM history WHERE user_id = ? AND data_type = ?',
+                                       (user_id, data_type))
+                    self._insert_rows(connection, user_id, data_type, document['data'], 0)
+                    payload = 'null'
+                else:
+                    payload = json.dumps(document['data'])
+                connection.execute(
+                    'INSERT OR REPLACE INTO user_data (user_id, data_type, timestamp, data) '
+                    'VALUES (?, ?, ?, ?)',
+                    (user_id, data_type, timestamp, payload)
+                )
+        return len(files)
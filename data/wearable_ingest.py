@@ -0,0 +1,217 @@
+import os
+
+import pandas as pd
+
+# Canonical event fields and the column names device exports use for them
+EVENT_FIELDS = {
+    'heart_rate': ('heart_rate', 'heartrate', 'hr', 'bpm'),
+    'steps': ('steps', 'step_count'),
+    'calories': ('calories', 'calories_burned', 'active_calories', 'kcal', 'energy'),
+    'water': ('water', 'water_intake', 'hydration'),
+    'weight': ('weight', 'body_weight', 'weight_kg'),
+}
+TIMESTAMP_COLUMNS = ('timestamp', 'time', 'datetime', 'date', 'start_time')
+
+# Plausible range for a single event; values outside are rejected as invalid
+VALID_RANGES = {
+    'heart_rate': (20, 250),
+    'steps': (0, 100_000),
+    'calories': (0, 10_000),
+    'water': (0, 20),
+    'weight': (20, 400),
+}
+
+# Per-day partial aggregates: they merge by adding (weight keeps the latest)
+PARTIAL_COLUMNS = ['steps', 'calories', 'water', 'heart_rate_sum', 'heart_rate_count',
+                   'weight', 'weight_time']
+
+DEFAULT_CHUNK_SIZE = 250_000
+
+
+def _resolve_columns(header):
+    """Map the canonical fields to the columns present in a file header"""
+    lowered = {column.strip().lower(): column for column in header}
+    timestamp = next((lowered[name] for name in TIMESTAMP_COLUMNS if name in lowered), None)
+    if timestamp is None:
+        raise ValueError(f"No timestamp column found; expected one of {', '.join(TIMESTAMP_COLUMNS)}")
+
+    # Long exports have one metric name and value per row instead
+    if 'metric' in lowered and 'value' in lowered:
+        return timestamp, {'metric': lowered['metric'], 'value': lowered['value']}
+
+    fields = {}
+    for field, aliases in EVENT_FIELDS.items():
+        column = next((lowered[alias] for alias in aliases if alias in lowered), None)
+        if column is not None and column != timestamp:
+            fields[field] = column
+    if not fields:
+        raise ValueError(f"No known metric columns found; expected any of {', '.join(EVENT_FIELDS)}")
+    return timestamp, fields
+
+
+def _parse_timestamps(values):
+    if pd.api.types.is_numeric_dtype(values):
+        # Epoch seconds, or milliseconds for values past the year 5000
+        unit = 'ms' if values.abs().max() > 1e11 else 's'
+        return pd.to_datetime(values, unit=unit, errors='coerce')
+    parsed = pd.to_datetime(values, errors='coerce', format='ISO8601')
+    if isinstance(parsed.dtype, pd.DatetimeTZDtype):
+        # Keep the device's local wall-clock time, which decides the day
+        parsed = parsed.dt.tz_localize(None)
+    return parsed
+
+
+class WearableReader:
+    """Read a CSV/JSONL device export as validated event chunks
+
+    Iterating yields DataFrames with a 'timestamp' column and one float
+    column per event field, reading at most chunk_size rows at a time and
+    only the columns it needs. Wide files have one column per metric; long
+    files have metric and value columns. Rows without a parsable timestamp
+    and values outside VALID_RANGES are dropped and counted in stats.
+    """
+
+    def __init__(self, path, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.stats = {'rows': 0, 'invalid_timestamps': 0, 'rejected_values': 0}
+        self.is_jsonl = os.path.splitext(path)[1].lower() in ('.jsonl', '.ndjson', '.json')
+
+    def _header(self):
+        if self.is_jsonl:
+            first = next(pd.read_json(self.path, lines=True, chunksize=1), None)
+            return [] if first is None else list(first.columns)
+        return list(pd.read_csv(self.path, nrows=0).columns)
+
+    def _chunks(self, columns):
+        if self.is_jsonl:
+            with pd.read_json(self.path, lines=True, chunksize=self.chunk_size, dtype=False) as reader:
+                for chunk in reader:
+                    yield chunk[[column for column in columns if column in chunk]]
+        else:
+            with pd.read_csv(self.path, usecols=columns, chunksize=self.chunk_size) as reader:
+                yield from reader
+
+    def _to_events(self, chunk, timestamp, fields):
+        events = pd.DataFrame({'timestamp': _parse_timestamps(chunk[timestamp])})
+        if 'metric' in fields:
+            metric = chunk[fields['metric']].astype(str).str.strip().str.lower()
+            value = pd.to_numeric(chunk[fields['value']], errors='coerce')
+            for field, aliases in EVENT_FIELDS.items():
+                events[field] = value.where(metric.isin(aliases))
+        else:
+            for field, column in fields.items():
+                events[field] = pd.to_numeric(chunk[column], errors='coerce')
+        return events
+
+    def _validate(self, events):
+        valid_time = events['timestamp'].notna()
+        self.stats['invalid_timestamps'] += int((~valid_time).sum())
+        events = events[valid_time]
+        for field, (low, high) in VALID_RANGES.items():
+            if field in events:
+                values = events[field]
+                rejected = values.notna() & ~values.between(low, high)
+                if rejected.any():
+                    self.stats['rejected_values'] += int(rejected.sum())
+                    events[field] = values.mask(rejected)
+        return events
+
+    def __iter__(self):
+        timestamp, fields = _resolve_columns(self._header())
+        columns = [timestamp] + list(fields.values())
+        for chunk in self._chunks(columns):
+            self.stats['rows'] += len(chunk)
+            yield self._validate(self._to_events(chunk, timestamp, fields))
+
+
+def _daily_partials(events):
+    """Per-day partial aggregates of one chunk of events, indexed by day"""
+    day = events['timestamp'].dt.floor('D').rename('date')
+    columns = {}
+    for field in ('steps', 'calories', 'water'):
+        if field in events:
+            columns[field] = events[field]
+    if 'heart_rate' in events:
+        columns['heart_rate_sum'] = events['heart_rate']
+        columns['heart_rate_count'] = events['heart_rate'].notna().astype(float)
+    partials = pd.DataFrame(columns, index=events.index).groupby(day).sum(min_count=1)
+
+    if 'weight' in events:
+        weights = events.loc[events['weight'].notna(), ['timestamp', 'weight']]
+        latest = weights.sort_values('timestamp', kind='stable').groupby(day[weights.index]).last()
+        partials = partials.join(latest.rename(columns={'timestamp': 'weight_time'}), how='outer')
+    return partials.reindex(columns=PARTIAL_COLUMNS)
+
+
+def _merge_partials(left, right):
+    """Combine two sets of per-day partial aggregates"""
+    if left is None or left.empty:
+        return right
+    combined = pd.concat([left, right])
+    grouped = combined.groupby(level=0)
+    merged = grouped[['steps', 'calories', 'water', 'heart_rate_sum', 'heart_rate_count']].sum(min_count=1)
+    weights = combined[combined['weight'].notna()].sort_values('weight_time', kind='stable')
+    latest = weights[['weight', 'weight_time']].groupby(level=0).last()
+    return merged.join(latest, how='left').reindex(columns=PARTIAL_COLUMNS)
+
+
+def _finish(partials):
+    """Daily rows in HealthAnalytics columns from completed partial aggregates"""
+    count = partials['heart_rate_count']
+    return pd.DataFrame({
+        'date': partials.index,
+        'weight': partials['weight'].to_numpy(),
+        'calories_burned': partials['calories'].to_numpy(),
+        'water_intake': partials['water'].to_numpy(),
+        'steps': partials['steps'].to_numpy(),
+        'avg_heart_rate': (partials['heart_rate_sum'] / count.where(count > 0)).to_numpy(),
+    })
+
+
+def aggregate_daily(chunks, allowed_lateness_days=1, stats=None):
+    """Stream per-day aggregates from time-ordered event chunks
+
+    Yields a DataFrame of daily rows each time days are complete: a day is
+    closed once events more than allowed_lateness_days later have been
+    seen, so only the open days are held in memory. Events that arrive for
+    an already closed day are emitted as an extra row for that day; their
+    totals still add up, but the day is split across two rows.
+    """
+    lateness = pd.Timedelta(days=allowed_lateness_days)
+    open_days = None
+    closed_before = None
+    for events in chunks:
+        if events.empty:
+            continue
+        partials = _daily_partials(events)
+        if closed_before is not None:
+            late = partials.index < closed_before
+            if late.any() and stats is not None:
+                stats['late_days'] = stats.get('late_days', 0) + int(late.sum())
+        open_days = _merge_partials(open_days, partials)
+
+        horizon = events['timestamp'].max().floor('D') - lateness
+        closed_before = horizon if closed_before is None else max(closed_before, horizon)
+        done = open_days.index < closed_before
+        if done.any():
+            yield _finish(open_days[done])
+            open_days = open_days[~done]
+    if open_days is not None and not open_days.empty:
+        yield _finish(open_days)
+
+
+def ingest_wearable(path, analytics, chunk_size=DEFAULT_CHUNK_SIZE, allowed_lateness_days=1):
+    """Backfill a HealthAnalytics tracker from a wearable CSV/JSONL export
+
+    Events are read in chunks of chunk_size rows, validated, aggregated per
+    day and bulk-appended with their real dates, so memory depends on the
+    chunk size rather than the file size. Returns ingest statistics.
+    """
+    reader = WearableReader(path, chunk_size)
+    stats = reader.stats
+    stats['days'] = 0
+    for daily in aggregate_daily(reader, allowed_lateness_days, stats):
+        analytics.add_daily_rows(daily)
+        stats['days'] += len(daily)
+    return stats
@@ -0,0 +1,171 @@
+import atexit
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+
+class WriteBehindQueue:
+    """Background writer that coalesces and batches storage saves
+
+    put() records the latest data for a (user_id, data_type) key and
+    returns immediately. A daemon thread waits up to flush_interval seconds
+    to collect writes, then saves everything pending in one batch. Repeated
+    saves of the same key before a flush are coalesced into one write. When
+    max_pending keys are waiting, put() blocks until the writer catches up.
+    """
+
+    def __init__(self, storage, max_pending=1024, flush_interval=0.5, batch_size=64):
+        self.storage = storage
+        self.max_pending = max_pending
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+
+        self._pending = OrderedDict()
+        self._in_flight = {}
+        self._cond = threading.Condition()
+        self._closed = False
+        self._flush_requested = False
+        self._last_error = None
+        self._batch_failed = False
+        self._counters = {
+            'enqueued': 0,
+            'coalesced': 0,
+            'written': 0,
+            'failed': 0,
+            'batches': 0,
+            'last_flush_seconds': 0.0,
+            'max_flush_seconds': 0.0,
+            'total_flush_seconds': 0.0,
+        }
+
+        self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    @staticmethod
+    def _snapshot(data):
+        # Callers may keep mutating their objects after saving
+        if isinstance(data, pd.DataFrame):
+            return data.copy()
+        return copy.deepcopy(data)
+
+    def put(self, key, data):
+        data = self._snapshot(data)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("write-behind queue is closed")
+            if key in self._pending:
+                self._counters['coalesced'] += 1
+            else:
+                while len(self._pending) >= self.max_pending:
+                    self._flush_requested = True
+                    self._cond.notify_all()
+                    self._cond.wait()
+            self._pending[key] = data
+            self._counters['enqueued'] += 1
+            # Wake the writer when it is idle or a full batch is waiting
+            if len(self._pending) == 1 or len(self._pending) >= self.batch_size:
+                self._cond.notify_all()
+
+    def get(self, key):
+        """Return (found, data) for a key that is queued or being written"""
+        with self._cond:
+            for source in (self._pending, self._in_flight):
+                if key in source:
+                    return True, self._snapshot(source[key])
+        return False, None
+
+    def is_pending(self, key):
+        with self._cond:
+            return key in self._pending or key in self._in_flight
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                if not (self._closed or self._flush_requested) and len(self._pending) < self.batch_size:
+                    # Give further saves a chance to coalesce into this batch
+                    self._cond.wait(self.flush_interval)
+                batch, self._pending = self._pending, OrderedDict()
+                self._in_flight = batch
+                self._flush_requested = False
+                self._cond.notify_all()
+
+            start = time.perf_counter()
+            failed = {}
+            for (user_id, data_type), data in batch.items():
+                try:
+                    self.storage.save(user_id, data_type, data)
+                except Exception as error:
+                    failed[(user_id, data_type)] = data
+                    self._last_error = error
+            elapsed = time.perf_counter() - start
+
+            with self._cond:
+                for key, data in failed.items():
+                    # Retry on the next flush unless a newer save superseded it
+                    if key not in self._pending:
+                        self._pending[key] = data
+                self._in_flight = {}
+                counters = self._counters
+                counters['written'] += len(batch) - len(failed)
+                counters['failed'] += len(failed)
+                counters['batches'] += 1
+                counters['last_flush_seconds'] = elapsed
+                counters['max_flush_seconds'] = max(counters['max_flush_seconds'], elapsed)
+                counters['total_flush_seconds'] += elapsed
+                self._batch_failed = bool(failed)
+                self._cond.notify_all()
+                if failed and self._closed:
+                    return
+
+    def flush(self):
+        """Block until everything queued so far has been written
+
+        Raises the last storage error if a batch fails while flushing.
+        """
+        with self._cond:
+            while self._pending or self._in_flight:
+                if not self._thread.is_alive():
+                    raise RuntimeError("write-behind thread stopped with unsaved data") from self._last_error
+                batches = self._counters['batches']
+                self._flush_requested = True
+                self._cond.notify_all()
+                self._cond.wait()
+                if self._counters['batches'] > batches and self._batch_failed:
+                    raise self._last_error
+
+    def close(self):
+        """Flush remaining writes and stop the background thread
+
+        Raises RuntimeError naming the keys whose saves still failed.
+        """
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        atexit.unregister(self.close)
+        self._thread.join()
+        with self._cond:
+            unsaved = list(self._pending)
+        if unsaved:
+            keys = ', '.join(f"{user_id}/{data_type}" for user_id, data_type in unsaved[:10])
+            raise RuntimeError(f"write-behind queue closed with {len(unsaved)} unsaved key(s): {keys}") \
+                from self._last_error
+
+    def stats(self):
+        """Queue depth and write/flush-latency counters"""
+        with self._cond:
+            stats = dict(self._counters)
+            stats['queue_depth'] = len(self._pending) + len(self._in_flight)
+            batches = stats['batches']
+            stats['mean_flush_seconds'] = stats['total_flush_seconds'] / batches if batches else 0.0
+            stats['last_error'] = repr(self._last_error) if self._last_error else None
+        return stats
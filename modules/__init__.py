@@ -0,0 +1,31 @@
+"""Recommendation and tracking modules
+
+Classes are importable from the package (``from modules import
+DietRecommender``) and their submodules are only loaded on first use, so
+importing the package itself stays cheap.
+"""
+
+import importlib
+
+_EXPORTS = {
+    'DietRecommender': 'modules.diet_recommendation',
+    'ExerciseRecommender': 'modules.exercise_recommendation',
+    'FoodNameIndex': 'modules.food_search',
+    'FoodSubstitutionIndex': 'modules.food_substitution',
+    'GoalTracker': 'modules.goal_tracker',
+    'HealthAnalytics': 'modules.health_analytics',
+    'MealOptimizer': 'modules.meal_optimizer',
+    'ProgressTracker': 'modules.progress_tracker',
+    'WorkoutPlan': 'modules.workout_plan',
+    'WorkoutPlanBatch': 'modules.workout_plan',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        value = getattr(importlib.import_module(_EXPORTS[name]), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
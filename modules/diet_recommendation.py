@@ -1,32 +1,259 @@
 # modules/diet_recommendation.py
 
+import threading
+from collections import OrderedDict
+
 import pandas as pd
 import numpy as np
 
+from modules.food_search import FoodNameIndex
+from modules.meal_optimizer import MealOptimizer, MACRO_BANDS
+from utils.lazy import lazy_import
+from utils.metrics import instrumented
+
+# scikit-learn is only imported once substitutes are first requested
+food_substitution = lazy_import('modules.food_substitution')
+
+MEAL_TYPES = ['breakfast', 'lunch', 'dinner', 'snack']
+HEALTH_PREFERENCES = ['Vegetarian', 'Vegan', 'Low-Carb', 'Keto']
+MEAL_SPLIT = {'breakfast': 0.3, 'lunch': 0.4, 'dinner': 0.3}
+MACRO_COLUMNS = ['Calories', 'Protein', 'Carbohydrates', 'Fat']
+
+# Weekly plans: foods per meal, how many of the best-fitting foods each pick
+# is drawn from, and for how many days a food is not repeated
+FOODS_PER_MEAL = 3
+VARIETY_CHOICES = 5
+VARIETY_WINDOW = 2
+WEEKLY_PLAN_CACHE_SIZE = 1024
+
+ACTIVITY_MULTIPLIERS = {
+    "Sedentary": 1.2,
+    "Lightly Active": 1.375,
+    "Moderately Active": 1.55,
+    "Very Active": 1.725,
+    "Extra Active": 1.9
+}
+
+# (intercept, weight, height, age) coefficients for (male, female) BMR
+BMR_EQUATIONS = {
+    'harris-benedict': ((88.362, 13.397, 4.799, 5.677), (447.593, 9.247, 3.098, 4.330)),
+    'mifflin-st-jeor': ((5.0, 10.0, 6.25, 5.0), (-161.0, 10.0, 6.25, 5.0)),
+}
+
+# Saved nearest-neighbour index for the bundled food database
+SUBSTITUTION_INDEX_PATH = 'data/cache/food_substitution.pkl'
+# Indexes saved for each version of a compiled catalog, see from_catalog()
+CATALOG_SUBSTITUTION_INDEX_PATH = 'data/cache/food_substitution-{version}.pkl'
+CATALOG_NAME_INDEX_PATH = 'data/cache/food_names-{version}.index'
+
+MEAT_PATTERN = 'Chicken|Fish|Beef|Pork'
+ANIMAL_PRODUCT_PATTERN = 'Chicken|Fish|Beef|Pork|Egg|Milk|Yogurt|Cheese'
+
+
+def _split_labels(column):
+    """Parse a comma-separated label column into a dict of boolean masks"""
+    tokens = column.fillna('').astype(str).str.lower().str.split(',')
+    rows = np.repeat(np.arange(len(tokens)), tokens.str.len().to_numpy())
+    values = tokens.explode().str.strip().to_numpy()
+
+    masks = {}
+    for label in pd.unique(values):
+        if label:
+            mask = np.zeros(len(tokens), dtype=bool)
+            mask[rows[values == label]] = True
+            masks[label] = mask
+    return masks
+
+
+@instrumented('diet')
 class DietRecommender:
-    def __init__(self):
-        self.food_data = pd.read_csv('data/food_database.csv')
+    def __init__(self, food_data=None, catalog_version=None):
+        # A prebuilt catalog can be passed in instead of reading the CSV;
+        # with its version, the indexes built from it are saved and shared
+        self.food_data = pd.read_csv('data/food_database.csv') if food_data is None else food_data.reset_index(drop=True)
+        self._index_path = self._name_index_path = None
+        if food_data is None:
+            self._index_path = SUBSTITUTION_INDEX_PATH
+        elif catalog_version is not None:
+            self._index_path = CATALOG_SUBSTITUTION_INDEX_PATH.format(version=catalog_version)
+            self._name_index_path = CATALOG_NAME_INDEX_PATH.format(version=catalog_version)
+        self._substitution_index = None
+        self._substitution_filters = {}
+        self._weekly_plans = OrderedDict()
+        self._weekly_plans_lock = threading.Lock()
+        self._build_index()
 
-    def calculate_calories_needed(self, weight, height, age, gender, activity_level):
-        # Harris-Benedict equation for BMR
-        if gender.lower() == 'male':
-            bmr = 88.362 + (13.397 * weight) + (4.799 * height) - (5.677 * age)
+    @classmethod
+    def from_catalog(cls, catalog):
+        """Recommender over a compiled catalog (data/catalog_store.py)
+
+        The food name index is mapped from a file saved per catalog version,
+        and the substitution index is loaded from one, so processes serving
+        the same catalog build each of them only once.
+        """
+        return cls(catalog.frame, catalog_version=catalog.version)
+
+    def _build_index(self):
+        """Precompute category/label masks and calorie-sorted candidate sets"""
+        foods = self.food_data
+        n = len(foods)
+
+        self.category_masks = _split_labels(foods['Category'])
+        self.label_masks = _split_labels(foods['HealthLabels'])
+
+        carbs = foods['Carbohydrates'].to_numpy(dtype=float)
+        fat = foods['Fat'].to_numpy(dtype=float)
+        names = foods['Food']
+        self.preference_masks = {
+            'Vegetarian': ~names.str.contains(MEAT_PATTERN, case=False, na=False).to_numpy(),
+            'Vegan': ~names.str.contains(ANIMAL_PRODUCT_PATTERN, case=False, na=False).to_numpy(),
+            'Low-Carb': carbs < 15,
+            'Keto': (carbs < 10) & (fat > 15),
+        }
+
+        if self._name_index_path:
+            self.name_index = FoodNameIndex.load_or_build(foods['Food'], self._name_index_path)
         else:
-            bmr = 447.593 + (9.247 * weight) + (3.098 * height) - (4.330 * age)
-
-        # Activity multipliers
-        activity_multipliers = {
-            "Sedentary": 1.2,
-            "Lightly Active": 1.375,
-            "Moderately Active": 1.55,
-            "Very Active": 1.725,
-            "Extra Active": 1.9
+            self.name_index = FoodNameIndex(foods['Food'])
+
+        self._calories = foods['Calories'].to_numpy(dtype=float)
+        self._macros = {column: foods[column].to_numpy(dtype=float) for column in MACRO_COLUMNS}
+        # Column arrays, which stay views of a memory-mapped catalog, so
+        # building a few result dicts does not go through DataFrame indexing
+        self._columns = {column: foods[column].to_numpy() if isinstance(foods[column].dtype, np.dtype)
+                         else foods[column].array for column in foods.columns}
+        positions = np.arange(n)
+        # Ascending calories, ties broken by descending row position, so that
+        # reading from the end matches DataFrame.nlargest(keep='first').
+        self._calorie_order = np.lexsort((-positions, self._calories))
+
+        self._candidates = {}
+        self._optimizers = {}
+        for meal_type in set(MEAL_TYPES) | set(self.category_masks):
+            for preference in [None] + HEALTH_PREFERENCES:
+                self._get_candidates(meal_type, preference)
+
+    def _get_candidates(self, meal_type, health_preference=None):
+        """Return (positions, calories) for a meal type/preference, sorted by calories"""
+        if health_preference not in self.preference_masks:
+            health_preference = None
+        key = (meal_type.lower(), health_preference)
+        if key not in self._candidates:
+            mask = self.category_masks.get(key[0])
+            if mask is None:
+                mask = np.zeros(len(self.food_data), dtype=bool)
+            if health_preference is not None:
+                mask = mask & self.preference_masks[health_preference]
+            positions = self._calorie_order[mask[self._calorie_order]]
+            self._candidates[key] = (positions, self._calories[positions])
+        return self._candidates[key]
+
+    def _get_optimizer(self, meal_type, health_preference=None):
+        """Return the MealOptimizer over one meal type's candidate foods"""
+        if health_preference not in MACRO_BANDS:
+            health_preference = None
+        key = (meal_type.lower(), health_preference)
+        if key not in self._optimizers:
+            positions, _ = self._get_candidates(meal_type, health_preference)
+            foods = self.food_data.iloc[positions]
+            self._optimizers[key] = MealOptimizer(
+                foods['Calories'], foods['Protein'], foods['Carbohydrates'], foods['Fat'],
+                health_preference=health_preference
+            )
+        return self._optimizers[key]
+
+    def _records(self, positions):
+        """Food rows at the given positions as dicts, like to_dict('records')"""
+        positions = np.asarray(positions, dtype=np.intp)
+        values = [array[positions].tolist() for array in self._columns.values()]
+        return [dict(zip(self._columns, row)) for row in zip(*values)]
+
+    def _default_option(self, meal_type, target_calories):
+        return {
+            'Food': f'Default {meal_type} option',
+            'Calories': target_calories,
+            'Protein': 0,
+            'Carbohydrates': 0,
+            'Fat': 0
         }
 
-        daily_calories = bmr * activity_multipliers[activity_level]
+    def calculate_calories_needed(self, weight, height, age, gender, activity_level,
+                                  equation='harris-benedict'):
+        if equation not in BMR_EQUATIONS:
+            raise ValueError(f"Unknown BMR equation: {equation}")
+        male, female = BMR_EQUATIONS[equation]
+
+        # BMR from the selected equation (Harris-Benedict by default)
+        if gender.lower() == 'male':
+            bmr = male[0] + (male[1] * weight) + (male[2] * height) - (male[3] * age)
+        else:
+            bmr = female[0] + (female[1] * weight) + (female[2] * height) - (female[3] * age)
+
+        daily_calories = bmr * ACTIVITY_MULTIPLIERS[activity_level]
         return round(daily_calories)
 
-    def get_meal_plan(self, total_calories, health_preference=None, meal_type='all'):
+    def calculate_calories_needed_batch(self, profiles=None, weight=None, height=None, age=None,
+                                        gender=None, activity_level=None,
+                                        equation='harris-benedict', errors='raise'):
+        """Vectorized calculate_calories_needed for a whole cohort
+
+        Takes either a DataFrame with weight/height/age/gender/activity_level
+        columns or one array per field. Returns an integer array matching the
+        scalar method row for row. Unknown activity levels and missing genders
+        raise a ValueError listing the bad rows, or become NaN with
+        errors='coerce'.
+        """
+        if equation not in BMR_EQUATIONS:
+            raise ValueError(f"Unknown BMR equation: {equation}")
+        if profiles is not None:
+            weight = profiles['weight']
+            height = profiles['height']
+            age = profiles['age']
+            gender = profiles['gender']
+            activity_level = profiles['activity_level']
+
+        weight = np.asarray(weight, dtype=float)
+        height = np.asarray(height, dtype=float)
+        age = np.asarray(age, dtype=float)
+
+        # Factorize the label columns so each distinct label is looked up once;
+        # a missing label gets code -1
+        gender_codes, genders = pd.factorize(np.asarray(gender, dtype=object))
+        is_male = np.append(np.array([str(label).lower() == 'male' for label in genders], dtype=bool),
+                            False)[gender_codes]
+        missing_gender = gender_codes < 0
+
+        activity_codes, activities = pd.factorize(np.asarray(activity_level, dtype=object))
+        known = np.array([ACTIVITY_MULTIPLIERS.get(label, np.nan) for label in activities], dtype=float)
+        multipliers = np.append(known, np.nan)[activity_codes]
+        unknown_activity = np.isnan(multipliers)
+        multipliers[missing_gender] = np.nan
+        bad_rows = np.flatnonzero(unknown_activity | missing_gender)
+        if len(bad_rows) and errors != 'coerce':
+            problems = []
+            for problem, bad, values in (('Unknown activity level', unknown_activity, activity_level),
+                                         ('Missing gender', missing_gender, gender)):
+                rows = np.flatnonzero(bad)
+                if len(rows):
+                    labels = np.asarray(values, dtype=object)[rows[:10]]
+                    details = ', '.join(f"row {row}: {label!r}" for row, label in zip(rows[:10], labels))
+                    problems.append(f"{problem} in {len(rows)} row(s): {details}")
+            raise ValueError('; '.join(problems))
+
+        male, female = (np.asarray(coefficients) for coefficients in BMR_EQUATIONS[equation])
+        coefficients = np.where(is_male[:, None], male, female)
+        bmr = (coefficients[:, 0] + (coefficients[:, 1] * weight)
+               + (coefficients[:, 2] * height) - (coefficients[:, 3] * age))
+
+        daily_calories = np.round(bmr * multipliers)
+        if len(bad_rows):
+            return daily_calories
+        return daily_calories.astype(int)
+
+    def get_meal_plan(self, total_calories, health_preference=None, meal_type='all', optimize=False):
+        if optimize:
+            return self.get_optimized_meal_plans([total_calories], health_preference)[0]
+
         breakfast_cals = total_calories * 0.3
         lunch_cals = total_calories * 0.4
         dinner_cals = total_calories * 0.3
@@ -38,40 +265,213 @@ class DietRecommender:
         }
         return meal_plan
 
+    def get_optimized_meal_plans(self, calorie_targets, health_preference=None, time_budget_ms=20.0):
+        """Build macro-aware meal plans for many daily calorie targets at once
+
+        Each meal picks up to three foods in portion multiples, aiming for its
+        share of the target while keeping protein/carb/fat within the bands
+        for the preference. Foods carry a 'Servings' key and scaled macros.
+        """
+        targets = np.atleast_1d(np.asarray(calorie_targets, dtype=float))
+        plans = [{} for _ in targets]
+
+        for meal, share in MEAL_SPLIT.items():
+            positions, _ = self._get_candidates(meal, health_preference)
+            optimizer = self._get_optimizer(meal, health_preference)
+            selections = optimizer.optimize_batch(targets * share, time_budget_ms / len(MEAL_SPLIT))
+
+            for plan, target, selection in zip(plans, targets * share, selections):
+                if not selection:
+                    plan[meal] = [self._default_option(meal, target)]
+                    continue
+                rows, servings = zip(*selection)
+                foods = self._records(positions[list(rows)])
+                for food, serving in zip(foods, servings):
+                    for column in MACRO_COLUMNS:
+                        food[column] = round(food[column] * serving, 1)
+                    food['Servings'] = serving
+                plan[meal] = foods
+        return plans
+
+    def get_weekly_meal_plan(self, total_calories, health_preference=None, seed=0, days=7,
+                             variety_window=VARIETY_WINDOW):
+        """Plan breakfast, lunch and dinner for several days with varied foods
+
+        Each meal combines up to FOODS_PER_MEAL different foods within its
+        share of total_calories, each drawn (using seed) from the
+        highest-calorie foods that still fit. A food is not repeated within
+        variety_window days unless the meal has nothing else left. Returns
+        {'days': [meal plan per day], 'daily_totals': [...], 'weekly_totals':
+        {...}} with Calories/Protein/Carbohydrates/Fat totals. Plans are kept
+        in a bounded LRU cache, so callers must not modify them.
+        """
+        if health_preference not in self.preference_masks:
+            health_preference = None
+        key = (float(total_calories), health_preference, seed, days, variety_window)
+        with self._weekly_plans_lock:
+            plan = self._weekly_plans.get(key)
+            if plan is not None:
+                self._weekly_plans.move_to_end(key)
+                return plan
+
+        plan = self._build_weekly_plan(*key)
+        with self._weekly_plans_lock:
+            self._weekly_plans[key] = plan
+            if len(self._weekly_plans) > WEEKLY_PLAN_CACHE_SIZE:
+                self._weekly_plans.popitem(last=False)
+        return plan
+
+    def _build_weekly_plan(self, total_calories, health_preference, seed, days, variety_window):
+        rng = np.random.default_rng(seed)
+        # Food position -> last day it was planned
+        last_used = {}
+        plan_days, daily_totals = [], []
+        for day in range(days):
+            meal_plan = {}
+            totals = dict.fromkeys(MACRO_COLUMNS, 0.0)
+            for meal, share in MEAL_SPLIT.items():
+                chosen = self._pick_meal(meal, total_calories * share, health_preference,
+                                         rng, day, last_used, variety_window)
+                if not chosen:
+                    meal_plan[meal] = [self._default_option(meal, total_calories * share)]
+                    totals['Calories'] += total_calories * share
+                    continue
+                meal_plan[meal] = self._records(chosen)
+                for column in MACRO_COLUMNS:
+                    totals[column] += float(self._macros[column][chosen].sum())
+            plan_days.append(meal_plan)
+            daily_totals.append({column: round(total, 1) for column, total in totals.items()})
+
+        weekly_totals = {column: round(sum(totals[column] for totals in daily_totals), 1)
+                         for column in MACRO_COLUMNS}
+        return {'days': plan_days, 'daily_totals': daily_totals, 'weekly_totals': weekly_totals}
+
+    def _pick_meal(self, meal_type, target_calories, health_preference, rng, day, last_used,
+                   variety_window):
+        """Positions of up to FOODS_PER_MEAL foods adding up to at most target_calories"""
+        positions, calories = self._get_candidates(meal_type, health_preference)
+        chosen = []
+        remaining = target_calories
+        while len(chosen) < FOODS_PER_MEAL:
+            end = np.searchsorted(calories, remaining, side='right')
+            # Only foods in last_used can be skipped, so the best fresh
+            # choices are among this many of the highest-calorie fits
+            start = max(0, end - len(last_used) - VARIETY_CHOICES)
+            fresh, stale = [], []
+            for position in positions[start:end][::-1].tolist():
+                used = last_used.get(position)
+                if used is None or day - used > variety_window:
+                    fresh.append(position)
+                    if len(fresh) == VARIETY_CHOICES:
+                        break
+                elif used < day:
+                    stale.append(position)
+            if fresh:
+                pick = fresh[rng.integers(len(fresh))]
+            elif stale:
+                # Every fitting food was planned recently: take the least recent
+                pick = min(stale, key=last_used.get)
+            else:
+                break
+            chosen.append(pick)
+            last_used[pick] = day
+            remaining -= self._calories[pick]
+        return chosen
+
     def get_meal_options(self, meal_type, target_calories, health_preference=None):
-        # Filter foods by meal type
-        meal_foods = self.food_data[self.food_data['Category'].str.contains(meal_type, case=False)]
-
-        # Apply health preference filter if specified
-        if health_preference and health_preference != "None":
-            if health_preference == "Vegetarian":
-                meal_foods = meal_foods[~meal_foods['Food'].str.contains('Chicken|Fish|Beef|Pork', case=False, na=False)]
-            elif health_preference == "Vegan":
-                meal_foods = meal_foods[~meal_foods['Food'].str.contains('Chicken|Fish|Beef|Pork|Egg|Milk|Yogurt|Cheese', case=False, na=False)]
-            elif health_preference == "Low-Carb":
-                meal_foods = meal_foods[meal_foods['Carbohydrates'] < 15]
-            elif health_preference == "Keto":
-                meal_foods = meal_foods[(meal_foods['Carbohydrates'] < 10) & (meal_foods['Fat'] > 15)]
-
-        # Get foods that fit within the calorie target
-        suitable_foods = meal_foods[meal_foods['Calories'] <= target_calories]
+        # Look up the precomputed candidates for this meal type and preference
+        positions, calories = self._get_candidates(meal_type, health_preference)
+
+        # Binary search for the foods that fit within the calorie target
+        end = np.searchsorted(calories, target_calories, side='right')
 
         # If no suitable foods found, return default options
-        if suitable_foods.empty:
-            return [{
-                'Food': f'Default {meal_type} option',
-                'Calories': target_calories,
-                'Protein': 0,
-                'Carbohydrates': 0,
-                'Fat': 0
-            }]
-
-        # Sort by calories and return top 3 options
-        return suitable_foods.nlargest(3, 'Calories').to_dict('records')
+        if end == 0:
+            return [self._default_option(meal_type, target_calories)]
+
+        # Candidates are sorted by calories, so the top 3 options are the last 3
+        top = positions[max(0, end - 3):end][::-1]
+        return self._records(top)
 
     def get_nutritional_info(self, food_name):
-        """Get detailed nutritional information for a specific food"""
-        food_info = self.food_data[self.food_data['Food'] == food_name]
-        if not food_info.empty:
-            return food_info.iloc[0].to_dict()
+        """Get detailed nutritional information for a specific food
+
+        Names match exactly, or else ignoring case, accents and punctuation.
+        """
+        position = self.name_index.lookup(food_name)
+        if position is not None:
+            return self._records([position])[0]
         return None
+
+    def search_foods(self, query, limit=10):
+        """Foods ranked by name match for autocomplete and misspelt searches
+
+        Each result carries a 'Score' key from 0 to 1, 1 for an exact match.
+        """
+        positions, scores = self.name_index.search(query, limit)
+        foods = self._records(positions)
+        for food, score in zip(foods, scores):
+            food['Score'] = round(float(score), 3)
+        return foods
+
+    def _substitution_filter(self, category=None, labels=None, health_preference=None):
+        """Cached (mask, positions) of the foods passing the static filters, or (None, None)"""
+        labels = tuple(sorted(label.lower() for label in ([labels] if isinstance(labels, str) else labels or [])))
+        if health_preference not in self.preference_masks:
+            health_preference = None
+        key = (category and category.lower(), labels, health_preference)
+        if key == (None, (), None):
+            return None, None
+        if key not in self._substitution_filters:
+            none = np.zeros(len(self.food_data), dtype=bool)
+            mask = np.ones(len(self.food_data), dtype=bool)
+            if key[0] is not None:
+                mask &= self.category_masks.get(key[0], none)
+            for label in labels:
+                mask &= self.label_masks.get(label, none)
+            if health_preference is not None:
+                mask &= self.preference_masks[health_preference]
+            self._substitution_filters[key] = (mask, np.flatnonzero(mask))
+        return self._substitution_filters[key]
+
+    def _get_substitution_index(self):
+        """Nearest-neighbour index over the catalog's macros, built on first use"""
+        if self._substitution_index is None:
+            index_class = food_substitution.FoodSubstitutionIndex
+            if self._index_path:
+                self._substitution_index = index_class.load_or_build(self.food_data, self._index_path)
+            else:
+                self._substitution_index = index_class.from_catalog(self.food_data)
+        return self._substitution_index
+
+    def get_substitutes(self, food_name, k=5, category=None, labels=None, health_preference=None,
+                        less_of=None):
+        """Foods with the most similar calories and macros to food_name
+
+        Candidates can be limited to a meal category, to foods carrying all
+        of the given health labels (e.g. ['vegan']), to a health preference
+        and to foods with less of each macro column in less_of (e.g.
+        ['Carbohydrates']). Each result carries a 'Distance' key, smaller
+        meaning more similar. Returns None if the food is unknown.
+        """
+        position = self.name_index.lookup(food_name)
+        if position is None:
+            return None
+
+        mask, allowed = self._substitution_filter(category, labels, health_preference)
+        accept = None
+        if less_of:
+            columns = [less_of] if isinstance(less_of, str) else less_of
+            limits = [(self._macros[column], self._macros[column][position]) for column in columns]
+
+            def accept(positions):
+                keep = np.ones(len(positions), dtype=bool)
+                for values, limit in limits:
+                    keep &= values[positions] < limit
+                return keep
+
+        positions, distances = self._get_substitution_index().query(position, k, mask, allowed, accept)
+        substitutes = self._records(positions)
+        for food, distance in zip(substitutes, distances):
+            food['Distance'] = round(float(distance), 3)
+        return substitutes
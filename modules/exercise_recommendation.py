@@ -1,10 +1,88 @@
+import zlib
+
 import pandas as pd
 import numpy as np
 
+from modules.workout_plan import WorkoutPlan, WorkoutPlanBatch
+from utils.metrics import instrumented
+
+
+DIFFICULTY_LEVELS = ['Beginner', 'Intermediate', 'Advanced']
+
+GOAL_CATEGORIES = {
+    "Weight Loss": ['Cardio', 'HIIT'],
+    "Muscle Gain": ['Strength'],
+    "Flexibility": ['Flexibility', 'Core'],
+}
+
+CONDITION_EXCLUDED_CATEGORIES = {
+    "Joint Pain": ['HIIT', 'High Impact'],
+    "Heart Condition": ['HIIT'],
+}
+
+CARDIO_CATEGORIES = ['Cardio', 'HIIT']
+STRENGTH_CATEGORIES = ['Strength']
+
+
+GROUP_SIZES = (2, 2, 1)
+
 
+def _splitmix64(values):
+    """Vectorized SplitMix64 finalizer, maps uint64 arrays to well-mixed uint64"""
+    values = values + np.uint64(0x9E3779B97F4A7C15)
+    values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+def _user_hashes(seed, user_keys):
+    """Stable per-user random stream ids derived from the seed and user key"""
+    keys = np.array([zlib.crc32(str(key).encode()) for key in user_keys], dtype=np.uint64)
+    return _splitmix64(keys ^ _splitmix64(np.array([seed], dtype=np.uint64)))
+
+
+@instrumented('exercise')
 class ExerciseRecommender:
-    def __init__(self):
-        self.exercise_data = pd.read_csv('data/exercise_data.csv')
+    def __init__(self, exercise_data=None):
+        # A prebuilt catalog can be passed in instead of reading the CSV
+        self.exercise_data = pd.read_csv('data/exercise_data.csv') if exercise_data is None else exercise_data.reset_index(drop=True)
+        self._build_index()
+
+    @classmethod
+    def from_catalog(cls, catalog):
+        """Recommender over a compiled catalog (data/catalog_store.py)"""
+        return cls(catalog.frame)
+
+    def _build_index(self):
+        """Encode difficulty as ordinal codes and precompute category masks"""
+        exercises = self.exercise_data
+        ranks = {level.lower(): rank for rank, level in enumerate(DIFFICULTY_LEVELS)}
+        # Unknown difficulties rank above every level and are never recommended
+        self.difficulty_codes = (exercises['Difficulty'].str.lower().map(ranks)
+                                 .fillna(len(DIFFICULTY_LEVELS)).to_numpy(dtype=int))
+
+        category = exercises['Category'].to_numpy(dtype=object)
+        self.goal_masks = {goal: np.isin(category, categories)
+                           for goal, categories in GOAL_CATEGORIES.items()}
+        self.condition_masks = {condition: ~np.isin(category, categories)
+                                for condition, categories in CONDITION_EXCLUDED_CATEGORIES.items()}
+        self.cardio_mask = np.isin(category, CARDIO_CATEGORIES)
+        self.strength_mask = np.isin(category, STRENGTH_CATEGORIES)
+        self.other_mask = ~(self.cardio_mask | self.strength_mask)
+
+        # Catalog columns for columnar plan building, with the default
+        # exercises appended so users without a match can still get a plan
+        defaults = self._default_exercises()
+        catalog = pd.concat([exercises, defaults], ignore_index=True)
+        self._default_positions = np.arange(len(exercises), len(catalog))
+        self._plan_columns = {
+            'exercise': catalog['Exercise'].to_numpy(dtype=object),
+            'calories_per_hour': catalog['CaloriesPerHour'].to_numpy(dtype=float),
+            'target_muscles': catalog['TargetMuscles'].to_numpy(dtype=object),
+            'difficulty': catalog['Difficulty'].to_numpy(dtype=object),
+        }
+
+        self._candidates = {}
 
     def get_difficulty_level(self, bmi, activity_level):
         """Determine the appropriate difficulty level based on BMI and activity level"""
@@ -15,86 +93,133 @@ class ExerciseRecommender:
         else:
             return "Advanced"
 
-    def recommend_exercises(self, bmi, activity_level, goal, health_conditions=None):
+    def _get_candidates(self, difficulty, goal, health_conditions=None):
+        """Return (cardio, strength, other) row positions for a profile"""
+        # Missing values (e.g. NaN from a DataFrame column) mean no conditions
+        if not isinstance(health_conditions, (list, tuple, set, np.ndarray)):
+            health_conditions = ()
+        conditions = ()
+        if len(health_conditions) and 'None' not in health_conditions:
+            conditions = tuple(sorted(c for c in health_conditions if c in self.condition_masks))
+        key = (difficulty, goal, conditions)
+
+        if key not in self._candidates:
+            # Filter exercises at or below the difficulty level
+            mask = self.difficulty_codes <= DIFFICULTY_LEVELS.index(difficulty)
+
+            # Adjust recommendations based on goal and health conditions
+            if goal in self.goal_masks:
+                mask = mask & self.goal_masks[goal]
+            for condition in conditions:
+                mask = mask & self.condition_masks[condition]
+
+            self._candidates[key] = (
+                np.flatnonzero(mask & self.cardio_mask),
+                np.flatnonzero(mask & self.strength_mask),
+                np.flatnonzero(mask & self.other_mask),
+            )
+        return self._candidates[key]
+
+    def _sample_positions(self, candidates, rng):
+        """Sample up to 2 cardio, 2 strength and 1 other exercise"""
+        picks = [rng.choice(group, min(size, len(group)), replace=False)
+                 for group, size in zip(candidates, GROUP_SIZES) if len(group)]
+        if not picks:
+            return None
+        return np.concatenate(picks)
+
+    def _default_exercises(self):
+        return pd.DataFrame({
+            'Exercise': ['Walking', 'Stretching', 'Light Yoga'],
+            'Category': ['Cardio', 'Flexibility', 'Flexibility'],
+            'Difficulty': ['Beginner', 'Beginner', 'Beginner'],
+            'CaloriesPerHour': [280, 150, 200],
+            'TargetMuscles': ['Lower Body', 'Full Body', 'Full Body']
+        })
+
+    def recommend_exercises(self, bmi, activity_level, goal, health_conditions=None, seed=None):
         """Recommend exercises based on user parameters"""
         difficulty = self.get_difficulty_level(bmi, activity_level)
-
-        # Filter exercises based on difficulty
-        suitable_exercises = self.exercise_data[
-            self.exercise_data['Difficulty'].str.lower() <= difficulty.lower()]
-
-        # Adjust recommendations based on goal
-        if goal == "Weight Loss":
-            suitable_exercises = suitable_exercises[
-                suitable_exercises['Category'].isin(['Cardio', 'HIIT'])]
-        elif goal == "Muscle Gain":
-            suitable_exercises = suitable_exercises[
-                suitable_exercises['Category'].isin(['Strength'])]
-        elif goal == "Flexibility":
-            suitable_exercises = suitable_exercises[
-                suitable_exercises['Category'].isin(['Flexibility', 'Core'])]
-
-        # Filter based on health conditions if specified
-        if health_conditions and 'None' not in health_conditions:
-            # Add specific exercise filtering logic for health conditions
-            if 'Joint Pain' in health_conditions:
-                suitable_exercises = suitable_exercises[
-                    ~suitable_exercises['Category'].isin(['HIIT', 'High Impact'])]
-            if 'Heart Condition' in health_conditions:
-                suitable_exercises = suitable_exercises[
-                    suitable_exercises['Category'] != 'HIIT']
-
-        # Get available categories
-        cardio = suitable_exercises[suitable_exercises['Category'].isin(['Cardio', 'HIIT'])]
-        strength = suitable_exercises[suitable_exercises['Category'] == 'Strength']
-        other = suitable_exercises[~suitable_exercises['Category'].isin(['Cardio', 'HIIT', 'Strength'])]
-
-        # Sample only if data is available
-        result = []
-
-        if not cardio.empty:
-            result.append(cardio.sample(min(2, len(cardio))))
-        if not strength.empty:
-            result.append(strength.sample(min(2, len(strength))))
-        if not other.empty:
-            result.append(other.sample(min(1, len(other))))
+        candidates = self._get_candidates(difficulty, goal, health_conditions)
+        positions = self._sample_positions(candidates, np.random.default_rng(seed))
 
         # If no exercises match the criteria, return some default exercises
-        if not result:
-            return pd.DataFrame({
-                'Exercise': ['Walking', 'Stretching', 'Light Yoga'],
-                'Category': ['Cardio', 'Flexibility', 'Flexibility'],
-                'Difficulty': ['Beginner', 'Beginner', 'Beginner'],
-                'CaloriesPerHour': [280, 150, 200],
-                'TargetMuscles': ['Lower Body', 'Full Body', 'Full Body']
-            })
-
-        return pd.concat(result) if result else pd.DataFrame()
+        if positions is None:
+            return self._default_exercises()
+
+        return self.exercise_data.iloc[positions]
+
+    def recommend_positions_batch(self, profiles, seed=0):
+        """Row positions of recommended exercises for many user profiles
+
+        profiles is a DataFrame (or list of dicts) with bmi, activity_level,
+        goal and optionally health_conditions and user_id columns. Users are
+        grouped by candidate set and each group is sampled in one vectorized
+        step: every (user, exercise) pair gets a hash-derived random key from
+        the seed and the user's id (or row position), and the lowest keys win.
+        The same profile and seed therefore always give the same exercises,
+        regardless of the rest of the batch. Users with no matching exercise
+        get None.
+        """
+        profiles = pd.DataFrame(profiles)
+        n = len(profiles)
+        user_keys = profiles['user_id'] if 'user_id' in profiles else range(n)
+        conditions = profiles['health_conditions'] if 'health_conditions' in profiles else [None] * n
+        hashes = _user_hashes(seed, user_keys)
+
+        groups = {}
+        for row, (bmi, activity_level, goal, health_conditions) in enumerate(zip(
+                profiles['bmi'], profiles['activity_level'], profiles['goal'], conditions)):
+            difficulty = self.get_difficulty_level(bmi, activity_level)
+            candidates = self._get_candidates(difficulty, goal, health_conditions)
+            groups.setdefault(id(candidates), (candidates, []))[1].append(row)
+
+        results = [None] * n
+        for candidates, rows in groups.values():
+            rows = np.array(rows)
+            picks = []
+            for group, size in zip(candidates, GROUP_SIZES):
+                if len(group):
+                    keys = _splitmix64(hashes[rows, None] ^ group[None, :].astype(np.uint64))
+                    order = np.argsort(keys, axis=1)[:, :size]
+                    picks.append(group[order])
+            if picks:
+                chosen = np.hstack(picks)
+                for row, positions in zip(rows, chosen):
+                    results[row] = positions
+        return results
+
+    def recommend_exercises_batch(self, profiles, seed=0):
+        """Recommend exercises for many user profiles in one call"""
+        return [self._default_exercises() if positions is None else self.exercise_data.iloc[positions]
+                for positions in self.recommend_positions_batch(profiles, seed)]
 
     def create_workout_plan(self, exercises, duration_minutes=30):
         """Create a workout plan with specified exercises and duration"""
-        workout_plan = []
-
         if exercises.empty:
-            return workout_plan
+            return WorkoutPlan.empty()
 
-        # Calculate time per exercise
-        time_per_exercise = max(5, duration_minutes // len(exercises))
+        return WorkoutPlan.from_columns(
+            exercises['Exercise'].to_numpy(dtype=object),
+            exercises['CaloriesPerHour'].to_numpy(dtype=float),
+            exercises['TargetMuscles'].to_numpy(dtype=object),
+            exercises['Difficulty'].to_numpy(dtype=object),
+            duration_minutes=duration_minutes
+        )
 
-        for _, exercise in exercises.iterrows():
-            calories = round((exercise['CaloriesPerHour'] * time_per_exercise) / 60)
-            workout_plan.append({
-                'exercise': exercise['Exercise'],
-                'duration': time_per_exercise,
-                'calories': calories,
-                'target_muscles': exercise['TargetMuscles'],
-                'difficulty': exercise['Difficulty']
-            })
+    def create_workout_plans_batch(self, positions, duration_minutes=30):
+        """Create workout plans for many users from recommend_positions_batch output
 
-        return workout_plan
+        duration_minutes is a scalar or one value per user. Users without
+        recommended exercises get the default plan.
+        """
+        positions = [self._default_positions if p is None else p for p in positions]
+        return WorkoutPlanBatch.from_positions(self._plan_columns, positions, duration_minutes)
 
     def calculate_total_calories(self, workout_plan):
         """Calculate total calories burned in the workout"""
+        if isinstance(workout_plan, WorkoutPlan):
+            return workout_plan.total_calories()
         return sum(workout['calories'] for workout in workout_plan)
 
     def get_exercise_tips(self, exercise_name):
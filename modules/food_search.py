@@ -0,0 +1,198 @@
+# modules/food_search.py
+
+import numpy as np
+import pandas as pd
+
+from utils.lazy import lazy_import
+
+# Only needed to save and map indexes, see FoodNameIndex.load_or_build
+catalog_store = lazy_import('data.catalog_store')
+
+# Names longer than this are only indexed on their first characters
+MAX_INDEXED_LENGTH = 48
+# Trigram matches re-ranked exactly for every search
+RERANK_CANDIDATES = 200
+# Names turned into trigrams at a time while building the index
+BUILD_BLOCK = 65536
+# Bumped when the saved index arrays change
+INDEX_FORMAT = 1
+
+
+def normalize_names(names):
+    """Lowercase ASCII names with accents stripped and punctuation collapsed to spaces"""
+    names = pd.Series(names, dtype=object).fillna('').astype(str)
+    accented = ~names.str.isascii()
+    if accented.any():
+        names = names.copy()
+        names[accented] = (names[accented].str.normalize('NFKD')
+                           .str.encode('ascii', 'ignore').str.decode('ascii'))
+    return names.str.lower().str.replace(r'[^a-z0-9]+', ' ', regex=True).str.strip()
+
+
+def normalize_name(name):
+    return normalize_names([name]).iloc[0]
+
+
+def _trigram_codes(padded):
+    """Trigram codes of fixed-width ASCII byte strings, 0 past the end of each"""
+    width = padded.dtype.itemsize
+    chars = np.frombuffer(padded.tobytes(), dtype=np.uint8).reshape(len(padded), width).astype(np.int32)
+    codes = (chars[:, :-2] << 16) | (chars[:, 1:-1] << 8) | chars[:, 2:]
+    # A trigram touching the zero padding is not part of the name
+    codes[(chars[:, 2:] == 0)] = 0
+    return codes
+
+
+def _query_trigrams(normalized):
+    # The last word may still be typed, so it only gets a leading space
+    padded = np.array([f" {normalized[:MAX_INDEXED_LENGTH]}".encode()])
+    codes = _trigram_codes(padded)[0]
+    return np.unique(codes[codes > 0])
+
+
+class FoodNameIndex:
+    """Exact, prefix and typo-tolerant lookup of food names
+
+    Names are normalized (case, accents, punctuation) once at build time.
+    Exact lookups binary search the sorted normalized names. search()
+    ranks names by how many of the query's character trigrams they share
+    (Dice coefficient) using an inverted index with one posting array per
+    trigram, so each keystroke only touches the names sharing a trigram
+    with the query. Names starting with the query rank first, which makes
+    it usable for autocomplete, and misspelt queries still find the
+    closest names. Every structure is a flat numpy array, so an index can
+    be saved next to a compiled catalog and mapped by each process (see
+    load_or_build).
+    """
+
+    def __init__(self, names, arrays=None):
+        self.names = pd.Series(names).reset_index(drop=True)
+        if arrays is None:
+            arrays = self._build(normalize_names(self.names).tolist())
+        self.normalized = arrays['normalized']
+        self._trigrams = arrays['trigrams']
+        self._starts = arrays['starts']
+        self._postings = arrays['postings']
+        self._trigram_counts = arrays['trigram_counts']
+        self._sorted = arrays['sorted']
+        self._sorted_names = arrays['sorted_names']
+        self._sorted_lengths = arrays['sorted_lengths']
+
+    @classmethod
+    def load_or_build(cls, names, path):
+        """Map the index saved at path, building and saving it first if missing or stale
+
+        path should be keyed by the catalog version, as only the row count
+        is checked against names.
+        """
+        names = pd.Series(names).reset_index(drop=True)
+        mapped = catalog_store.map_arrays(path)
+        if mapped is None or mapped[0].get('index_format') != INDEX_FORMAT \
+                or mapped[0].get('rows') != len(names):
+            arrays = cls._build(normalize_names(names).tolist())
+            catalog_store.save_arrays(path, arrays, index_format=INDEX_FORMAT, rows=len(names))
+            mapped = catalog_store.map_arrays(path)
+        return cls(names, mapped[1])
+
+    def to_arrays(self):
+        return {
+            'normalized': self.normalized, 'trigrams': self._trigrams, 'starts': self._starts,
+            'postings': self._postings, 'trigram_counts': self._trigram_counts, 'sorted': self._sorted,
+            'sorted_names': self._sorted_names, 'sorted_lengths': self._sorted_lengths,
+        }
+
+    @staticmethod
+    def _build(normalized):
+        # Normalized names are ASCII, so they fit a fixed-width bytes array
+        normalized = np.array(normalized, dtype=bytes)
+
+        # (trigram << 24 | row) for every distinct trigram of every name
+        blocks = [np.empty(0, dtype=np.int64)]
+        for start in range(0, len(normalized), BUILD_BLOCK):
+            names = normalized[start:start + BUILD_BLOCK]
+            codes = _trigram_codes(np.array([b" " + name[:MAX_INDEXED_LENGTH] + b" " for name in names]))
+            rows = np.broadcast_to(np.arange(start, start + len(names))[:, None], codes.shape)
+            valid = codes > 0
+            blocks.append((codes[valid].astype(np.int64) << 24) | rows[valid])
+        pairs = np.sort(np.concatenate(blocks))
+        pairs = pairs[np.append(True, pairs[1:] != pairs[:-1])]
+        trigrams = pairs >> 24
+        starts = np.flatnonzero(np.append(True, trigrams[1:] != trigrams[:-1]))
+        postings = (pairs & ((1 << 24) - 1)).astype(np.int32)
+
+        # Sorted names for exact lookups and for prefix ranges of queries
+        # too short for trigrams
+        order = np.argsort(normalized, kind='stable')
+        return {
+            'normalized': normalized,
+            'trigrams': trigrams[starts],
+            'starts': np.append(starts, len(pairs)),
+            'postings': postings,
+            'trigram_counts': np.bincount(postings, minlength=len(normalized)),
+            'sorted': order,
+            'sorted_names': normalized[order],
+            'sorted_lengths': np.char.str_len(normalized[order]),
+        }
+
+    def __len__(self):
+        return len(self.names)
+
+    def lookup(self, name):
+        """Row position of a name, exact first and then normalized, or None"""
+        normalized = normalize_name(name).encode()
+        first = np.searchsorted(self._sorted_names, normalized, side='left')
+        last = np.searchsorted(self._sorted_names, normalized, side='right')
+        # Positions with this normalized name, in catalog order
+        matches = self._sorted[first:last]
+        if len(matches) == 0:
+            return None
+        for position in matches.tolist():
+            if self.names.iat[position] == name:
+                return position
+        return int(matches[0])
+
+    def search(self, query, limit=10):
+        """Positions and scores (0-1) of the names best matching query"""
+        normalized = normalize_name(query)
+        if not normalized or len(self.names) == 0 or limit <= 0:
+            return np.empty(0, dtype=int), np.empty(0)
+        query_codes = _query_trigrams(normalized)
+        normalized = normalized.encode()
+        if len(query_codes) == 0:
+            return self._prefix_search(normalized, limit)
+
+        found = np.minimum(np.searchsorted(self._trigrams, query_codes), len(self._trigrams) - 1)
+        found = found[self._trigrams[found] == query_codes]
+        if len(found) == 0:
+            return np.empty(0, dtype=int), np.empty(0)
+        postings = np.concatenate([self._postings[self._starts[i]:self._starts[i + 1]] for i in found])
+        shared = np.bincount(postings, minlength=len(self.names))
+
+        # Names sharing under a third of the query's trigrams are not similar
+        candidates = np.flatnonzero(shared >= max(1, len(query_codes) // 3))
+        dice = 2 * shared[candidates] / (len(query_codes) + self._trigram_counts[candidates])
+        if len(candidates) > RERANK_CANDIDATES:
+            top = np.argpartition(-dice, RERANK_CANDIDATES - 1)[:RERANK_CANDIDATES]
+            candidates, dice = candidates[top], dice[top]
+
+        # Exact and prefix matches first, then by similarity, shorter names first
+        names = self.normalized[candidates]
+        exact = names == normalized
+        prefix = np.char.startswith(names, normalized)
+        score = np.where(exact, 1.0, np.minimum(dice, 0.99))
+        lengths = np.char.str_len(names)
+        order = np.lexsort((candidates, lengths, -score, ~prefix, ~exact))[:limit]
+        return candidates[order], score[order]
+
+    def _prefix_search(self, normalized, limit):
+        """Shortest names starting with a one-character query"""
+        first = np.searchsorted(self._sorted_names, normalized, side='left')
+        last = np.searchsorted(self._sorted_names, normalized + b'\x7f', side='left')
+        matches = self._sorted[first:last]
+        # Shortest names first, ties by catalog position
+        keys = self._sorted_lengths[first:last].astype(np.int64) * len(self.names) + matches
+        if len(keys) > limit:
+            keys = keys[np.argpartition(keys, limit - 1)[:limit]]
+        matches = np.sort(keys) % len(self.names)
+        scores = np.where(self.normalized[matches] == normalized, 1.0, 0.5)
+        return matches, scores
@@ -0,0 +1,136 @@
+# modules/food_substitution.py
+
+import hashlib
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+try:
+    from sklearn.neighbors import KDTree
+except ImportError:  # pragma: no cover - the brute-force search still works
+    KDTree = None
+
+MACRO_COLUMNS = ['Calories', 'Protein', 'Carbohydrates', 'Fat']
+INDEX_FORMAT = 1
+
+# Filters matching at most this many foods are scanned directly instead of
+# searched through the tree
+BRUTE_FORCE_LIMIT = 4096
+# Largest neighbour count asked of the tree before falling back to a scan
+TREE_QUERY_LIMIT = 16 * BRUTE_FORCE_LIMIT
+
+
+def catalog_fingerprint(food_data):
+    """Hash of the food names and macros, to tell if a saved index is stale
+
+    The digest depends on row order, as the saved tree refers to rows by
+    position.
+    """
+    columns = ['Food'] + MACRO_COLUMNS
+    hashes = pd.util.hash_pandas_object(food_data[columns], index=False)
+    digest = hashlib.blake2b(','.join(columns).encode(), digest_size=16)
+    digest.update(hashes.to_numpy().tobytes())
+    return f"{len(food_data)}-{digest.hexdigest()}"
+
+
+class FoodSubstitutionIndex:
+    """Nearest-neighbour search over standardized macro vectors
+
+    Each food is a point of z-scored (Calories, Protein, Carbohydrates,
+    Fat). query() finds the foods closest to a point among those allowed
+    by a boolean mask: broad masks walk a KD-tree over the whole catalog,
+    asking for more neighbours until enough pass the mask, while narrow
+    masks are scanned directly, which is faster for small subsets.
+    """
+
+    def __init__(self, macros, fingerprint=None, tree=None):
+        macros = np.asarray(macros, dtype=float)
+        self.fingerprint = fingerprint
+        self.mean = np.nanmean(macros, axis=0)
+        scale = np.nanstd(macros, axis=0)
+        self.scale = np.where(scale > 0, scale, 1.0)
+        self.points = np.nan_to_num((macros - self.mean) / self.scale)
+        if tree is None and KDTree is not None:
+            tree = KDTree(self.points)
+        self.tree = tree
+
+    @classmethod
+    def from_catalog(cls, food_data):
+        return cls(food_data[MACRO_COLUMNS].to_numpy(dtype=float), catalog_fingerprint(food_data))
+
+    @classmethod
+    def load_or_build(cls, food_data, path):
+        """Load the index saved at path, rebuilding and saving it if stale or missing"""
+        fingerprint = catalog_fingerprint(food_data)
+        if os.path.exists(path):
+            try:
+                with open(path, 'rb') as f:
+                    saved = pickle.load(f)
+                if saved.get('format') == INDEX_FORMAT and saved.get('fingerprint') == fingerprint \
+                        and (saved.get('tree') is not None or KDTree is None):
+                    return cls(food_data[MACRO_COLUMNS].to_numpy(dtype=float), fingerprint, saved['tree'])
+            except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+                pass
+        index = cls(food_data[MACRO_COLUMNS].to_numpy(dtype=float), fingerprint)
+        index.save(path)
+        return index
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({'format': INDEX_FORMAT, 'fingerprint': self.fingerprint, 'tree': self.tree}, f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def __len__(self):
+        return len(self.points)
+
+    def _scan(self, point, position, k, candidates, accept=None):
+        """Exact k nearest among candidate positions by a direct distance scan"""
+        keep = candidates != position
+        if accept is not None:
+            keep &= accept(candidates)
+        candidates = candidates[keep]
+        distances = np.sqrt(((self.points[candidates] - point) ** 2).sum(axis=1))
+        k = min(k, len(candidates))
+        nearest = np.argpartition(distances, k - 1)[:k] if k < len(candidates) else np.arange(k)
+        # Closest first, ties broken by catalog position
+        nearest = nearest[np.lexsort((candidates[nearest], distances[nearest]))]
+        return candidates[nearest], distances[nearest]
+
+    def query(self, position, k=5, mask=None, allowed=None, accept=None):
+        """Positions and distances of the k foods nearest to the food at position
+
+        Only foods where mask is True are returned, never the food itself.
+        allowed can pass np.flatnonzero(mask) when the caller has it cached.
+        accept is an optional function of an array of positions returning
+        which of them to keep, for conditions that change with every query.
+        """
+        n = len(self.points)
+        point = self.points[position]
+        if mask is not None and allowed is None:
+            allowed = np.flatnonzero(mask)
+        count = n if mask is None else len(allowed)
+        if count == 0 or k <= 0:
+            return np.empty(0, dtype=int), np.empty(0)
+        if self.tree is None or count <= BRUTE_FORCE_LIMIT:
+            return self._scan(point, position, k, np.arange(n) if allowed is None else allowed, accept)
+
+        # Ask the tree for enough neighbours that about k of them pass the
+        # filters; if accept rejects most of them, scanning is cheaper
+        wanted = min(n, int((k + 1) * n / count * 2) + 1)
+        while wanted <= TREE_QUERY_LIMIT or wanted == n:
+            distances, positions = self.tree.query(point[None, :], k=wanted)
+            distances, positions = distances[0], positions[0]
+            keep = positions != position
+            if mask is not None:
+                keep &= mask[positions]
+            if accept is not None:
+                keep &= accept(positions)
+            if keep.sum() >= k or wanted == n:
+                return positions[keep][:k], distances[keep][:k]
+            wanted = min(n, wanted * 4)
+        return self._scan(point, position, k, np.arange(n) if allowed is None else allowed, accept)
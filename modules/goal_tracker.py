@@ -1,47 +1,188 @@
 # modules/goal_tracker.py
 
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 
+from utils.metrics import instrumented
+from utils.timeseries import TimeSeriesBuffer, to_datetime64
 
+GOAL_COLUMNS = [
+    'goal_type', 'target_value', 'current_value',
+    'start_date', 'target_date', 'status'
+]
+
+# The buffer's 'date' column holds each goal's start date
+GOAL_FIELDS = {
+    'goal_type': 'object',
+    'target_value': 'float64',
+    'current_value': 'float64',
+    'target_date': 'datetime64[s]',
+    'status': 'object'
+}
+
+# How each goal type is measured from logged daily data:
+# (daily column, 'latest' day value or 'total' since the start date, direction)
+GOAL_METRICS = {
+    "Weight Loss": ('weight', 'latest', 'down'),
+    "Exercise Frequency": ('workouts', 'total', 'up'),
+    "Daily Steps": ('steps', 'latest', 'up'),
+    "Water Intake": ('water_intake', 'latest', 'up'),
+    "Calorie Control": ('calories_consumed', 'latest', 'down'),
+}
+
+
+def _is_achieved(goal_type, current_value, target_value):
+    direction = GOAL_METRICS.get(goal_type, (None, None, 'up'))[2]
+    if direction == 'down':
+        return current_value <= target_value
+    return current_value >= target_value
+
+
+def _daily_history(history):
+    """Per-day totals (last weight of the day) from a tracker or DataFrame"""
+    frame = getattr(history, 'analytics_data', None)
+    if frame is None:
+        frame = getattr(history, 'progress_data', history)
+    frame = frame.rename(columns={'workouts_completed': 'workouts'})
+    if frame.empty:
+        return frame
+
+    day = pd.to_datetime(frame['date']).dt.floor('D').rename('date')
+    totals = [column for column in ('workouts', 'water_intake', 'calories_consumed', 'steps')
+              if column in frame]
+    daily = frame[totals].groupby(day).sum(min_count=1)
+    if 'weight' in frame:
+        daily['weight'] = frame['weight'].groupby(day).last()
+    return daily.reset_index()
+
+
+@instrumented('goals')
 class GoalTracker:
     def __init__(self):
-        self.goals = pd.DataFrame(columns=[
-            'goal_type', 'target_value', 'current_value',
-            'start_date', 'target_date', 'status'
-        ])
+        self._buffer = TimeSeriesBuffer(GOAL_FIELDS, capacity=16)
+        # Latest goal row for each goal type
+        self._index = {}
+        self._frame = None
+        self._frame_version = None
+
+    @property
+    def goals(self):
+        """All goals as a DataFrame"""
+        if self._frame_version != self._buffer.version:
+            frame = self._buffer.to_frame().rename(columns={'date': 'start_date'})
+            self._frame = frame[GOAL_COLUMNS]
+            self._frame_version = self._buffer.version
+        return self._frame
+
+    @goals.setter
+    def goals(self, data):
+        data = pd.DataFrame(data, columns=GOAL_COLUMNS)
+        self._buffer = TimeSeriesBuffer(GOAL_FIELDS, capacity=max(16, len(data)))
+        self._buffer.extend(data.rename(columns={'start_date': 'date'}))
+        self._index = {goal_type: row for row, goal_type in enumerate(data['goal_type'])}
+        self._frame_version = None
 
     def add_goal(self, goal_type, target_value, target_date):
         """Add a new goal"""
-        new_goal = pd.DataFrame({
-            'goal_type': [goal_type],
-            'target_value': [target_value],
-            'current_value': [0],
-            'start_date': [datetime.now().strftime('%Y-%m-%d')],
-            'target_date': [target_date],
-            'status': ['In Progress']
-        })
-        self.goals = pd.concat([self.goals, new_goal], ignore_index=True)
+        self._buffer.append(
+            date=datetime.now(),
+            goal_type=goal_type,
+            target_value=target_value,
+            current_value=0,
+            target_date=np.datetime64(target_date, 'D'),
+            status='In Progress'
+        )
+        self._index[goal_type] = len(self._buffer) - 1
 
     def update_goal_progress(self, goal_type, current_value):
         """Update progress for a specific goal"""
-        idx = self.goals[self.goals['goal_type'] == goal_type].index
-        if len(idx) > 0:
-            self.goals.loc[idx[-1], 'current_value'] = current_value
+        row = self._index.get(goal_type)
+        if row is not None:
+            self._buffer.update(row, current_value=current_value)
 
             # Update status
-            target = self.goals.loc[idx[-1], 'target_value']
-            if current_value >= target:
-                self.goals.loc[idx[-1], 'status'] = 'Achieved'
+            target = self._buffer.column('target_value')[row]
+            if _is_achieved(goal_type, current_value, target):
+                self._buffer.update(row, status='Achieved')
 
     def get_goal_progress(self, goal_type):
         """Get progress for a specific goal"""
-        goal = self.goals[self.goals['goal_type'] == goal_type].iloc[-1]
-        if not goal.empty:
-            progress = (goal['current_value'] / goal['target_value']) * 100
+        row = self._index.get(goal_type)
+        if row is not None:
+            current = self._buffer.column('current_value')[row]
+            target = self._buffer.column('target_value')[row]
+            if GOAL_METRICS.get(goal_type, (None, None, 'up'))[2] == 'down':
+                # Lower is better, and current_value is 0 until first updated
+                if current <= 0:
+                    return 0
+                progress = (target / current) * 100
+            else:
+                progress = (current / target) * 100
             return min(progress, 100)
         return 0
 
     def get_all_goals(self):
         """Get all active goals"""
         return self.goals[self.goals['status'] == 'In Progress']
+
+    def evaluate_goals(self, history, today=None):
+        """Update every active goal from a HealthAnalytics/ProgressTracker history
+
+        Computes each goal's current value from the daily logs up to its
+        target date in one vectorized pass: 'latest' metrics take the last
+        logged day's value, 'total' metrics sum everything since the goal
+        started. Goals that reach their target become 'Achieved', and goals
+        still open after their target date become 'Expired'. Returns the
+        number of goals whose status changed.
+        """
+        if len(self._buffer) == 0:
+            return 0
+        today = np.datetime64(today or datetime.now(), 'D').astype('datetime64[s]')
+        daily = _daily_history(history)
+
+        goal_types = self._buffer.column('goal_type')
+        target_values = self._buffer.column('target_value')
+        start_dates = self._buffer.column('date')
+        target_dates = self._buffer.column('target_date')
+        status = self._buffer.column('status')
+        active = status == 'In Progress'
+
+        current = self._buffer.column('current_value').copy()
+        achieved = np.zeros(len(current), dtype=bool)
+        if len(daily):
+            dates = to_datetime64(daily['date'])
+            end_dates = np.minimum(target_dates, today)
+            # Rows [first, last) of the daily log fall inside each goal's period
+            first = np.searchsorted(dates, start_dates, side='left')
+            last = np.searchsorted(dates, end_dates, side='right')
+
+            for goal_type, (column, kind, direction) in GOAL_METRICS.items():
+                goals = active & (goal_types == goal_type)
+                if not goals.any() or column not in daily:
+                    continue
+                values = daily[column].to_numpy(dtype=float)
+                if kind == 'total':
+                    cumulative = np.concatenate([[0.0], np.cumsum(np.nan_to_num(values))])
+                    measured = cumulative[last[goals]] - cumulative[np.minimum(first[goals], last[goals])]
+                    has_data = last[goals] > first[goals]
+                else:
+                    # Last non-missing value on or before the end of the period
+                    filled = pd.Series(values).ffill().to_numpy()
+                    has_data = last[goals] > 0
+                    measured = np.where(has_data, filled[np.maximum(last[goals] - 1, 0)], np.nan)
+                    has_data &= ~np.isnan(measured)
+
+                rows = np.flatnonzero(goals)[has_data]
+                current[rows] = measured[has_data]
+                if direction == 'down':
+                    achieved[rows] = current[rows] <= target_values[rows]
+                else:
+                    achieved[rows] = current[rows] >= target_values[rows]
+
+        new_status = status.copy()
+        new_status[active & achieved] = 'Achieved'
+        new_status[active & ~achieved & (target_dates < today)] = 'Expired'
+        changed = int((new_status != status).sum())
+        self._buffer.update(slice(None), current_value=current, status=new_status)
+        return changed
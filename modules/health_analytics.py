@@ -1,46 +1,114 @@
 # modules/health_analytics.py
 
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 from datetime import datetime, timedelta
 
+from utils.charts import FigureCache, bin_by_date, downsample_line
+from utils.lazy import lazy_import
+from utils.metrics import instrumented
+from utils.rolling import SUM_FIELDS, RollingDailyAggregates
+from utils.timeseries import TimeSeriesBuffer
 
+# Plotly is only imported once a chart is actually built
+px = lazy_import('plotly.express')
+go = lazy_import('plotly.graph_objects')
+
+ANALYTICS_COLUMNS = {
+    'weight': 'float64',
+    'bmi': 'float64',
+    'calories_consumed': 'float64',
+    'calories_burned': 'float64',
+    'workouts': 'int64',
+    'water_intake': 'float64',
+    # Daily totals imported from wearables, see data/wearable_ingest.py
+    'steps': 'float64',
+    'avg_heart_rate': 'float64'
+}
+
+
+@instrumented('analytics')
 class HealthAnalytics:
     def __init__(self):
-        self.analytics_data = pd.DataFrame(columns=[
-            'date', 'weight', 'bmi', 'calories_consumed',
-            'calories_burned', 'workouts', 'water_intake'
-        ])
+        self._buffer = TimeSeriesBuffer(ANALYTICS_COLUMNS)
+        self._aggregates = RollingDailyAggregates()
+        self._figures = FigureCache()
+
+    @property
+    def analytics_data(self):
+        """Daily health data as a DataFrame view over the columnar buffer"""
+        return self._buffer.to_frame()
+
+    @analytics_data.setter
+    def analytics_data(self, data):
+        self._buffer = TimeSeriesBuffer(ANALYTICS_COLUMNS)
+        self._buffer.extend(data)
+        self._aggregates = None
+        self._figures.clear()
+
+    def _get_aggregates(self):
+        """Running aggregates, rebuilt from the full history only when invalidated"""
+        if self._aggregates is None:
+            self._aggregates = RollingDailyAggregates.from_frame(self.analytics_data)
+        return self._aggregates
 
     def add_daily_data(self, weight, bmi, calories_consumed, calories_burned, workouts, water_intake):
-        new_data = pd.DataFrame({
-            'date': [datetime.now().strftime('%Y-%m-%d')],
-            'weight': [weight],
-            'bmi': [bmi],
-            'calories_consumed': [calories_consumed],
-            'calories_burned': [calories_burned],
-            'workouts': [workouts],
-            'water_intake': [water_intake]
-        })
-        self.analytics_data = pd.concat([self.analytics_data, new_data], ignore_index=True)
+        date = datetime.now()
+        self._buffer.append(
+            date=date,
+            weight=weight,
+            bmi=bmi,
+            calories_consumed=calories_consumed,
+            calories_burned=calories_burned,
+            workouts=workouts,
+            water_intake=water_intake
+        )
+        if self._aggregates is not None and not self._aggregates.add(
+                date,
+                weight=weight,
+                calories_consumed=calories_consumed,
+                calories_burned=calories_burned,
+                workouts=workouts,
+                water_intake=water_intake):
+            # Entry predates the latest logged day, rebuild on next summary
+            self._aggregates = None
+
+    def add_daily_rows(self, rows):
+        """Bulk-append dated daily rows (a DataFrame or records with a date column)"""
+        rows = pd.DataFrame(rows)
+        if rows.empty:
+            return
+        self._buffer.extend(rows)
+        if self._aggregates is None:
+            return
+        fields = [column for column in ('weight',) + SUM_FIELDS if column in rows]
+        for row in rows[['date'] + fields].itertuples(index=False):
+            if not self._aggregates.add(**row._asdict()):
+                self._aggregates = None
+                break
 
     def get_weight_trend(self):
-        fig = px.line(self.analytics_data, x='date', y='weight',
+        return self._figures.get('weight_trend', self._buffer.version, self._build_weight_trend)
+
+    def _build_weight_trend(self):
+        fig = px.line(downsample_line(self.analytics_data, 'date', 'weight'), x='date', y='weight',
                       title='Weight Trend Over Time')
         fig.update_layout(height=400)
         return fig
 
     def get_calorie_balance(self):
+        return self._figures.get('calorie_balance', self._buffer.version, self._build_calorie_balance)
+
+    def _build_calorie_balance(self):
+        data = bin_by_date(self.analytics_data, 'date', ['calories_consumed', 'calories_burned'])
         fig = go.Figure()
         fig.add_trace(go.Bar(
-            x=self.analytics_data['date'],
-            y=self.analytics_data['calories_consumed'],
+            x=data['date'],
+            y=data['calories_consumed'],
             name='Calories Consumed'
         ))
         fig.add_trace(go.Bar(
-            x=self.analytics_data['date'],
-            y=self.analytics_data['calories_burned'],
+            x=data['date'],
+            y=data['calories_burned'],
             name='Calories Burned'
         ))
         fig.update_layout(
@@ -51,19 +119,19 @@ class HealthAnalytics:
         return fig
 
     def get_health_summary(self):
-        if len(self.analytics_data) > 0:
-            latest = self.analytics_data.iloc[-1]
-            week_ago = self.analytics_data.iloc[0] if len(self.analytics_data) == 1 else \
-                self.analytics_data.iloc[-7] if len(self.analytics_data) >= 7 else \
-                    self.analytics_data.iloc[0]
+        if len(self._buffer) > 0:
+            aggregates = self._get_aggregates()
+            rolling = {window: aggregates.window_stats(window) for window in aggregates.windows}
 
-            weight_change = latest['weight'] - week_ago['weight']
-            avg_calories_burned = self.analytics_data['calories_burned'].mean()
-            total_workouts = self.analytics_data['workouts'].sum()
+            weight_change = rolling[7]['weight_change']
+            avg_calories_burned = aggregates.mean('calories_burned')
+            total_workouts = int(aggregates.totals['workouts'])
 
             return {
                 'weight_change': weight_change,
                 'avg_calories_burned': avg_calories_burned,
-                'total_workouts': total_workouts
+                'total_workouts': total_workouts,
+                'total_water_intake': aggregates.totals['water_intake'],
+                'rolling': rolling
             }
         return None
@@ -0,0 +1,177 @@
+# modules/meal_optimizer.py
+
+import time
+
+import numpy as np
+
+# Energy per gram of protein, carbohydrates and fat
+KCAL_PER_GRAM = np.array([4.0, 4.0, 9.0])
+
+# Share of calories from (protein, carbs, fat) allowed for each preference
+DEFAULT_MACRO_BANDS = ((0.10, 0.35), (0.45, 0.65), (0.20, 0.35))
+MACRO_BANDS = {
+    None: DEFAULT_MACRO_BANDS,
+    'Vegetarian': DEFAULT_MACRO_BANDS,
+    'Vegan': ((0.10, 0.30), (0.45, 0.70), (0.15, 0.35)),
+    'Low-Carb': ((0.20, 0.45), (0.05, 0.25), (0.30, 0.60)),
+    'Keto': ((0.15, 0.35), (0.00, 0.10), (0.55, 0.80)),
+    'Mediterranean': ((0.10, 0.30), (0.40, 0.60), (0.25, 0.40)),
+}
+
+PORTIONS = (0.5, 1.0, 1.5, 2.0)
+
+# Weight of one unit of macro band violation relative to one unit of
+# relative calorie error
+MACRO_PENALTY = 2.0
+
+# Upper bound on targets x options scored at once in the batch solver
+MAX_BLOCK_SIZE = 500_000
+
+# Large catalogs are reduced to one representative food per
+# (calorie bin, protein share bin, carb share bin) cell before solving
+MAX_FOODS = 500
+CALORIE_BINS = 16
+SHARE_BINS = 6
+
+
+def _macro_shares(macros):
+    """Share of energy from protein, carbs and fat for (..., 4) macro rows"""
+    energy = macros[..., 1:] * KCAL_PER_GRAM
+    total_energy = energy.sum(axis=-1, keepdims=True)
+    return np.divide(energy, total_energy, out=np.zeros_like(energy),
+                     where=total_energy > 0)
+
+
+def _representative_foods(macros, max_foods=MAX_FOODS):
+    """Row positions of foods that cover the catalog's calorie/macro space"""
+    if len(macros) <= max_foods:
+        return np.arange(len(macros))
+
+    log_calories = np.log1p(np.maximum(macros[:, 0], 0))
+    edges = np.linspace(log_calories.min(), log_calories.max(), CALORIE_BINS + 1)[1:-1]
+    calorie_bin = np.digitize(log_calories, edges)
+    share_bin = np.minimum((_macro_shares(macros)[:, :2] * SHARE_BINS).astype(int), SHARE_BINS - 1)
+
+    keys = (calorie_bin * SHARE_BINS + share_bin[:, 0]) * SHARE_BINS + share_bin[:, 1]
+    _, first = np.unique(keys, return_index=True)
+    return np.sort(first)
+
+
+class MealOptimizer:
+    """Pick food/portion combinations close to a calorie target and macro bands"""
+
+    def __init__(self, calories, protein, carbs, fat, health_preference=None,
+                 portions=PORTIONS, max_items=3, max_foods=MAX_FOODS):
+        self.max_items = max_items
+        self.bands = np.array(MACRO_BANDS.get(health_preference, DEFAULT_MACRO_BANDS))
+
+        # One option per (food, portion) pair, columns: calories, protein, carbs, fat
+        macros = np.column_stack([calories, protein, carbs, fat]).astype(float)
+        foods = _representative_foods(macros, max_foods)
+        macros = macros[foods]
+        portions = np.asarray(portions, dtype=float)
+        self.option_food = np.repeat(foods, len(portions))
+        self.option_portion = np.tile(portions, len(macros))
+        self.option_macros = np.repeat(macros, len(portions), axis=0) * self.option_portion[:, None]
+
+    def _score(self, totals, targets):
+        """Score (..., 4) macro totals against (...) calorie targets, lower is better
+
+        The calorie error is relative to the target; for a target of zero or
+        less it is the absolute calories, so nothing gets picked and callers
+        fall back to their default option.
+        """
+        calorie_gap = np.abs(totals[..., 0] - targets)
+        calorie_error = np.divide(calorie_gap, targets, out=calorie_gap.copy(), where=targets > 0)
+        shares = _macro_shares(totals)
+        violation = (np.maximum(self.bands[:, 0] - shares, 0)
+                     + np.maximum(shares - self.bands[:, 1], 0)).sum(axis=-1)
+        return calorie_error + MACRO_PENALTY * violation
+
+    def _best_options(self, base, targets, chosen):
+        """Best option to add to each (T, 4) base total, skipping foods in chosen"""
+        scores = self._score(base[:, None, :] + self.option_macros[None, :, :],
+                             targets[:, None])
+        taken = (self.option_food[None, :, None] == chosen[:, None, :]).any(axis=-1)
+        scores[taken] = np.inf
+        best = scores.argmin(axis=1)
+        return best, scores[np.arange(len(targets)), best]
+
+    def _solve_block(self, targets, deadline):
+        n_targets = len(targets)
+        rows = np.arange(n_targets)
+        selection = np.full((n_targets, self.max_items), -1)
+        chosen = np.full((n_targets, self.max_items), -1)
+        totals = np.zeros((n_targets, 4))
+        current = self._score(totals, targets)
+
+        # Greedy construction: keep adding the best option while it helps.
+        # Every target gets its first item; more only while time is left
+        for slot in range(self.max_items):
+            if slot and time.perf_counter() >= deadline:
+                break
+            best, score = self._best_options(totals, targets, chosen)
+            improved = score < current
+            if not improved.any():
+                break
+            picked = rows[improved]
+            selection[picked, slot] = best[improved]
+            chosen[picked, slot] = self.option_food[best[improved]]
+            totals[picked] += self.option_macros[best[improved]]
+            current[improved] = score[improved]
+
+        # Local search: swap, resize or drop one item at a time
+        changed = True
+        while changed and time.perf_counter() < deadline:
+            changed = False
+            for slot in range(self.max_items):
+                filled = selection[:, slot] >= 0
+                base = totals.copy()
+                base[filled] -= self.option_macros[selection[filled, slot]]
+                others = chosen.copy()
+                others[:, slot] = -1
+
+                best, score = self._best_options(base, targets, others)
+                drop_score = self._score(base, targets)
+                swap = score < current - 1e-9
+                drop = (drop_score < current - 1e-9) & (drop_score <= score) & filled
+                swap &= ~drop
+
+                if swap.any():
+                    selection[swap, slot] = best[swap]
+                    chosen[swap, slot] = self.option_food[best[swap]]
+                    totals[swap] = base[swap] + self.option_macros[best[swap]]
+                    current[swap] = score[swap]
+                if drop.any():
+                    selection[drop, slot] = -1
+                    chosen[drop, slot] = -1
+                    totals[drop] = base[drop]
+                    current[drop] = drop_score[drop]
+                changed = changed or swap.any() or drop.any()
+
+        return selection
+
+    def optimize_batch(self, targets, time_budget_ms=20.0):
+        """Optimize many calorie targets in one vectorized pass
+
+        Returns a list of [(food_position, portion), ...] per target. Once
+        time_budget_ms is spent, targets still being solved keep the items
+        picked so far (at least one where any helps) and stop improving.
+        """
+        targets = np.atleast_1d(np.asarray(targets, dtype=float))
+        if len(self.option_macros) == 0:
+            return [[] for _ in targets]
+
+        deadline = time.perf_counter() + time_budget_ms / 1000
+        block = max(1, MAX_BLOCK_SIZE // len(self.option_macros))
+        selections = [self._solve_block(targets[start:start + block], deadline)
+                      for start in range(0, len(targets), block)]
+        selection = np.vstack(selections)
+
+        return [[(int(self.option_food[option]), float(self.option_portion[option]))
+                 for option in row if option >= 0]
+                for row in selection]
+
+    def optimize(self, target_calories, time_budget_ms=20.0):
+        """Optimize a single calorie target"""
+        return self.optimize_batch([target_calories], time_budget_ms)[0]
@@ -1,52 +1,86 @@
 import pandas as pd
-import plotly.express as px
 from datetime import datetime
 
+from utils.charts import FigureCache, downsample_line
+from utils.lazy import lazy_import
+from utils.metrics import instrumented
+from utils.timeseries import TimeSeriesBuffer
+from utils.visualization import create_weekly_calendar
 
+# Plotly is only imported once a chart is actually built
+px = lazy_import('plotly.express')
+
+PROGRESS_COLUMNS = {
+    'weight': 'float64',
+    'bmi': 'float64',
+    'workouts_completed': 'int64',
+    'calories_burned': 'int64',
+    'measurements': 'object'
+}
+
+
+@instrumented('progress')
 class ProgressTracker:
     def __init__(self):
-        self.progress_data = pd.DataFrame(columns=[
-            'date', 'weight', 'bmi', 'workouts_completed',
-            'calories_burned', 'measurements'
-        ])
+        self._buffer = TimeSeriesBuffer(PROGRESS_COLUMNS)
+        self._figures = FigureCache()
+
+    @property
+    def progress_data(self):
+        """Progress history as a DataFrame view over the columnar buffer"""
+        return self._buffer.to_frame()
+
+    @progress_data.setter
+    def progress_data(self, data):
+        self._buffer = TimeSeriesBuffer(PROGRESS_COLUMNS)
+        self._buffer.extend(data)
+        self._figures.clear()
 
     def add_entry(self, weight, height, workouts_completed, calories_burned):
         """Add a new progress entry"""
         bmi = weight / ((height / 100) ** 2)
 
-        new_entry = pd.DataFrame({
-            'date': [datetime.now().strftime('%Y-%m-%d')],
-            'weight': [weight],
-            'bmi': [bmi],
-            'workouts_completed': [workouts_completed],
-            'calories_burned': [calories_burned]
-        })
-
-        self.progress_data = pd.concat([self.progress_data, new_entry], ignore_index=True)
+        self._buffer.append(
+            date=datetime.now(),
+            weight=weight,
+            bmi=bmi,
+            workouts_completed=workouts_completed,
+            calories_burned=calories_burned
+        )
 
     def get_workout_summary(self):
         """Get summary of workouts and calories"""
-        if len(self.progress_data) > 0:
-            total_workouts = self.progress_data['workouts_completed'].sum()
-            total_calories = self.progress_data['calories_burned'].sum()
+        if len(self._buffer) > 0:
+            total_workouts = int(self._buffer.column('workouts_completed').sum())
+            total_calories = int(self._buffer.column('calories_burned').sum())
             return total_workouts, total_calories
         return 0, 0
 
     def get_weight_trend(self):
         """Generate weight trend visualization"""
-        if len(self.progress_data) > 0:
-            fig = px.line(
-                self.progress_data,
-                x='date',
-                y='weight',
-                title='Weight Progress Over Time'
-            )
-            fig.update_layout(
-                xaxis_title="Date",
-                yaxis_title="Weight (kg)",
-                height=400
-            )
-            return fig
+        if len(self._buffer) > 0:
+            return self._figures.get('weight_trend', self._buffer.version, self._build_weight_trend)
+        return None
+
+    def _build_weight_trend(self):
+        fig = px.line(
+            downsample_line(self.progress_data, 'date', 'weight'),
+            x='date',
+            y='weight',
+            title='Weight Progress Over Time'
+        )
+        fig.update_layout(
+            xaxis_title="Date",
+            yaxis_title="Weight (kg)",
+            height=400
+        )
+        return fig
+
+    def get_activity_calendar(self):
+        """Heatmap of workouts per day, by week and weekday"""
+        if len(self._buffer) > 0:
+            return self._figures.get('activity_calendar', self._buffer.version,
+                                     lambda: create_weekly_calendar(self.progress_data))
         return None
 
     def get_progress_metrics(self):
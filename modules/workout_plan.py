@@ -0,0 +1,132 @@
+# modules/workout_plan.py
+
+import numpy as np
+import pandas as pd
+
+PLAN_FIELDS = ('exercise', 'duration', 'calories', 'target_muscles', 'difficulty')
+
+# Shortest time slot given to a single exercise, in minutes
+MIN_EXERCISE_MINUTES = 5
+
+
+def exercise_minutes(duration_minutes, exercise_counts):
+    """Minutes per exercise when a workout is split evenly across its exercises"""
+    counts = np.maximum(np.asarray(exercise_counts), 1)
+    return np.maximum(MIN_EXERCISE_MINUTES, np.asarray(duration_minutes) // counts)
+
+
+def exercise_calories(calories_per_hour, minutes):
+    """Calories burned for each exercise slot, rounded like the scalar planner"""
+    return np.round(np.asarray(calories_per_hour) * minutes / 60).astype(int)
+
+
+class WorkoutPlan:
+    """Columnar workout plan: one array per field, one entry per exercise
+
+    Iterating yields the same dicts create_workout_plan used to return, so
+    existing callers keep working, and to_records() exports that list.
+    """
+    __slots__ = PLAN_FIELDS
+
+    def __init__(self, exercise, duration, calories, target_muscles, difficulty):
+        self.exercise = exercise
+        self.duration = duration
+        self.calories = calories
+        self.target_muscles = target_muscles
+        self.difficulty = difficulty
+
+    @classmethod
+    def empty(cls):
+        text = np.empty(0, dtype=object)
+        number = np.empty(0, dtype=int)
+        return cls(text, number, number, text, text)
+
+    @classmethod
+    def from_columns(cls, exercise, calories_per_hour, target_muscles, difficulty, duration_minutes=30):
+        """Build a plan from catalog columns, splitting duration_minutes evenly"""
+        minutes = exercise_minutes(duration_minutes, len(exercise))
+        duration = np.full(len(exercise), minutes, dtype=int)
+        return cls(np.asarray(exercise), duration, exercise_calories(calories_per_hour, minutes),
+                   np.asarray(target_muscles), np.asarray(difficulty))
+
+    def __len__(self):
+        return len(self.exercise)
+
+    def __getitem__(self, index):
+        positions = range(len(self))[index]
+        if isinstance(positions, range):
+            return [self[position] for position in positions]
+        return {field: getattr(self, field).item(positions) for field in PLAN_FIELDS}
+
+    def __iter__(self):
+        return iter(self.to_records())
+
+    def total_calories(self):
+        return int(self.calories.sum())
+
+    def to_records(self):
+        """Export the plan as a list of dicts, one per exercise"""
+        columns = [getattr(self, field).tolist() for field in PLAN_FIELDS]
+        return [dict(zip(PLAN_FIELDS, values)) for values in zip(*columns)]
+
+
+class WorkoutPlanBatch:
+    """Workout plans for many users stored as flat columns plus row offsets
+
+    Plan i covers rows offsets[i]:offsets[i + 1] of every column, and
+    indexing a batch returns a WorkoutPlan over views of those rows.
+    """
+    __slots__ = PLAN_FIELDS + ('offsets',)
+
+    def __init__(self, exercise, duration, calories, target_muscles, difficulty, offsets):
+        self.exercise = exercise
+        self.duration = duration
+        self.calories = calories
+        self.target_muscles = target_muscles
+        self.difficulty = difficulty
+        self.offsets = offsets
+
+    @classmethod
+    def from_positions(cls, columns, positions, duration_minutes=30):
+        """Build plans from per-user catalog row positions
+
+        columns maps exercise, calories_per_hour, target_muscles and
+        difficulty to catalog arrays; duration_minutes is a scalar or one
+        value per user.
+        """
+        counts = np.array([len(p) for p in positions], dtype=int)
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        flat = np.concatenate(positions).astype(int) if len(positions) else np.empty(0, dtype=int)
+
+        minutes = exercise_minutes(np.broadcast_to(duration_minutes, counts.shape), counts)
+        duration = np.repeat(minutes, counts).astype(int)
+        calories = exercise_calories(columns['calories_per_hour'][flat], duration)
+        return cls(columns['exercise'][flat], duration, calories,
+                   columns['target_muscles'][flat], columns['difficulty'][flat], offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        # Negative indexes count from the end, out of range ones raise IndexError
+        index = range(len(self))[index]
+        rows = slice(self.offsets[index], self.offsets[index + 1])
+        return WorkoutPlan(*(getattr(self, field)[rows] for field in PLAN_FIELDS))
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def total_calories(self):
+        """Total calories per plan"""
+        totals = np.concatenate([[0], np.cumsum(self.calories)])
+        return totals[self.offsets[1:]] - totals[self.offsets[:-1]]
+
+    def to_records(self):
+        """Export every plan as a list of dicts"""
+        return [plan.to_records() for plan in self]
+
+    def to_frame(self):
+        """Flat DataFrame with one row per planned exercise and a plan column"""
+        frame = pd.DataFrame({field: getattr(self, field) for field in PLAN_FIELDS})
+        frame.insert(0, 'plan', np.repeat(np.arange(len(self)), np.diff(self.offsets)))
+        return frame
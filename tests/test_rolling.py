@@ -0,0 +1,18 @@
+import numpy as np
+import pandas as pd
+
+from modules.health_analytics import HealthAnalytics
+
+
+def test_health_summary_averages_over_logged_values_only():
+    analytics = HealthAnalytics()
+    analytics.analytics_data = pd.DataFrame({
+        'date': pd.to_datetime(['2024-01-01', '2024-01-02', '2024-01-03']),
+        'weight': [70.0, 69.8, 69.6],
+        'calories_burned': [300.0, np.nan, 500.0],
+        'workouts': [1, 0, 1],
+    })
+    assert analytics.get_health_summary()['avg_calories_burned'] == 400.0
+
+    analytics.add_daily_rows({'date': ['2024-01-04'], 'weight': [69.5], 'workouts': [1]})
+    assert analytics.get_health_summary()['avg_calories_burned'] == 400.0
@@ -0,0 +1,29 @@
+import numpy as np
+import pandas as pd
+
+from modules.progress_tracker import ProgressTracker
+from utils.timeseries import TimeSeriesBuffer
+
+
+def test_extend_stores_missing_integers_as_zero():
+    buffer = TimeSeriesBuffer({'workouts': 'int64', 'weight': 'float64'})
+    buffer.extend(pd.DataFrame({
+        'date': ['2024-01-01', '2024-01-02', '2024-01-03'],
+        'workouts': [1, np.nan, 2],
+        'weight': [70.0, np.nan, 69.5],
+    }))
+    assert buffer.column('workouts').tolist() == [1, 0, 2]
+    assert np.isnan(buffer.column('weight')[1])
+
+
+def test_progress_data_with_missing_values_keeps_totals():
+    tracker = ProgressTracker()
+    tracker.progress_data = pd.DataFrame({
+        'date': pd.to_datetime(['2024-01-01', '2024-01-02']),
+        'weight': [70.0, 69.8],
+        'bmi': [22.9, 22.8],
+        'workouts_completed': [1, 1],
+        'calories_burned': [300, np.nan],
+    })
+    assert tracker.progress_data['calories_burned'].tolist() == [300, 0]
+    assert tracker.get_workout_summary() == (2, 300)
@@ -0,0 +1,92 @@
+# utils/charts.py
+
+import numpy as np
+import pandas as pd
+
+# Point budgets for the trend charts, whatever the length of the history
+MAX_LINE_POINTS = 1000
+MAX_BARS = 180
+
+
+def lttb(x, y, threshold=MAX_LINE_POINTS):
+    """Indices of the points kept by Largest-Triangle-Three-Buckets downsampling
+
+    Keeps the first and last points, and from each of threshold - 2 equal
+    buckets in between the point forming the largest triangle with the
+    previously kept point and the mean of the next bucket. x must be sorted.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+
+    kept = np.empty(threshold, dtype=int)
+    kept[0] = 0
+    kept[-1] = n - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        if bucket + 2 < len(edges):
+            next_start, next_end = end, edges[bucket + 2]
+        else:
+            next_start, next_end = n - 1, n
+        next_x = x[next_start:next_end].mean()
+        next_y = y[next_start:next_end].mean()
+
+        # Twice the triangle area for every candidate in the bucket
+        area = np.abs((x[previous] - next_x) * (y[start:end] - y[previous])
+                      - (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(area.argmax())
+        kept[bucket + 1] = previous
+    return kept
+
+
+def downsample_line(frame, x, y, threshold=MAX_LINE_POINTS):
+    """Rows of frame kept by LTTB on the (x, y) series, NaN values dropped"""
+    frame = frame[frame[y].notna()]
+    if len(frame) <= threshold:
+        return frame
+    x_values = frame[x].to_numpy()
+    if np.issubdtype(x_values.dtype, np.datetime64):
+        x_values = x_values.astype('datetime64[s]').astype(np.int64)
+    return frame.iloc[lttb(x_values, frame[y].to_numpy(), threshold)]
+
+
+def bin_by_date(frame, date, columns, max_bins=MAX_BARS):
+    """Average columns over equal-width date bins so at most max_bins remain
+
+    Short histories are returned unchanged. Each bin is labelled with its
+    first date.
+    """
+    if len(frame) <= max_bins:
+        return frame
+    dates = pd.to_datetime(frame[date])
+    span_days = (dates.max() - dates.min()).days + 1
+    bin_days = max(1, -(-span_days // max_bins))
+    bins = dates.dt.floor('D') - pd.to_timedelta((dates - dates.min()).dt.days % bin_days, unit='D')
+    return frame[columns].groupby(bins.rename(date)).mean().reset_index()
+
+
+class FigureCache:
+    """Figures keyed by name and the data version they were built from
+
+    get() returns the cached figure while the version is unchanged and
+    calls build() otherwise. Callers must not modify the returned figure.
+    """
+
+    def __init__(self):
+        self._figures = {}
+
+    def get(self, name, version, build):
+        cached = self._figures.get(name)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        figure = build()
+        self._figures[name] = (version, figure)
+        return figure
+
+    def clear(self):
+        self._figures.clear()
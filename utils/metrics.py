@@ -0,0 +1,334 @@
+# utils/metrics.py
+
+import bisect
+import cProfile
+import functools
+import io
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+import types
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Histogram bucket upper bounds in seconds (the last bucket is +Inf)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRIC_NAME = 'healthfit_call_duration_seconds'
+SLOW_CALLS_KEPT = 20
+
+logger = logging.getLogger(__name__)
+
+
+class Histogram:
+    """Call count, error count and latency histogram of one instrumented call"""
+
+    __slots__ = ('counts', 'sum', 'count', 'errors')
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.errors = 0
+
+    def observe(self, seconds, failed=False):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+        if failed:
+            self.errors += 1
+
+
+class _Metrics:
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.profile_rate = 0.0
+        self.profile_threshold = None
+        self.profile_dir = None
+        self.slow_calls = deque(maxlen=SLOW_CALLS_KEPT)
+        self.profiling = threading.Lock()
+        self.server = None
+        # Held while starting the server; set once binding it failed
+        self.serve_lock = threading.Lock()
+        self.serve_failed = False
+        self.export_path = None
+
+    def observe(self, name, seconds, failed=False):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds, failed)
+
+
+_metrics = _Metrics()
+
+# Classes registered with @instrumented: (cls, prefix, {method name: original})
+_classes = []
+
+
+def enabled():
+    return _metrics.enabled
+
+
+def enable(profile_rate=0.0, profile_threshold=None, profile_dir=None):
+    """Start recording instrumented calls
+
+    With profile_rate > 0 that fraction of calls runs under cProfile, and
+    sampled calls slower than profile_threshold seconds keep their profile:
+    the top functions are listed by slow_calls(), and a .prof file is
+    written to profile_dir when one is given.
+    """
+    _metrics.profile_rate = profile_rate
+    _metrics.profile_threshold = profile_threshold
+    _metrics.profile_dir = profile_dir
+    if profile_dir:
+        os.makedirs(profile_dir, exist_ok=True)
+    if not _metrics.enabled:
+        _metrics.enabled = True
+        for cls, prefix, methods in _classes:
+            _patch(cls, prefix, methods)
+
+
+def disable():
+    """Stop recording and restore the original methods of instrumented classes"""
+    _metrics.enabled = False
+    for cls, _, methods in _classes:
+        for name, method in methods.items():
+            setattr(cls, name, method)
+
+
+def reset():
+    with _metrics.lock:
+        _metrics.histograms.clear()
+        _metrics.slow_calls.clear()
+
+
+def _profiled_call(name, func, args, kwargs):
+    """Run one call under cProfile, keeping the profile if it was slow"""
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    failed = True
+    try:
+        result = profiler.runcall(func, *args, **kwargs)
+        failed = False
+        return result
+    finally:
+        elapsed = time.perf_counter() - start
+        _metrics.profiling.release()
+        _metrics.observe(name, elapsed, failed)
+        threshold = _metrics.profile_threshold
+        if threshold is None or elapsed >= threshold:
+            _keep_profile(name, elapsed, profiler)
+
+
+def _keep_profile(name, elapsed, profiler):
+    report = io.StringIO()
+    pstats.Stats(profiler, stream=report).sort_stats('cumulative').print_stats(15)
+    path = None
+    if _metrics.profile_dir:
+        path = os.path.join(_metrics.profile_dir, f"{name}-{time.time_ns()}.prof")
+        profiler.dump_stats(path)
+    _metrics.slow_calls.append({'name': name, 'seconds': elapsed, 'path': path,
+                                'report': report.getvalue()})
+
+
+def _record(name, func, args, kwargs):
+    # Only one call is profiled at a time; cProfile does not nest
+    if _metrics.profile_rate and random.random() < _metrics.profile_rate \
+            and _metrics.profiling.acquire(blocking=False):
+        return _profiled_call(name, func, args, kwargs)
+    start = time.perf_counter()
+    failed = True
+    try:
+        result = func(*args, **kwargs)
+        failed = False
+        return result
+    finally:
+        _metrics.observe(name, time.perf_counter() - start, failed)
+
+
+def timed(name):
+    """Decorator recording the latency of every call while metrics are enabled
+
+    Disabled, the wrapper only checks one flag before calling through.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _metrics.enabled:
+                return func(*args, **kwargs)
+            return _record(name, func, args, kwargs)
+        return wrapper
+    return decorator
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _metrics.observe(self.name, time.perf_counter() - self.start, exc_type is not None)
+        return False
+
+
+def timer(name):
+    """Context manager recording the latency of a block while metrics are enabled"""
+    return _Timer(name) if _metrics.enabled else _NULL_TIMER
+
+
+def _patch(cls, prefix, methods):
+    for name, method in methods.items():
+        setattr(cls, name, _wrap(f"{prefix}.{name}", method))
+
+
+def _wrap(name, method):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        return _record(name, method, args, kwargs)
+    return wrapper
+
+
+def instrumented(prefix):
+    """Class decorator timing every public method as '<prefix>.<method>'
+
+    The methods are only wrapped while metrics are enabled; disabled, the
+    class keeps its original functions and calls cost nothing extra.
+    """
+    def decorator(cls):
+        methods = {name: value for name, value in vars(cls).items()
+                   if not name.startswith('_') and isinstance(value, types.FunctionType)}
+        _classes.append((cls, prefix, methods))
+        if _metrics.enabled:
+            _patch(cls, prefix, methods)
+        return cls
+    return decorator
+
+
+def snapshot():
+    """Copy of every histogram as {name: {'count', 'errors', 'sum', 'buckets'}}"""
+    with _metrics.lock:
+        return {name: {'count': h.count, 'errors': h.errors, 'sum': h.sum, 'buckets': list(h.counts)}
+                for name, h in sorted(_metrics.histograms.items())}
+
+
+def slow_calls():
+    """Profiles of the most recent sampled slow calls"""
+    with _metrics.lock:
+        return list(_metrics.slow_calls)
+
+
+def to_prometheus():
+    """All histograms in the Prometheus text exposition format"""
+    lines = [
+        f"# HELP {METRIC_NAME} Latency of instrumented HealthFit calls.",
+        f"# TYPE {METRIC_NAME} histogram",
+    ]
+    errors = []
+    bounds = [repr(bound) for bound in LATENCY_BUCKETS] + ['+Inf']
+    for name, histogram in snapshot().items():
+        cumulative = 0
+        for bound, count in zip(bounds, histogram['buckets']):
+            cumulative += count
+            lines.append(f'{METRIC_NAME}_bucket{{name="{name}",le="{bound}"}} {cumulative}')
+        lines.append(f'{METRIC_NAME}_sum{{name="{name}"}} {histogram["sum"]!r}')
+        lines.append(f'{METRIC_NAME}_count{{name="{name}"}} {histogram["count"]}')
+        errors.append(f'healthfit_call_errors_total{{name="{name}"}} {histogram["errors"]}')
+    lines += ["# HELP healthfit_call_errors_total Instrumented calls that raised.",
+              "# TYPE healthfit_call_errors_total counter"] + errors
+    return '\n'.join(lines) + '\n'
+
+
+def write_prometheus(path):
+    """Write the metrics to a file, e.g. for the node exporter textfile collector"""
+    # Sessions export from threads of one process, so each gets its own file
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(to_prometheus())
+    os.replace(tmp_path, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = to_prometheus().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port=9464, host='127.0.0.1'):
+    """Serve /metrics over HTTP from a daemon thread; returns the server
+
+    Calling it again returns the server that is already running. The port
+    is only bound once per process: if that fails, e.g. because the port
+    is in use, the error is logged and None is returned from then on.
+    """
+    with _metrics.serve_lock:
+        if _metrics.server is None and not _metrics.serve_failed:
+            try:
+                server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            except OSError as error:
+                _metrics.serve_failed = True
+                logger.error("Cannot serve metrics on %s:%s: %s", host, port, error)
+                return None
+            threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+            _metrics.server = server
+        return _metrics.server
+
+
+def configure_from_env(environ=os.environ):
+    """Enable metrics from HEALTHFIT_METRICS* environment variables
+
+    HEALTHFIT_METRICS=1 turns recording on, HEALTHFIT_METRICS_PORT serves
+    /metrics on that port, HEALTHFIT_METRICS_FILE is the file export()
+    writes to, and HEALTHFIT_PROFILE_RATE, HEALTHFIT_PROFILE_THRESHOLD and
+    HEALTHFIT_PROFILE_DIR configure slow-call profiling. Safe to call on
+    every Streamlit rerun.
+    """
+    if environ.get('HEALTHFIT_METRICS', '').lower() not in ('1', 'true', 'yes', 'on'):
+        return False
+    if not _metrics.enabled:
+        threshold = environ.get('HEALTHFIT_PROFILE_THRESHOLD')
+        enable(profile_rate=float(environ.get('HEALTHFIT_PROFILE_RATE', 0.0)),
+               profile_threshold=float(threshold) if threshold else None,
+               profile_dir=environ.get('HEALTHFIT_PROFILE_DIR'))
+    _metrics.export_path = environ.get('HEALTHFIT_METRICS_FILE')
+    port = environ.get('HEALTHFIT_METRICS_PORT')
+    if port:
+        serve(int(port), environ.get('HEALTHFIT_METRICS_HOST', '127.0.0.1'))
+    return True
+
+
+def export():
+    """Write the metrics file configured by configure_from_env(), if any"""
+    if _metrics.enabled and _metrics.export_path:
+        write_prometheus(_metrics.export_path)
@@ -0,0 +1,147 @@
+# utils/rolling.py
+
+import numpy as np
+import pandas as pd
+
+SUM_FIELDS = ('calories_burned', 'calories_consumed', 'workouts', 'water_intake')
+DEFAULT_WINDOWS = (7, 30, 90)
+
+
+def _day_number(date):
+    """Days since the epoch for a date, datetime, string or datetime64"""
+    return int(np.datetime64(date, 'D').astype(np.int64))
+
+
+class _DayBucket:
+    __slots__ = ('day', 'weight', 'entries', 'sums')
+
+    def __init__(self, day):
+        self.day = day
+        self.weight = np.nan
+        self.entries = 0
+        self.sums = dict.fromkeys(SUM_FIELDS, 0.0)
+
+
+class RollingDailyAggregates:
+    """Running totals and date-windowed statistics over daily health logs
+
+    Every add() is O(1) in the length of the history: entries are folded
+    into per-day buckets, and each window keeps running sums over the days
+    inside (latest_day - window, latest_day], subtracting buckets as they
+    fall out. Several entries on one day share a bucket (the day's weight
+    is its last logged weight) and gaps between days are handled by date,
+    not by position. Entries dated before the latest day cannot be folded
+    in incrementally; add() returns False for those so the owner can
+    rebuild from its full history.
+    """
+
+    def __init__(self, windows=DEFAULT_WINDOWS):
+        self.windows = tuple(sorted(windows))
+        self.entries = 0
+        self.totals = dict.fromkeys(SUM_FIELDS, 0.0)
+        # Entries with a logged (non-null) value, per field
+        self.counts = dict.fromkeys(SUM_FIELDS, 0)
+        self.first_weight = np.nan
+        self.latest_weight = np.nan
+        self.latest_day = None
+
+        # Buckets for the last max(windows) days; _head skips evicted ones
+        self._buckets = []
+        self._head = 0
+        self._window_days = dict.fromkeys(self.windows, 0)
+        self._window_entries = dict.fromkeys(self.windows, 0)
+        self._window_sums = {window: dict.fromkeys(SUM_FIELDS, 0.0) for window in self.windows}
+        self._reference_weight = dict.fromkeys(self.windows, np.nan)
+
+    def __len__(self):
+        return self.entries
+
+    def add(self, date, weight=np.nan, **values):
+        """Fold one log entry in; returns False if it is older than the latest day"""
+        day = _day_number(date)
+        if self.latest_day is not None and day < self.latest_day:
+            return False
+
+        if self.latest_day is None or day > self.latest_day:
+            self._buckets.append(_DayBucket(day))
+            self.latest_day = day
+            for window in self.windows:
+                self._window_days[window] += 1
+            self._evict()
+
+        bucket = self._buckets[-1]
+        bucket.entries += 1
+        self.entries += 1
+        for window in self.windows:
+            self._window_entries[window] += 1
+        for field in SUM_FIELDS:
+            value = values.get(field)
+            if value is None or value != value:
+                continue
+            bucket.sums[field] += value
+            self.totals[field] += value
+            self.counts[field] += 1
+            for window in self.windows:
+                self._window_sums[window][field] += value
+
+        if weight is not None and weight == weight:
+            bucket.weight = weight
+            self.latest_weight = weight
+            if self.first_weight != self.first_weight:
+                self.first_weight = weight
+        return True
+
+    def mean(self, field):
+        """Mean of one field over the entries that logged it, NaN if none did"""
+        count = self.counts[field]
+        return self.totals[field] / count if count else np.nan
+
+    def _evict(self):
+        """Drop buckets that fell out of each window after latest_day moved"""
+        for window in self.windows:
+            cutoff = self.latest_day - window
+            while self._window_days[window]:
+                bucket = self._buckets[len(self._buckets) - self._window_days[window]]
+                if bucket.day > cutoff:
+                    break
+                self._window_days[window] -= 1
+                self._window_entries[window] -= bucket.entries
+                for field in SUM_FIELDS:
+                    self._window_sums[window][field] -= bucket.sums[field]
+                if bucket.weight == bucket.weight:
+                    self._reference_weight[window] = bucket.weight
+
+        # Buckets outside the largest window are no longer needed
+        self._head = len(self._buckets) - self._window_days[self.windows[-1]]
+        if self._head > 1024 and self._head * 2 > len(self._buckets):
+            del self._buckets[:self._head]
+            self._head = 0
+
+    def window_stats(self, window):
+        """Statistics for the days in (latest_day - window, latest_day]"""
+        days = self._window_days[window]
+        sums = self._window_sums[window]
+        reference = self._reference_weight[window]
+        if reference != reference:
+            reference = self.first_weight
+        return {
+            'weight_change': self.latest_weight - reference,
+            'avg_calories_burned': sums['calories_burned'] / days if days else 0.0,
+            'avg_calories_consumed': sums['calories_consumed'] / days if days else 0.0,
+            'total_workouts': sums['workouts'],
+            'avg_water_intake': sums['water_intake'] / days if days else 0.0,
+            'days_logged': days,
+            'entries': self._window_entries[window],
+        }
+
+    @classmethod
+    def from_frame(cls, frame, windows=DEFAULT_WINDOWS):
+        """Build aggregates from a full history frame with a date column"""
+        aggregates = cls(windows)
+        if frame is None or len(frame) == 0:
+            return aggregates
+        columns = ['weight'] + [field for field in SUM_FIELDS if field in frame]
+        ordered = frame.assign(date=pd.to_datetime(frame['date'])).sort_values('date', kind='stable')
+        for row in ordered[['date'] + [c for c in columns if c in ordered]].itertuples(index=False):
+            aggregates.add(**row._asdict())
+        return aggregates
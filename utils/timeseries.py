@@ -0,0 +1,118 @@
+# utils/timeseries.py
+
+import numpy as np
+import pandas as pd
+
+DATE_DTYPE = 'datetime64[s]'
+
+
+def to_datetime64(values):
+    """Convert dates, strings or timestamps to day-resolution datetime64 values"""
+    return pd.to_datetime(values).to_numpy().astype('datetime64[D]').astype(DATE_DTYPE)
+
+
+class TimeSeriesBuffer:
+    """Growable columnar store for daily logs
+
+    Each column is a typed NumPy array whose capacity doubles when full, so
+    appends are amortized O(1). The 'date' column always holds datetime64
+    values. to_frame() wraps the filled part of the arrays in a DataFrame
+    without copying, and caches it until the next append.
+    """
+
+    def __init__(self, columns, capacity=64):
+        self.dtypes = {'date': np.dtype(DATE_DTYPE)}
+        self.dtypes.update({name: np.dtype(dtype) for name, dtype in columns.items()})
+        self.size = 0
+        self.version = 0
+        self._arrays = {name: self._empty(dtype, capacity) for name, dtype in self.dtypes.items()}
+        self._frame = None
+
+    @staticmethod
+    def _missing(dtype):
+        if dtype.kind == 'f':
+            return np.nan
+        if dtype.kind in 'iu':
+            return 0
+        if dtype.kind == 'M':
+            return np.datetime64('NaT')
+        return None
+
+    @classmethod
+    def _empty(cls, dtype, capacity):
+        return np.full(capacity, cls._missing(dtype), dtype=dtype)
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def capacity(self):
+        return len(self._arrays['date'])
+
+    def _reserve(self, size):
+        if size <= self.capacity:
+            return
+        capacity = max(self.capacity, 1)
+        while capacity < size:
+            capacity *= 2
+        for name, array in self._arrays.items():
+            grown = self._empty(array.dtype, capacity)
+            grown[:self.size] = array[:self.size]
+            self._arrays[name] = grown
+
+    def _changed(self):
+        self.version += 1
+        self._frame = None
+
+    def append(self, date, **values):
+        """Append one row; columns left out are stored as missing"""
+        self._reserve(self.size + 1)
+        row = self.size
+        self._arrays['date'][row] = np.datetime64(date, 'D')
+        for name, array in self._arrays.items():
+            if name != 'date':
+                array[row] = values.get(name, self._missing(array.dtype))
+        self.size += 1
+        self._changed()
+
+    def extend(self, data):
+        """Append many rows from a DataFrame or dict of equal-length columns"""
+        data = pd.DataFrame(data)
+        if data.empty:
+            return
+        count = len(data)
+        self._reserve(self.size + count)
+        rows = slice(self.size, self.size + count)
+        self._arrays['date'][rows] = to_datetime64(data['date'])
+        for name, array in self._arrays.items():
+            if name == 'date':
+                continue
+            if name in data:
+                column = data[name]
+                if array.dtype.kind in 'iu':
+                    # Casting NaN to an integer gives garbage; store the
+                    # same missing value as append()
+                    column = column.fillna(self._missing(array.dtype))
+                array[rows] = column.to_numpy(dtype=array.dtype)
+            else:
+                array[rows] = self._missing(array.dtype)
+        self.size += count
+        self._changed()
+
+    def update(self, rows, **values):
+        """Overwrite columns for existing rows (an index, slice or mask)"""
+        for name, value in values.items():
+            self._arrays[name][:self.size][rows] = value
+        self._changed()
+
+    def column(self, name):
+        """View of the filled part of one column"""
+        return self._arrays[name][:self.size]
+
+    def to_frame(self):
+        """DataFrame view over the buffer, built lazily and cached"""
+        if self._frame is None:
+            self._frame = pd.DataFrame(
+                {name: self.column(name) for name in self.dtypes}, copy=False
+            )
+        return self._frame
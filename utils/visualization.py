@@ -1,7 +1,26 @@
 # utils/visualization.py
 
-import plotly.express as px
-import plotly.graph_objects as go
+import threading
+import weakref
+
+import numpy as np
+import pandas as pd
+
+from utils.lazy import lazy_import
+
+# Plotly is only imported once a chart is actually built
+px = lazy_import('plotly.express')
+go = lazy_import('plotly.graph_objects')
+
+WEEKDAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+# Columns plotted by create_weekly_calendar, first one present wins
+ACTIVITY_COLUMNS = ('workouts_completed', 'workouts', 'calories_burned')
+MAX_CACHED_MATRICES = 16
+
+# id(frame) -> (weakref to frame, value column, (matrix, week starts))
+_matrix_cache = {}
+# Streamlit sessions render on separate threads
+_matrix_cache_lock = threading.Lock()
 
 def create_progress_gauge(value, max_value, title):
     """Create a gauge chart for progress visualization"""
@@ -21,7 +40,78 @@ def create_progress_gauge(value, max_value, title):
     ))
     return fig
 
-def create_weekly_calendar(progress_data):
-    """Create a calendar heatmap of activity"""
-    # Implementation for calendar heatmap
-    pass
+def _activity_column(data):
+    return next((column for column in ACTIVITY_COLUMNS if column in data), None)
+
+
+def weekly_activity_matrix(data, value=None):
+    """Daily totals of value binned by ISO week (columns) and weekday (rows)
+
+    Returns a 7 x n_weeks float matrix, Monday first, with NaN for days
+    without entries, and the Monday of each week. Entries on the same day
+    are summed. Results are cached per DataFrame object, so the frames the
+    trackers keep between reruns are only binned once.
+    """
+    value = value or _activity_column(data)
+    key = id(data)
+    with _matrix_cache_lock:
+        cached = _matrix_cache.get(key)
+    if cached is not None and cached[0]() is data and cached[1] == value:
+        return cached[2]
+
+    dates = pd.to_datetime(data['date']).to_numpy().astype('datetime64[D]')
+    values = pd.to_numeric(data[value], errors='coerce').to_numpy(dtype=float)
+    valid = ~np.isnat(dates) & ~np.isnan(values)
+    dates, values = dates[valid], values[valid]
+    if len(dates) == 0:
+        result = np.empty((7, 0)), np.empty(0, dtype='datetime64[D]')
+    else:
+        # Day numbers from the Monday before the first entry (1970-01-01 was a Thursday)
+        days = dates.astype(np.int64)
+        first_monday = days.min() - (days.min() + 3) % 7
+        offsets = days - first_monday
+        n_weeks = int(offsets.max()) // 7 + 1
+        totals = np.bincount(offsets, weights=values, minlength=n_weeks * 7)
+        counts = np.bincount(offsets, minlength=n_weeks * 7)
+        matrix = np.where(counts > 0, totals, np.nan).reshape(n_weeks, 7).T
+        week_starts = (first_monday + 7 * np.arange(n_weeks)).astype('datetime64[D]')
+        result = matrix, week_starts
+
+    with _matrix_cache_lock:
+        if key not in _matrix_cache and len(_matrix_cache) >= MAX_CACHED_MATRICES:
+            _matrix_cache.pop(next(iter(_matrix_cache)))
+        _matrix_cache[key] = (weakref.ref(data), value, result)
+    return result
+
+
+def create_weekly_calendar(progress_data, value=None, title='Activity Calendar'):
+    """Create a calendar heatmap of activity
+
+    progress_data is ProgressTracker.progress_data or
+    HealthAnalytics.analytics_data; value defaults to the workout count.
+    Returns None when there is nothing to plot.
+    """
+    value = value or _activity_column(progress_data)
+    if value is None or progress_data.empty:
+        return None
+    matrix, week_starts = weekly_activity_matrix(progress_data, value)
+    if matrix.size == 0:
+        return None
+
+    fig = go.Figure(go.Heatmap(
+        z=matrix,
+        x=week_starts,
+        y=WEEKDAYS,
+        colorscale='Greens',
+        xgap=1,
+        ygap=1,
+        hoverongaps=False,
+        colorbar={'title': value.replace('_', ' ').title()},
+        hovertemplate='Week of %{x|%Y-%m-%d}, %{y}<br>%{z}<extra></extra>'
+    ))
+    fig.update_layout(
+        title=title,
+        yaxis={'autorange': 'reversed'},
+        height=250
+    )
+    return fig